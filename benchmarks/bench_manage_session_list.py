@@ -0,0 +1,118 @@
+"""Benchmark: sequential vs concurrent ``manage_session list``.
+
+Builds mock sessions whose RPCs take a fixed round-trip latency plus a
+per-line transfer cost, then times the listing with concurrency 1
+(equivalent to awaiting sessions one at a time) and with the default
+bound, at 10, 50 and 200 sessions. Each size runs twice: with the prompt
+on the first row (the last line is found above the bottom rows) and with
+a blank screen (nothing to find), the worst case for the last-line
+lookup. ``reads`` is the number of content reads per session.
+
+Usage:
+    python benchmarks/bench_manage_session_list.py [--rtt-ms 2] [--sessions 10 50 200]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import time
+from types import SimpleNamespace
+
+from iterm2_agent.connection import ITerm2Context
+from iterm2_agent.tools.manage_session import LIST_CONCURRENCY, _collect_sessions
+
+
+class LatencySession:
+    """Session stand-in whose RPCs sleep to simulate the websocket."""
+
+    def __init__(
+        self, index: int, rows: int, rtt: float, per_line: float, blank: bool = False
+    ):
+        self.session_id = f"session-{index}"
+        self.name = f"pane {index}"
+        self.grid_size = SimpleNamespace(width=120, height=rows)
+        self._rows = [""] * rows
+        if not blank:
+            self._rows[0] = f"{self.session_id} $ "
+        self._rtt = rtt
+        self._per_line = per_line
+        self.reads = 0
+
+    async def _rpc(self, lines: int = 0) -> None:
+        await asyncio.sleep(self._rtt + lines * self._per_line)
+
+    async def async_get_variable(self, name: str):
+        await self._rpc()
+        return {"path": "/home/user/project", "jobName": "zsh"}.get(name)
+
+    async def async_get_line_info(self):
+        await self._rpc()
+        return SimpleNamespace(
+            mutable_area_height=len(self._rows),
+            scrollback_buffer_height=0,
+            overflow=0,
+        )
+
+    async def async_get_contents(self, first_line: int, number_of_lines: int):
+        self.reads += 1
+        lines = self._rows[first_line:first_line + number_of_lines]
+        await self._rpc(len(lines))
+        return [SimpleNamespace(string=text) for text in lines]
+
+
+def make_context(
+    count: int, rows: int, rtt: float, per_line: float, blank: bool = False
+) -> ITerm2Context:
+    sessions = [LatencySession(i, rows, rtt, per_line, blank) for i in range(count)]
+    # Four panes per tab, one tab per window
+    windows = [
+        SimpleNamespace(
+            window_id=f"window-{w}",
+            tabs=[SimpleNamespace(tab_id=f"tab-{w}", sessions=sessions[w:w + 4])],
+        )
+        for w in range(0, count, 4)
+    ]
+    app = SimpleNamespace(terminal_windows=windows)
+    return ITerm2Context(connection=None, app=app)
+
+
+async def time_listing(ctx: ITerm2Context, concurrency: int) -> float:
+    start = time.perf_counter()
+    await _collect_sessions(ctx, concurrency)
+    return time.perf_counter() - start
+
+
+async def run(args: argparse.Namespace) -> None:
+    rtt = args.rtt_ms / 1000
+    per_line = args.per_line_us / 1_000_000
+    print(f"rtt={args.rtt_ms}ms per_line={args.per_line_us}us rows={args.rows}")
+    print(
+        f"{'screen':>6}  {'sessions':>8}  {'reads':>5}  {'sequential':>12}"
+        f"  {'concurrent':>12}  {'speedup':>8}"
+    )
+    for blank in (False, True):
+        for count in args.sessions:
+            ctx = make_context(count, args.rows, rtt, per_line, blank)
+            sequential = await time_listing(ctx, concurrency=1)
+            concurrent = await time_listing(ctx, concurrency=LIST_CONCURRENCY)
+            sessions = [s for w in ctx.app.terminal_windows for t in w.tabs for s in t.sessions]
+            reads = sum(s.reads for s in sessions) / (2 * len(sessions))
+            print(
+                f"{'blank' if blank else 'prompt':>6}  {count:>8}  {reads:>5.1f}"
+                f"  {sequential * 1000:>10.1f}ms  {concurrent * 1000:>10.1f}ms"
+                f"  {sequential / concurrent:>7.1f}x"
+            )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rtt-ms", type=float, default=2.0)
+    parser.add_argument("--per-line-us", type=float, default=20.0)
+    parser.add_argument("--rows", type=int, default=50)
+    parser.add_argument("--sessions", type=int, nargs="+", default=[10, 50, 200])
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
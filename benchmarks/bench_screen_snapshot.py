@@ -0,0 +1,90 @@
+"""Benchmark: CompactScreen vs a list of line strings.
+
+Renders a session of ``--rows`` rows of build output on the fake
+terminal emulator, then compares reading it into a list of strings
+(``contents.line(i).string``, the old ``get_screen_lines``) with
+``CompactScreen.from_contents``: build time per read, and memory held by
+``--keep`` retained reads (as ``read_screen`` diff snapshots keep them),
+measured with tracemalloc. The styled column times a read with styles
+plus its first style query; the fake emulator reports no colors, so
+this is the cost of walking every row's style runs.
+
+Usage:
+    python benchmarks/bench_screen_snapshot.py [--rows 50 200 1000] [--keep 256]
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+import tracemalloc
+from typing import Callable
+
+from iterm2_agent.connection import RED, CompactScreen
+from iterm2_agent.fake_backend import TerminalEmulator
+
+
+def render(rows: int) -> TerminalEmulator:
+    terminal = TerminalEmulator(120, rows)
+    for i in range(rows - 1):
+        if i % 10 == 9:
+            terminal.feed(f"error: src/module_{i}.py:{i}: unexpected token\r\n")
+        else:
+            terminal.feed(f"[{i:4d}/{rows}] Compiling src/module_{i}.py -> build/module_{i}.o\r\n")
+    return terminal
+
+
+def as_list(contents) -> list[str]:
+    return [contents.line(i).string for i in range(contents.number_of_lines)]
+
+
+def per_call(build: Callable[[], object], repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        build()
+    return (time.perf_counter() - start) / repeat
+
+
+def retained(build: Callable[[], object], keep: int) -> int:
+    tracemalloc.start()
+    kept = [build() for _ in range(keep)]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+    return size
+
+
+def run(args: argparse.Namespace) -> None:
+    print(f"keep={args.keep} repeat={args.repeat}")
+    print(
+        f"{'rows':>6}  {'list build':>11}  {'compact':>11}  {'list mem':>10}  {'compact':>10}"
+        f"  {'styled query':>12}"
+    )
+    for rows in args.rows:
+        contents = render(rows).screen_contents()
+        listed = per_call(lambda: as_list(contents), args.repeat)
+        compact = per_call(lambda: CompactScreen.from_contents(contents), args.repeat)
+        # Memory of the kept reads only: the screen contents are shared
+        listed_mem = retained(lambda: as_list(contents), args.keep)
+        compact_mem = retained(lambda: CompactScreen.from_contents(contents), args.keep)
+        styled = per_call(
+            lambda: CompactScreen.from_contents(contents, styles=True).lines_with(foreground=RED),
+            args.repeat,
+        )
+        print(
+            f"{rows:>6}  {listed * 1e6:>9.0f}us  {compact * 1e6:>9.0f}us"
+            f"  {listed_mem / 1024:>8.0f}KB  {compact_mem / 1024:>8.0f}KB"
+            f"  {styled * 1e6:>10.0f}us"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[50, 200, 1000])
+    parser.add_argument("--keep", type=int, default=256)
+    parser.add_argument("--repeat", type=int, default=50)
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Benchmark: prefix loops vs SecurityGuard.check.
+
+Times the original approach (lowercase the command, then ``startswith``
+against every prefix of the three sets in turn) against
+:meth:`~iterm2_agent.security.SecurityGuard.check` for short one-liners and
+for long pasted scripts. Note the legacy loop only looks at the start of
+the command, so on a script it does a fraction of the work of the
+compound-aware check, which lexes every line; the script row tracks the
+lexer's cost rather than a like-for-like comparison. The legacy loop also
+misses prefixes written with extra spaces ("git  push --force").
+
+Usage:
+    python benchmarks/bench_security.py [--repeat 20000] [--script-lines 200]
+"""
+
+from __future__ import annotations
+
+import argparse
+import timeit
+
+from iterm2_agent.security import (
+    CAUTION_PREFIXES,
+    DANGEROUS_PREFIXES,
+    SAFE_PREFIXES,
+    SecurityGuard,
+    SecurityLevel,
+)
+
+SHORT_COMMANDS = [
+    "ls -la",
+    "git status",
+    "npm install",
+    "rm -rf build",
+    "python3 manage.py runserver",
+    "cd src && make",
+    "git  push --force",
+]
+
+SCRIPT_LINES = [
+    "export PATH=$HOME/bin:$PATH",
+    "cd \"$(git rev-parse --show-toplevel)\"",
+    "if [ -f requirements.txt ]; then pip install -r requirements.txt; fi",
+    "for f in *.log; do tail -n 20 \"$f\" | grep -i 'error' || true; done",
+    "echo \"building ${TARGET:-all}\" >> build.log",
+    "make -j8 2>&1 | tee make.log",
+    "git log --oneline -n 5",
+]
+
+
+def legacy_check(command: str) -> SecurityLevel:
+    lower = command.strip().lower()
+    for prefix in DANGEROUS_PREFIXES:
+        if lower.startswith(prefix):
+            return SecurityLevel.DANGEROUS
+    for prefix in SAFE_PREFIXES:
+        if lower.startswith(prefix):
+            return SecurityLevel.SAFE
+    for prefix in CAUTION_PREFIXES:
+        if lower.startswith(prefix):
+            return SecurityLevel.CAUTION
+    return SecurityLevel.CAUTION
+
+
+def time_per_call(check, commands: list[str], repeat: int) -> float:
+    def loop():
+        for command in commands:
+            check(command)
+
+    return timeit.timeit(loop, number=repeat) / (repeat * len(commands))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20_000)
+    parser.add_argument("--script-lines", type=int, default=200)
+    args = parser.parse_args()
+
+    script = "\n".join(
+        SCRIPT_LINES[i % len(SCRIPT_LINES)] for i in range(args.script_lines)
+    )
+    script_repeat = max(1, args.repeat // args.script_lines)
+
+    print(f"{'workload':<22}  {'legacy':>12}  {'check':>12}")
+    for name, commands, repeat in (
+        ("short commands", SHORT_COMMANDS, args.repeat),
+        (f"{args.script_lines}-line script", [script], script_repeat),
+    ):
+        legacy = time_per_call(legacy_check, commands, repeat)
+        check = time_per_call(SecurityGuard.check, commands, repeat)
+        print(f"{name:<22}  {legacy * 1e6:>10.2f}us  {check * 1e6:>10.2f}us")
+
+    print(
+        f"\nscript verdict: legacy={legacy_check(script).value} "
+        f"check={SecurityGuard.check(script).value}"
+    )
+
+
+if __name__ == "__main__":
+    main()
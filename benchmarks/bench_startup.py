@@ -0,0 +1,151 @@
+"""Benchmark: cold start of the stdio server, as an MCP client sees it.
+
+Spawns ``python -m iterm2_agent`` on the fake backend and times, from the
+spawn, the responses a client waits for:
+
+* ``initialize`` — the MCP handshake
+* ``tools/list``
+* the first ``tools/call`` (``read_screen``), which needs the connection
+
+Each run is a fresh process, so the numbers include interpreter start,
+imports and tool registration. The fake backend connects in process;
+``--connect-latency`` makes each connect take that long, like the
+websocket handshake and app fetch against a real iTerm2.
+
+The exit status is 1 when the median first call takes longer than
+``--budget`` seconds.
+
+Usage:
+    python benchmarks/bench_startup.py [--runs 10] [--connect-latency 0.3]
+    python benchmarks/bench_startup.py --runs 3 --budget 5 --output startup.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+PHASES = ("initialize", "tools_list", "first_call")
+PROTOCOL_VERSION = "2025-06-18"
+
+
+def request(request_id: int, method: str, params: dict | None = None) -> bytes:
+    message = {"jsonrpc": "2.0", "id": request_id, "method": method, "params": params or {}}
+    return (json.dumps(message) + "\n").encode()
+
+
+def read_response(process: subprocess.Popen, request_id: int) -> dict:
+    """Read stdout until the response to ``request_id`` (skipping notifications)."""
+    while True:
+        line = process.stdout.readline()
+        if not line:
+            raise RuntimeError(f"server exited before answering request {request_id}")
+        message = json.loads(line)
+        if message.get("id") == request_id:
+            if "error" in message:
+                raise RuntimeError(f"request {request_id} failed: {message['error']}")
+            return message
+
+
+def measure_once(connect_latency: float) -> dict[str, float]:
+    """Spawn a server and return seconds from spawn to each response."""
+    env = dict(
+        os.environ,
+        ITERM2_AGENT_BACKEND="fake",
+        ITERM2_AGENT_FAKE_CONNECT_LATENCY=str(connect_latency),
+    )
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "iterm2_agent", "--transport", "stdio"],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        env=env,
+    )
+    times = {}
+    try:
+        process.stdin.write(request(1, "initialize", {
+            "protocolVersion": PROTOCOL_VERSION,
+            "capabilities": {},
+            "clientInfo": {"name": "bench_startup", "version": "0"},
+        }))
+        process.stdin.flush()
+        read_response(process, 1)
+        times["initialize"] = time.perf_counter() - start
+
+        initialized = {"jsonrpc": "2.0", "method": "notifications/initialized"}
+        process.stdin.write((json.dumps(initialized) + "\n").encode())
+        process.stdin.write(request(2, "tools/list"))
+        process.stdin.flush()
+        read_response(process, 2)
+        times["tools_list"] = time.perf_counter() - start
+
+        process.stdin.write(request(3, "tools/call", {
+            "name": "read_screen", "arguments": {"lines": 5},
+        }))
+        process.stdin.flush()
+        response = read_response(process, 3)
+        times["first_call"] = time.perf_counter() - start
+        if response["result"].get("isError"):
+            raise RuntimeError(f"read_screen failed: {response['result']['content']}")
+    finally:
+        process.stdin.close()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+    return times
+
+
+def run(runs: int, connect_latency: float) -> dict[str, dict[str, float]]:
+    """Median, min and max milliseconds per phase over ``runs`` spawns."""
+    samples: dict[str, list[float]] = {phase: [] for phase in PHASES}
+    for _ in range(runs):
+        for phase, seconds in measure_once(connect_latency).items():
+            samples[phase].append(seconds)
+    return {
+        phase: {
+            "p50_ms": round(statistics.median(values) * 1000, 1),
+            "min_ms": round(min(values) * 1000, 1),
+            "max_ms": round(max(values) * 1000, 1),
+        }
+        for phase, values in samples.items()
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument(
+        "--connect-latency", type=float, default=0.3,
+        help="seconds each fake connect takes (default 0.3)",
+    )
+    parser.add_argument("--budget", type=float, help="max median seconds to the first call")
+    parser.add_argument("--output", type=Path, help="write results as JSON")
+    args = parser.parse_args()
+
+    results = run(args.runs, args.connect_latency)
+    print(f"Cold start over {args.runs} runs (connect latency {args.connect_latency:g}s):")
+    print(f"  {'phase':<12} {'p50 ms':>9} {'min ms':>9} {'max ms':>9}")
+    for phase, stats in results.items():
+        print(f"  {phase:<12} {stats['p50_ms']:>9} {stats['min_ms']:>9} {stats['max_ms']:>9}")
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2) + "\n")
+
+    if args.budget is not None:
+        first_call = results["first_call"]["p50_ms"] / 1000
+        if first_call > args.budget:
+            print(f"Over budget: first call after {first_call:.3f}s > {args.budget:g}s")
+            sys.exit(1)
+        print(f"Within budget: first call after {first_call:.3f}s <= {args.budget:g}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,328 @@
+"""Benchmark: end-to-end tool latency and throughput on the fake backend.
+
+Runs the tools themselves (``run_command``, ``read_screen``,
+``watch_output`` and ``manage_session list``) against
+:class:`~iterm2_agent.fake_backend.FakeBackend` with scripted shells, so
+the numbers cover the tool code, scrollback capture and output shaping but
+no process or websocket. Each case reports p50/p95/p99 latency and
+throughput:
+
+* ``run_command`` over output sizes (``seq N``, 10 to 100k lines)
+* ``read_screen`` round-robin over 1 to 200 sessions
+* ``watch_output`` against background output at several update rates
+  (latency from the matching line being printed to the tool returning)
+* ``manage_session list`` over 1 to 200 sessions
+
+Results can be saved as JSON and compared with a saved run; the exit
+status is 1 when a case got slower than the baseline by more than the
+threshold.
+
+Usage:
+    python benchmarks/bench_tools.py [--output results.json]
+    python benchmarks/bench_tools.py --baseline results.json [--threshold 0.25]
+    python benchmarks/bench_tools.py --quick
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from types import SimpleNamespace
+
+from iterm2_agent.fake_backend import FakeBackend, scripted_shell
+from iterm2_agent.supervisor import ConnectionSupervisor
+from iterm2_agent.tools.manage_session import manage_session
+from iterm2_agent.tools.read_screen import read_screen
+from iterm2_agent.tools.run_command import run_command
+from iterm2_agent.tools.watch_output import watch_output
+
+SIZES = [10, 1_000, 10_000, 100_000]
+SESSIONS = [1, 10, 50, 200]
+RATES = [10, 100, 1_000]
+QUICK_SIZES = [10, 1_000]
+QUICK_SESSIONS = [1, 10]
+QUICK_RATES = [100]
+METRICS = ("p50_ms", "p95_ms", "p99_ms", "mean_ms")
+# Lines printed per background update in the watch_output cases
+LINES_PER_UPDATE = 5
+
+
+@dataclass
+class CaseResult:
+    """Latency distribution and throughput of one benchmark case."""
+
+    iterations: int
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    mean_ms: float
+    ops_per_sec: float
+    lines_per_sec: float | None = None
+
+
+def summarize(samples: list[float], elapsed: float, lines: int = 0) -> CaseResult:
+    """Percentiles of ``samples`` (seconds) and throughput over ``elapsed``."""
+    ordered = sorted(samples)
+    if len(ordered) > 1:
+        cuts = statistics.quantiles(ordered, n=100, method="inclusive")
+        p50, p95, p99 = cuts[49], cuts[94], cuts[98]
+    else:
+        p50 = p95 = p99 = ordered[0]
+    return CaseResult(
+        iterations=len(samples),
+        p50_ms=round(p50 * 1000, 3),
+        p95_ms=round(p95 * 1000, 3),
+        p99_ms=round(p99 * 1000, 3),
+        mean_ms=round(statistics.fmean(samples) * 1000, 3),
+        ops_per_sec=round(len(samples) / elapsed, 2),
+        lines_per_sec=round(lines / elapsed, 1) if lines else None,
+    )
+
+
+def iterations_for(lines: int, base: int) -> int:
+    """Fewer iterations for the big cases so each takes a similar time."""
+    return max(3, min(base, 200_000 // max(lines, 1)))
+
+
+class Harness:
+    """A supervisor on a fresh fake backend, and a tool context for it."""
+
+    def __init__(self, width: int = 80, height: int = 24, max_history: int = 10_000):
+        self.backend = FakeBackend(
+            scripted_shell(), width=width, height=height, max_history=max_history
+        )
+        self.supervisor = ConnectionSupervisor(self.backend)
+        self.ctx = SimpleNamespace(
+            request_context=SimpleNamespace(lifespan_context=self.supervisor)
+        )
+
+    async def __aenter__(self) -> Harness:
+        await self.supervisor.async_start()
+        await self.supervisor.wait_connected(timeout=5)
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.supervisor.async_close()
+
+    async def add_sessions(self, count: int) -> list[str]:
+        """Open windows until there are ``count`` sessions; return their IDs."""
+        while len(self.backend.app.sessions()) < count:
+            await self.backend.async_create_window(None)
+        return [session.session_id for session in self.backend.app.sessions()][:count]
+
+
+async def bench_run_command(size: int, iterations: int) -> CaseResult:
+    async with Harness(max_history=size + 1_000) as harness:
+        await run_command.fn(harness.ctx, "true", timeout=60)  # warm up
+        samples = []
+        start = time.perf_counter()
+        for _ in range(iterations):
+            began = time.perf_counter()
+            result = await run_command.fn(harness.ctx, f"seq {size}", timeout=120)
+            samples.append(time.perf_counter() - began)
+            if "Exit status: 0" not in result:
+                raise RuntimeError(f"run_command seq {size} failed:\n{result[-500:]}")
+        return summarize(samples, time.perf_counter() - start, size * iterations)
+
+
+async def bench_read_screen(sessions: int, iterations: int) -> CaseResult:
+    async with Harness() as harness:
+        session_ids = await harness.add_sessions(sessions)
+        for session in harness.backend.app.sessions():
+            session.shell.write("seq 30\r")
+        samples = []
+        start = time.perf_counter()
+        for i in range(iterations):
+            began = time.perf_counter()
+            await read_screen.fn(harness.ctx, session_id=session_ids[i % sessions])
+            samples.append(time.perf_counter() - began)
+        return summarize(samples, time.perf_counter() - start)
+
+
+async def bench_watch_output(rate: int, iterations: int) -> CaseResult:
+    async with Harness() as harness:
+        session = harness.backend.app.sessions()[0]
+        printed = 0
+
+        async def background() -> None:
+            nonlocal printed
+            while True:
+                text = "".join(
+                    f"INFO worker handled request {printed + i}\r\n"
+                    for i in range(LINES_PER_UPDATE)
+                )
+                session.output(text)
+                printed += LINES_PER_UPDATE
+                await asyncio.sleep(1 / rate)
+
+        feeder = asyncio.create_task(background())
+        samples = []
+        try:
+            start = time.perf_counter()
+            for i in range(iterations):
+                watcher = asyncio.create_task(
+                    watch_output.fn(
+                        harness.ctx, rf"^READY {i}$", timeout=30, new_output_only=True
+                    )
+                )
+                # Let the watcher subscribe before the line appears
+                await asyncio.sleep(0.01)
+                began = time.perf_counter()
+                session.output(f"READY {i}\r\n")
+                result = await watcher
+                samples.append(time.perf_counter() - began)
+                if "Pattern matched" not in result:
+                    raise RuntimeError(f"watch_output missed READY {i}:\n{result}")
+            elapsed = time.perf_counter() - start
+        finally:
+            feeder.cancel()
+        return summarize(samples, elapsed, printed)
+
+
+async def bench_list_sessions(sessions: int, iterations: int) -> CaseResult:
+    async with Harness() as harness:
+        await harness.add_sessions(sessions)
+        samples = []
+        start = time.perf_counter()
+        for _ in range(iterations):
+            began = time.perf_counter()
+            result = await manage_session.fn(harness.ctx, "list")
+            samples.append(time.perf_counter() - began)
+            if not result.startswith(f"Sessions ({sessions}):"):
+                raise RuntimeError(f"unexpected listing:\n{result[:200]}")
+        return summarize(samples, time.perf_counter() - start)
+
+
+async def run_all(args: argparse.Namespace) -> dict[str, CaseResult]:
+    cases = [
+        *(
+            (f"run_command/lines={n}", bench_run_command(n, iterations_for(n, args.iterations)))
+            for n in args.sizes
+        ),
+        *(
+            (f"read_screen/sessions={n}", bench_read_screen(n, args.iterations))
+            for n in args.sessions
+        ),
+        *(
+            (f"watch_output/rate={n}", bench_watch_output(n, max(3, args.iterations // 5)))
+            for n in args.rates
+        ),
+        *(
+            (f"manage_session_list/sessions={n}", bench_list_sessions(n, args.iterations))
+            for n in args.sessions
+        ),
+    ]
+    results = {}
+    print(f"{'case':<34} {'iter':>5} {'p50':>9} {'p95':>9} {'p99':>9} {'ops/s':>9} {'lines/s':>11}")
+    for name, case in cases:
+        if args.filter and args.filter not in name:
+            case.close()
+            continue
+        result = await case
+        results[name] = result
+        lines = f"{result.lines_per_sec:>11.0f}" if result.lines_per_sec else f"{'-':>11}"
+        print(
+            f"{name:<34} {result.iterations:>5} {result.p50_ms:>7.2f}ms"
+            f" {result.p95_ms:>7.2f}ms {result.p99_ms:>7.2f}ms"
+            f" {result.ops_per_sec:>9.1f} {lines}"
+        )
+    return results
+
+
+def compare(
+    results: dict[str, CaseResult],
+    baseline: dict[str, dict],
+    metric: str,
+    threshold: float,
+    noise_ms: float,
+) -> list[str]:
+    """Cases slower than the baseline by more than ``threshold`` (a ratio)
+    and by more than ``noise_ms``, as printable lines."""
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get(name, {}).get(metric)
+        if not before:
+            continue
+        after = getattr(result, metric)
+        if after > before * (1 + threshold) and after - before > noise_ms:
+            regressions.append(
+                f"{name}: {metric} {before:.2f}ms -> {after:.2f}ms (+{(after / before - 1):.0%})"
+            )
+    return regressions
+
+
+def git_commit() -> str | None:
+    try:
+        completed = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+            cwd=Path(__file__).resolve().parent,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return completed.stdout.strip()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--sizes", type=int, nargs="+", help=f"output lines (default {SIZES})")
+    parser.add_argument("--sessions", type=int, nargs="+", help=f"session counts (default {SESSIONS})")
+    parser.add_argument("--rates", type=int, nargs="+", help=f"updates per second (default {RATES})")
+    parser.add_argument("--quick", action="store_true", help="small matrix for a smoke run")
+    parser.add_argument("--filter", default="", help="only run cases whose name contains this")
+    parser.add_argument("--output", type=Path, help="write results as JSON")
+    parser.add_argument("--baseline", type=Path, help="JSON results to compare against")
+    parser.add_argument("--metric", choices=METRICS, default="p95_ms")
+    parser.add_argument(
+        "--threshold", type=float, default=0.25,
+        help="fail when a case is this much slower than the baseline (0.25 = 25%%)",
+    )
+    parser.add_argument(
+        "--noise-ms", type=float, default=0.5,
+        help="ignore slowdowns smaller than this many milliseconds",
+    )
+    args = parser.parse_args()
+    args.sizes = args.sizes or (QUICK_SIZES if args.quick else SIZES)
+    args.sessions = args.sessions or (QUICK_SESSIONS if args.quick else SESSIONS)
+    args.rates = args.rates or (QUICK_RATES if args.quick else RATES)
+    if args.quick:
+        args.iterations = min(args.iterations, 10)
+
+    # Reconnect and session index chatter is not part of the measurement
+    logging.basicConfig(level=logging.WARNING)
+    results = asyncio.run(run_all(args))
+
+    if args.output:
+        document = {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "results": {name: asdict(result) for name, result in results.items()},
+        }
+        args.output.write_text(json.dumps(document, indent=2) + "\n")
+        print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text())["results"]
+        regressions = compare(results, baseline, args.metric, args.threshold, args.noise_ms)
+        if regressions:
+            print(f"\nRegressions over {args.threshold:.0%} ({args.metric}):")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"\nNo regressions over {args.threshold:.0%} ({args.metric}) against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Benchmark: full-screen rescans vs incremental matching in watch_output.
+
+Replays a synthetic log feed (default 10k lines/sec for 10s) through the
+screen of a virtual terminal and compares the regex CPU cost of the old
+approach (search every visible line on every screen update) with
+:class:`~iterm2_agent.watchers.LineMatcher`.
+
+Usage:
+    python benchmarks/bench_watch_output.py [--rate 10000] [--seconds 10]
+"""
+
+from __future__ import annotations
+
+import argparse
+import re
+import time
+
+from iterm2_agent.watchers import LineMatcher
+
+PATTERN = r"ERROR|Traceback|panic:"
+
+
+def run_rescan(compiled, history, height, per_update) -> tuple[float, int]:
+    scanned = 0
+    start = time.process_time()
+    for end in range(per_update, len(history) + 1, per_update):
+        screen = history[max(0, end - height):end]
+        for line in screen:
+            scanned += 1
+            compiled.search(line)
+    return time.process_time() - start, scanned
+
+
+def run_incremental(compiled, history, height, per_update) -> tuple[float, int]:
+    matcher = LineMatcher(compiled)
+    start = time.process_time()
+    for end in range(per_update, len(history) + 1, per_update):
+        screen_top = max(0, end - height)
+        # Lines that scrolled past since the last update plus the screen
+        first = min(matcher.cursor, screen_top)
+        matcher.feed(first, history[first:end], screen_top)
+    return time.process_time() - start, matcher.scanned
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rate", type=int, default=10_000, help="lines per second")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--updates", type=int, default=200, help="screen updates per second")
+    parser.add_argument("--height", type=int, default=200, help="screen rows")
+    args = parser.parse_args()
+
+    total = int(args.rate * args.seconds)
+    per_update = max(1, args.rate // args.updates)
+    history = [
+        f"2024-01-01T00:00:{i % 60:02d} INFO worker-{i % 8} handled request id={i}"
+        for i in range(total)
+    ]
+    compiled = re.compile(PATTERN)
+
+    rescan_cpu, rescan_lines = run_rescan(compiled, history, args.height, per_update)
+    incr_cpu, incr_lines = run_incremental(compiled, history, args.height, per_update)
+
+    print(
+        f"feed: {total} lines, {per_update} lines/update, "
+        f"{args.height}-row screen"
+    )
+    print(f"rescan:      {rescan_cpu * 1000:8.1f} ms CPU  {rescan_lines:>10} lines scanned")
+    print(f"incremental: {incr_cpu * 1000:8.1f} ms CPU  {incr_lines:>10} lines scanned")
+    if incr_cpu > 0:
+        print(f"speedup:     {rescan_cpu / incr_cpu:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
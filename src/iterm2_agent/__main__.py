@@ -1,11 +1,69 @@
 """Entry point for iterm2-agent MCP server."""
 
+from __future__ import annotations
+
+import argparse
+import ipaddress
+import logging
+from dataclasses import replace
+from typing import Sequence
+
+from iterm2_agent.concurrency import ClientLimitMiddleware
+from iterm2_agent.config import TRANSPORTS, ConfigStore, ServerConfig
 from iterm2_agent.server import mcp
 import iterm2_agent.tools  # noqa: F401 — registers all tools
 
+logger = logging.getLogger(__name__)
+
+
+def parse_args(argv: Sequence[str] | None = None) -> ServerConfig:
+    """The ``[server]`` config with command-line overrides applied."""
+    parser = argparse.ArgumentParser(
+        prog="iterm2-agent",
+        description="MCP server for controlling iTerm2 terminal sessions.",
+    )
+    parser.add_argument("--transport", choices=TRANSPORTS, help="overrides [server] transport")
+    parser.add_argument("--host", help="address to bind for http/sse")
+    parser.add_argument("--port", type=int, help="port to bind for http/sse")
+    args = parser.parse_args(argv)
+    server = ConfigStore().current.server
+    overrides = {
+        key: value
+        for key, value in (("transport", args.transport), ("host", args.host), ("port", args.port))
+        if value is not None
+    }
+    return replace(server, **overrides)
+
+
+def _is_loopback(host: str) -> bool:
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    server = parse_args(argv)
+    if server.transport == "stdio":
+        mcp.run(transport="stdio")
+        return
 
-def main() -> None:
-    mcp.run(transport="stdio")
+    if not _is_loopback(server.host):
+        # Tools run shell commands and there is no authentication
+        logger.warning(
+            "Serving on non-loopback address %s: anyone who can reach it can "
+            "control your terminal",
+            server.host,
+        )
+    mcp.add_middleware(ClientLimitMiddleware(server.max_calls_per_client))
+    mcp.run(
+        transport=server.transport,
+        host=server.host,
+        port=server.port,
+        path=server.path,
+    )
 
 
 if __name__ == "__main__":
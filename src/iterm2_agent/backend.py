@@ -0,0 +1,244 @@
+"""Backends: how the server reaches a terminal application.
+
+Tools work with app, window, tab and session objects through the subset of
+the iterm2 API they use (``async_get_screen_contents``, ``async_send_text``,
+``get_screen_streamer``, ...), so any object providing those methods works.
+Everything that goes through the connection instead of such an object —
+connecting, creating windows, prompt monitors, layout and custom control
+sequence notifications — goes through a :class:`Backend`.
+:class:`ITerm2Backend` talks to iTerm2;
+:class:`~iterm2_agent.fake_backend.FakeBackend` emulates it in process.
+"""
+
+from __future__ import annotations
+
+import os
+from typing import Any, Awaitable, Callable, Protocol
+
+import iterm2
+import iterm2.app
+from iterm2 import api_pb2
+
+BACKEND_ENV_VAR = "ITERM2_AGENT_BACKEND"
+# Seconds each fake connect takes, e.g. to benchmark startup realistically
+FAKE_CONNECT_LATENCY_ENV_VAR = "ITERM2_AGENT_FAKE_CONNECT_LATENCY"
+BACKEND_NAMES = ("iterm2", "fake")
+
+LayoutCallback = Callable[[list[iterm2.Window]], Awaitable[None]]
+SessionCallback = Callable[[str], Awaitable[None]]
+# (session ID, sender identity, payload) of a custom control sequence
+SequenceCallback = Callable[[str, str, str], Awaitable[None]]
+
+
+class Backend(Protocol):
+    """Connection-level operations of a terminal application."""
+
+    name: str
+
+    async def async_connect(self) -> tuple[Any, Any]:
+        """Open a connection and fetch the app hierarchy."""
+
+    async def async_wait_closed(self, connection: Any) -> None:
+        """Return once ``connection`` has closed."""
+
+    def fail_pending_requests(self, connection: Any) -> None:
+        """Fail requests still waiting for a reply on a closed connection."""
+
+    async def async_close_connection(self, connection: Any) -> None:
+        """Close ``connection``; used to drop one that failed to set up."""
+
+    async def async_close(self) -> None:
+        """Release whatever the backend owns; called on server shutdown."""
+
+    async def async_create_window(self, connection: Any) -> iterm2.Window:
+        """Open a new window with one session."""
+
+    async def async_get_last_prompt(self, connection: Any, session_id: str) -> Any:
+        """The session's last shell-integration prompt, or None."""
+
+    def prompt_monitor(
+        self,
+        connection: Any,
+        session_id: str,
+        modes: list[iterm2.PromptMonitor.Mode] | None = None,
+    ) -> iterm2.PromptMonitor:
+        """An async context manager delivering prompt events."""
+
+    async def async_subscribe_layout(self, connection: Any, callback: LayoutCallback) -> Any:
+        """Call ``callback(windows)`` whenever the window layout changes."""
+
+    async def async_subscribe_new_session(self, connection: Any, callback: SessionCallback) -> Any:
+        """Call ``callback(session_id)`` when a session is created."""
+
+    async def async_subscribe_terminate_session(
+        self, connection: Any, callback: SessionCallback
+    ) -> Any:
+        """Call ``callback(session_id)`` when a session ends."""
+
+    async def async_subscribe_custom_sequence(
+        self, connection: Any, callback: SequenceCallback
+    ) -> Any:
+        """Call ``callback(session_id, identity, payload)`` for every
+        ``OSC 1337 ; Custom=id=<identity>:<payload> ST`` printed in a session."""
+
+    async def async_unsubscribe(self, connection: Any, token: Any) -> None:
+        """Cancel a subscription made by one of the subscribe methods."""
+
+    async def async_list_windows(self, connection: Any) -> list[iterm2.Window]:
+        """A fresh listing of all windows, tabs and sessions."""
+
+
+class ITerm2Backend:
+    """The real thing, over the iTerm2 websocket API."""
+
+    name = "iterm2"
+
+    async def async_connect(self) -> tuple[iterm2.Connection, iterm2.App]:
+        connection = await iterm2.Connection.async_create()
+        # The app object is a process-wide singleton bound to the connection it
+        # was built on; drop it so a reconnect does not reuse the dead one
+        iterm2.app.invalidate_app()
+        app = await iterm2.async_get_app(connection)
+        return connection, app
+
+    async def async_wait_closed(self, connection: iterm2.Connection) -> None:
+        websocket = connection.websocket
+        if websocket is None:
+            return
+        await websocket.wait_closed()
+
+    def fail_pending_requests(self, connection: iterm2.Connection) -> None:
+        """Fail RPCs still waiting for a reply on a closed connection.
+
+        The iterm2 library leaves these futures pending forever when the
+        websocket closes; its receiver list is private, so this is best effort.
+        """
+        # Imported here: connection.py imports this module
+        from iterm2_agent.connection import ConnectionLostError
+
+        receivers = getattr(connection, "_Connection__receivers", None) or []
+        for _match, future in receivers:
+            if not future.done():
+                future.set_exception(ConnectionLostError())
+        receivers.clear()
+
+    async def async_close_connection(self, connection: iterm2.Connection) -> None:
+        websocket = connection.websocket
+        if websocket is None:
+            return
+        try:
+            await websocket.close()
+        except Exception:  # already closing or gone
+            pass
+
+    async def async_close(self) -> None:
+        pass  # iTerm2 and its sessions outlive the server
+
+    async def async_create_window(self, connection: iterm2.Connection) -> iterm2.Window:
+        return await iterm2.Window.async_create(connection)
+
+    async def async_get_last_prompt(
+        self, connection: iterm2.Connection, session_id: str
+    ) -> iterm2.Prompt | None:
+        return await iterm2.async_get_last_prompt(connection, session_id)
+
+    def prompt_monitor(
+        self,
+        connection: iterm2.Connection,
+        session_id: str,
+        modes: list[iterm2.PromptMonitor.Mode] | None = None,
+    ) -> iterm2.PromptMonitor:
+        if modes is None:
+            return iterm2.PromptMonitor(connection, session_id)
+        return iterm2.PromptMonitor(connection, session_id, modes=modes)
+
+    async def async_subscribe_layout(
+        self, connection: iterm2.Connection, callback: LayoutCallback
+    ) -> Any:
+        async def on_layout_change(
+            connection: iterm2.Connection,
+            notification: api_pb2.LayoutChangedNotification,
+        ) -> None:
+            await callback(
+                _windows_from_layout(connection, notification.list_sessions_response)
+            )
+
+        return await iterm2.notifications.async_subscribe_to_layout_change_notification(
+            connection, on_layout_change
+        )
+
+    async def async_subscribe_new_session(
+        self, connection: iterm2.Connection, callback: SessionCallback
+    ) -> Any:
+        async def on_new_session(
+            connection: iterm2.Connection,
+            notification: api_pb2.NewSessionNotification,
+        ) -> None:
+            await callback(notification.session_id)
+
+        return await iterm2.notifications.async_subscribe_to_new_session_notification(
+            connection, on_new_session
+        )
+
+    async def async_subscribe_terminate_session(
+        self, connection: iterm2.Connection, callback: SessionCallback
+    ) -> Any:
+        async def on_terminate_session(
+            connection: iterm2.Connection,
+            notification: api_pb2.TerminateSessionNotification,
+        ) -> None:
+            await callback(notification.session_id)
+
+        return await iterm2.notifications.async_subscribe_to_terminate_session_notification(
+            connection, on_terminate_session
+        )
+
+    async def async_subscribe_custom_sequence(
+        self, connection: iterm2.Connection, callback: SequenceCallback
+    ) -> Any:
+        async def on_custom_sequence(
+            connection: iterm2.Connection,
+            notification: api_pb2.CustomEscapeSequenceNotification,
+        ) -> None:
+            await callback(
+                notification.session, notification.sender_identity, notification.payload
+            )
+
+        return await iterm2.notifications.async_subscribe_to_custom_escape_sequence_notification(
+            connection, on_custom_sequence
+        )
+
+    async def async_unsubscribe(self, connection: iterm2.Connection, token: Any) -> None:
+        await iterm2.notifications.async_unsubscribe(connection, token)
+
+    async def async_list_windows(self, connection: iterm2.Connection) -> list[iterm2.Window]:
+        response = await iterm2.rpc.async_list_sessions(connection)
+        return _windows_from_layout(connection, response.list_sessions_response)
+
+
+def _windows_from_layout(
+    connection: iterm2.Connection,
+    response: api_pb2.ListSessionsResponse,
+) -> list[iterm2.Window]:
+    windows = (iterm2.Window.create_from_proto(connection, w) for w in response.windows)
+    return [window for window in windows if window is not None]
+
+
+def create_backend(name: str | None = None) -> Backend:
+    """Build a backend by name; None reads $ITERM2_AGENT_BACKEND (default iterm2).
+
+    Raises:
+        ValueError: For an unknown name.
+    """
+    if name is None:
+        name = os.environ.get(BACKEND_ENV_VAR) or "iterm2"
+    if name == "iterm2":
+        return ITerm2Backend()
+    if name == "fake":
+        # Only loaded when asked for; it spawns shells on a pseudo-terminal
+        from iterm2_agent.fake_backend import FakeBackend
+
+        latency = float(os.environ.get(FAKE_CONNECT_LATENCY_ENV_VAR) or 0)
+        return FakeBackend(connect_latency=latency)
+    valid = ", ".join(BACKEND_NAMES)
+    raise ValueError(f"Unknown backend: {name!r}. Valid options: {valid}")
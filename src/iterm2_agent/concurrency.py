@@ -0,0 +1,193 @@
+"""Coalescing of identical read-only tool calls and per-session write locks.
+
+MCP clients may issue tool calls in parallel. Read-only tools decorated
+with :func:`coalesced` share one execution between identical calls that
+are in flight at the same time. Tools that type into a session take that
+session's locks from :class:`SessionLocks`, so two writers never
+interleave keystrokes and two commands never run in one pane at once.
+When many clients share one server, :class:`ClientLimitMiddleware` caps
+the calls each of them has in flight, and :func:`client_id` tells whose
+watchers and jobs a call may list.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import inspect
+import weakref
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Hashable, Mapping, TypeVar
+
+from fastmcp.server.middleware import CallNext, Middleware, MiddlewareContext
+
+_F = TypeVar("_F", bound=Callable[..., Awaitable[Any]])
+
+
+def client_id(ctx: Any) -> str | None:
+    """The MCP session a tool call came from, or None outside of one."""
+    try:
+        return ctx.session_id
+    except (AttributeError, RuntimeError):  # no MCP session (yet)
+        return None
+
+
+def shared_call(ctx: Any) -> bool:
+    """True for a call over HTTP or SSE, where other clients may share the server."""
+    request_context = getattr(ctx, "request_context", None)
+    return getattr(request_context, "request", None) is not None
+
+
+class SessionBusyError(RuntimeError):
+    """Another command was still running in the session when time ran out."""
+
+    def __init__(self, session_id: str) -> None:
+        super().__init__(f"Session {session_id} is busy: another command is still running")
+
+
+class SingleFlight:
+    """Runs one coroutine per key at a time; concurrent callers share it."""
+
+    def __init__(self) -> None:
+        self._calls: dict[Hashable, asyncio.Task[Any]] = {}
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    async def run(self, key: Hashable, call: Callable[[], Awaitable[Any]]) -> Any:
+        """Await ``call()``, or the call already in flight for ``key``."""
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(call())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._forget(key, task))
+        # A caller that gives up must not cancel the call for the others
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task[Any]) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+
+
+def coalesced(
+    when: Callable[[Mapping[str, Any]], bool] | None = None,
+) -> Callable[[_F], _F]:
+    """Share one execution between identical concurrent calls of a tool.
+
+    Calls are identical when every argument except the MCP context is
+    equal, and they belong to the same server (lifespan context). Only for
+    tools that use the MCP context to reach the connection: the first
+    caller's context serves everyone. ``when`` receives the bound arguments
+    and limits coalescing to read-only uses, e.g. one action of a tool.
+    """
+
+    def decorate(fn: _F) -> _F:
+        signature = inspect.signature(fn)
+        flights = SingleFlight()
+
+        @functools.wraps(fn)
+        async def wrapper(ctx: Any, *args: Any, **kwargs: Any) -> Any:
+            bound = signature.bind(ctx, *args, **kwargs)
+            bound.apply_defaults()
+            arguments = dict(bound.arguments)
+            del arguments[next(iter(signature.parameters))]
+            if when is not None and not when(arguments):
+                return await fn(ctx, *args, **kwargs)
+            key = (id(ctx.request_context.lifespan_context), *arguments.items())
+            try:
+                hash(key)
+            except TypeError:  # list arguments and the like
+                return await fn(ctx, *args, **kwargs)
+            return await flights.run(key, lambda: fn(ctx, *args, **kwargs))
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorate
+
+
+class SessionLocks:
+    """Per-session locks for tools that write to a session.
+
+    ``typing`` is held just while keystrokes are sent, by every writer.
+    ``command`` is held by ``run_command`` for the whole command, so
+    commands queue up per session while ``send_text`` and ``send_control``
+    can still answer a prompt or interrupt the running one.
+    """
+
+    def __init__(self) -> None:
+        # Locks nobody holds or waits for are dropped with their last reference
+        self._typing: weakref.WeakValueDictionary[str, asyncio.Lock] = (
+            weakref.WeakValueDictionary()
+        )
+        self._commands: weakref.WeakValueDictionary[str, asyncio.Lock] = (
+            weakref.WeakValueDictionary()
+        )
+
+    @staticmethod
+    def _lock(locks: weakref.WeakValueDictionary[str, asyncio.Lock], key: str) -> asyncio.Lock:
+        lock = locks.get(key)
+        if lock is None:
+            lock = locks[key] = asyncio.Lock()
+        return lock
+
+    def typing(self, session_id: str) -> asyncio.Lock:
+        """Lock held while sending text to the session."""
+        return self._lock(self._typing, session_id)
+
+    @asynccontextmanager
+    async def command(
+        self, session_id: str, timeout: float | None
+    ) -> AsyncIterator[float | None]:
+        """Hold the session's command lock, waiting at most ``timeout`` seconds.
+
+        Yields the part of ``timeout`` left after waiting (None: no limit).
+
+        Raises:
+            SessionBusyError: If the lock was not free in time.
+        """
+        lock = self._lock(self._commands, session_id)
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        try:
+            await asyncio.wait_for(lock.acquire(), timeout)
+        except asyncio.TimeoutError:
+            raise SessionBusyError(session_id) from None
+        try:
+            yield None if timeout is None else max(0.0, timeout - (loop.time() - start))
+        finally:
+            lock.release()
+
+
+class ClientLimiter:
+    """Per-client semaphores bounding the calls a client has in flight."""
+
+    def __init__(self, limit: int) -> None:
+        self.limit = limit
+        self._slots: weakref.WeakValueDictionary[str, asyncio.Semaphore] = (
+            weakref.WeakValueDictionary()
+        )
+
+    def slot(self, client: str) -> asyncio.Semaphore:
+        """The semaphore to hold while one of the client's calls runs."""
+        semaphore = self._slots.get(client)
+        if semaphore is None:
+            semaphore = self._slots[client] = asyncio.Semaphore(self.limit)
+        return semaphore
+
+
+class ClientLimitMiddleware(Middleware):
+    """Makes a client's extra ``tools/call`` requests wait for a free slot.
+
+    Keyed by MCP session, so one client flooding a shared server queues
+    behind itself instead of crowding out the others.
+    """
+
+    def __init__(self, limit: int) -> None:
+        self.limiter = ClientLimiter(limit)
+
+    async def on_call_tool(self, context: MiddlewareContext, call_next: CallNext) -> Any:
+        client = client_id(context.fastmcp_context)
+        if client is None:
+            return await call_next(context)
+        async with self.limiter.slot(client):
+            return await call_next(context)
@@ -0,0 +1,437 @@
+"""Server configuration loaded from TOML, with mtime-polling hot reload."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import re
+import tomllib
+from dataclasses import dataclass, field
+from pathlib import Path
+from types import MappingProxyType
+from typing import Any, Mapping
+
+from iterm2_agent.security import (
+    DEFAULT_RULES,
+    RuleSet,
+    SecurityGuard,
+    SecurityLevel,
+)
+from iterm2_agent.shaping import (
+    DEFAULT_ERROR_PATTERNS,
+    DEFAULT_ERROR_RE,
+    OutputConfig,
+    compile_error_patterns,
+)
+
+logger = logging.getLogger(__name__)
+
+CONFIG_ENV_VAR = "ITERM2_AGENT_CONFIG"
+USER_CONFIG_PATH = Path("~/.iterm2-agent/config.toml")
+# config/default.toml of a source checkout
+BUNDLED_CONFIG_PATH = Path(__file__).resolve().parents[2] / "config" / "default.toml"
+DEFAULT_POLL_INTERVAL = 2.0
+TRANSPORTS = ("stdio", "http", "streamable-http", "sse")
+
+
+class ConfigError(ValueError):
+    """A configuration file has an invalid value."""
+
+
+@dataclass(frozen=True)
+class ServerConfig:
+    """How the server is reached. Read once at startup; changes need a restart.
+
+    ``stdio`` serves the one client that spawned the process. ``http``
+    (streamable HTTP) and ``sse`` run a daemon on ``host:port`` that many
+    clients share, each with at most ``max_calls_per_client`` tool calls
+    in flight.
+    """
+
+    transport: str = "stdio"
+    host: str = "127.0.0.1"
+    port: int = 8765
+    path: str = "/mcp"
+    max_calls_per_client: int = 8
+
+
+@dataclass(frozen=True)
+class SecurityConfig:
+    """Command classification settings.
+
+    ``rules`` is built from the built-in prefix sets plus ``allow`` and
+    ``deny`` when the configuration is loaded.
+    """
+
+    warn_on_dangerous: bool = True
+    allow: tuple[str, ...] = ()
+    deny: tuple[str, ...] = ()
+    rules: RuleSet = DEFAULT_RULES
+
+    def warning(self, command: str) -> str:
+        """Classify a command and return the warning to show, if any."""
+        level = SecurityGuard.check(command, self.rules)
+        if level == SecurityLevel.DANGEROUS and not self.warn_on_dangerous:
+            return ""
+        return SecurityGuard.format_warning(command, level)
+
+
+@dataclass(frozen=True)
+class TimeoutConfig:
+    """Default timeouts, in seconds, for tools called without one."""
+
+    command: float = 30
+    watch: float = 60
+    idle_threshold: int = 2
+    tools: Mapping[str, float] = field(default_factory=lambda: MappingProxyType({}))
+
+    def for_tool(self, tool: str) -> float:
+        """Default timeout for a tool: its override, else its section key."""
+        if tool in self.tools:
+            return self.tools[tool]
+        return self.watch if tool == "watch_output" else self.command
+
+
+@dataclass(frozen=True)
+class MetricsConfig:
+    """Instrumentation settings; see :mod:`iterm2_agent.metrics`."""
+
+    enabled: bool = False
+    dump_path: Path | None = None
+    dump_format: str = "prometheus"
+    dump_interval: float = 15
+
+
+@dataclass(frozen=True)
+class JobsConfig:
+    """Background job limits; see :mod:`iterm2_agent.jobs`."""
+
+    max_concurrent: int = 8
+    max_finished: int = 100
+    cancel_grace: float = 5
+
+
+@dataclass(frozen=True)
+class WatchersConfig:
+    """Caps on background watchers; see :mod:`iterm2_agent.watchers`."""
+
+    max_watchers: int = 32
+    max_patterns: int = 16
+    max_events: int = 1000
+    default_ttl: float = 600
+    max_ttl: float = 3600
+
+
+@dataclass(frozen=True)
+class SignalsConfig:
+    """Shell-to-agent signals; see :mod:`iterm2_agent.signals`."""
+
+    identity: str = "iterm2-agent"
+    max_queued: int = 100
+
+
+@dataclass(frozen=True)
+class Config:
+    """One immutable snapshot of the configuration."""
+
+    server: ServerConfig = field(default_factory=ServerConfig)
+    security: SecurityConfig = field(default_factory=SecurityConfig)
+    timeouts: TimeoutConfig = field(default_factory=TimeoutConfig)
+    output: OutputConfig = field(default_factory=OutputConfig)
+    metrics: MetricsConfig = field(default_factory=MetricsConfig)
+    jobs: JobsConfig = field(default_factory=JobsConfig)
+    watchers: WatchersConfig = field(default_factory=WatchersConfig)
+    signals: SignalsConfig = field(default_factory=SignalsConfig)
+    path: Path | None = None
+
+
+def default_config_path() -> Path | None:
+    """The file to load: $ITERM2_AGENT_CONFIG, the user config, or the
+    bundled default — whichever comes first and exists."""
+    env = os.environ.get(CONFIG_ENV_VAR)
+    if env:
+        return Path(env).expanduser()
+    for path in (USER_CONFIG_PATH.expanduser(), BUNDLED_CONFIG_PATH):
+        if path.is_file():
+            return path
+    return None
+
+
+def load_config(path: Path | None) -> Config:
+    """Parse a TOML file into a :class:`Config`; None gives the defaults.
+
+    Raises:
+        OSError: If the file cannot be read.
+        tomllib.TOMLDecodeError: If the file is not valid TOML.
+        ConfigError: If a value has the wrong type.
+    """
+    if path is None:
+        return Config()
+    with open(path, "rb") as f:
+        data = tomllib.load(f)
+    return parse_config(data, path)
+
+
+def parse_config(data: Mapping[str, Any], path: Path | None = None) -> Config:
+    """Build a :class:`Config` from parsed TOML; missing keys use defaults."""
+    server = _table(data, "server")
+    security = _table(data, "security")
+    timeouts = _table(data, "timeouts")
+    output = _table(data, "output")
+    metrics = _table(data, "metrics")
+    jobs = _table(data, "jobs")
+    watchers = _table(data, "watchers")
+    signals = _table(data, "signals")
+
+    allow = _prefixes(security, "allow")
+    deny = _prefixes(security, "deny")
+    tools = _table(timeouts, "tools")
+    tool_timeouts = {name: _seconds(tools, name) for name in tools}
+    defaults = TimeoutConfig()
+    idle_threshold = timeouts.get("idle_threshold", defaults.idle_threshold)
+    if type(idle_threshold) is not int or idle_threshold < 1:
+        raise ConfigError("timeouts.idle_threshold must be a positive integer")
+    warn = security.get("warn_on_dangerous", True)
+    if not isinstance(warn, bool):
+        raise ConfigError("security.warn_on_dangerous must be true or false")
+
+    return Config(
+        server=_server_config(server),
+        security=SecurityConfig(
+            warn_on_dangerous=warn,
+            allow=allow,
+            deny=deny,
+            rules=RuleSet(allow=allow, deny=deny) if allow or deny else DEFAULT_RULES,
+        ),
+        timeouts=TimeoutConfig(
+            command=_seconds(timeouts, "command", defaults.command),
+            watch=_seconds(timeouts, "watch", defaults.watch),
+            idle_threshold=idle_threshold,
+            tools=MappingProxyType(tool_timeouts),
+        ),
+        output=_output_config(output),
+        metrics=_metrics_config(metrics),
+        jobs=_jobs_config(jobs),
+        watchers=_watchers_config(watchers),
+        signals=_signals_config(signals),
+        path=path,
+    )
+
+
+def _server_config(table: Mapping[str, Any]) -> ServerConfig:
+    defaults = ServerConfig()
+    transport = table.get("transport", defaults.transport)
+    if transport not in TRANSPORTS:
+        raise ConfigError(f"server.transport must be one of: {', '.join(TRANSPORTS)}")
+    host = table.get("host", defaults.host)
+    if not isinstance(host, str) or not host:
+        raise ConfigError("server.host must be a non-empty string")
+    port = table.get("port", defaults.port)
+    if type(port) is not int or not 0 < port < 65536:
+        raise ConfigError("server.port must be an integer from 1 to 65535")
+    path = table.get("path", defaults.path)
+    if not isinstance(path, str) or not path.startswith("/"):
+        raise ConfigError('server.path must be a string starting with "/"')
+    calls = table.get("max_calls_per_client", defaults.max_calls_per_client)
+    if type(calls) is not int or calls < 1:
+        raise ConfigError("server.max_calls_per_client must be a positive integer")
+    return ServerConfig(
+        transport=transport,
+        host=host,
+        port=port,
+        path=path,
+        max_calls_per_client=calls,
+    )
+
+
+def _metrics_config(table: Mapping[str, Any]) -> MetricsConfig:
+    defaults = MetricsConfig()
+    enabled = table.get("enabled", defaults.enabled)
+    if not isinstance(enabled, bool):
+        raise ConfigError("metrics.enabled must be true or false")
+    dump_path = table.get("dump_path", "")
+    if not isinstance(dump_path, str):
+        raise ConfigError("metrics.dump_path must be a string")
+    dump_format = table.get("dump_format", defaults.dump_format)
+    if dump_format not in ("prometheus", "json"):
+        raise ConfigError('metrics.dump_format must be "prometheus" or "json"')
+    interval = table.get("dump_interval", defaults.dump_interval)
+    if isinstance(interval, bool) or not isinstance(interval, (int, float)) or interval <= 0:
+        raise ConfigError("metrics.dump_interval must be a positive number of seconds")
+    return MetricsConfig(
+        enabled=enabled,
+        dump_path=Path(dump_path) if dump_path else None,
+        dump_format=dump_format,
+        dump_interval=interval,
+    )
+
+
+def _jobs_config(table: Mapping[str, Any]) -> JobsConfig:
+    defaults = JobsConfig()
+    counts = {}
+    for key in ("max_concurrent", "max_finished"):
+        value = table.get(key, getattr(defaults, key))
+        if type(value) is not int or value < 1:
+            raise ConfigError(f"jobs.{key} must be a positive integer")
+        counts[key] = value
+    grace = table.get("cancel_grace", defaults.cancel_grace)
+    if isinstance(grace, bool) or not isinstance(grace, (int, float)) or grace < 0:
+        raise ConfigError("jobs.cancel_grace must be a number of seconds >= 0")
+    return JobsConfig(**counts, cancel_grace=grace)
+
+
+def _watchers_config(table: Mapping[str, Any]) -> WatchersConfig:
+    defaults = WatchersConfig()
+    values = {}
+    for key in ("max_watchers", "max_patterns", "max_events"):
+        value = table.get(key, getattr(defaults, key))
+        if type(value) is not int or value < 1:
+            raise ConfigError(f"watchers.{key} must be a positive integer")
+        values[key] = value
+    for key in ("default_ttl", "max_ttl"):
+        value = table.get(key, getattr(defaults, key))
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0:
+            raise ConfigError(f"watchers.{key} must be a positive number of seconds")
+        values[key] = value
+    if values["default_ttl"] > values["max_ttl"]:
+        raise ConfigError("watchers.default_ttl must not exceed watchers.max_ttl")
+    return WatchersConfig(**values)
+
+
+def _signals_config(table: Mapping[str, Any]) -> SignalsConfig:
+    defaults = SignalsConfig()
+    identity = table.get("identity", defaults.identity)
+    # The identity ends at the first ":" of the control sequence
+    if not isinstance(identity, str) or not identity or ":" in identity:
+        raise ConfigError('signals.identity must be a non-empty string without ":"')
+    max_queued = table.get("max_queued", defaults.max_queued)
+    if type(max_queued) is not int or max_queued < 1:
+        raise ConfigError("signals.max_queued must be a positive integer")
+    return SignalsConfig(identity=identity, max_queued=max_queued)
+
+
+def _output_config(table: Mapping[str, Any]) -> OutputConfig:
+    defaults = OutputConfig()
+    max_lines = _count(table, "max_lines", defaults.max_lines, 1)
+    sizes = {
+        key: _count(table, key, getattr(defaults, key), minimum)
+        for key, minimum in (
+            ("max_bytes", 1),
+            ("max_line_length", 0),
+            ("collapse_repeats", 0),
+            ("max_error_lines", 0),
+        )
+    }
+    # Unless set, a quarter of the lines come from the head (100 of 400)
+    sizes["max_lines"] = max_lines
+    sizes["head_lines"] = _count(table, "head_lines", max_lines // 4, 0)
+    if sizes["head_lines"] > max_lines:
+        raise ConfigError("output.head_lines must not exceed output.max_lines")
+    if sizes["collapse_repeats"] == 1:
+        raise ConfigError("output.collapse_repeats must be 0 (off) or at least 2")
+
+    patterns = table.get("error_patterns", list(DEFAULT_ERROR_PATTERNS))
+    if not isinstance(patterns, list) or not all(isinstance(p, str) for p in patterns):
+        raise ConfigError("output.error_patterns must be a list of strings")
+    patterns = tuple(patterns)
+    if patterns == DEFAULT_ERROR_PATTERNS:
+        errors = DEFAULT_ERROR_RE
+    else:
+        try:
+            errors = compile_error_patterns(patterns)
+        except re.error as exc:
+            raise ConfigError(f"output.error_patterns: invalid regex: {exc}") from None
+    return OutputConfig(**sizes, error_patterns=patterns, errors=errors)
+
+
+def _table(data: Mapping[str, Any], key: str) -> Mapping[str, Any]:
+    value = data.get(key, {})
+    if not isinstance(value, dict):
+        raise ConfigError(f"[{key}] must be a table")
+    return value
+
+
+def _prefixes(table: Mapping[str, Any], key: str) -> tuple[str, ...]:
+    value = table.get(key, [])
+    if not isinstance(value, list) or not all(isinstance(v, str) for v in value):
+        raise ConfigError(f"security.{key} must be a list of strings")
+    return tuple(v.strip() for v in value if v.strip())
+
+
+def _count(table: Mapping[str, Any], key: str, default: int, minimum: int) -> int:
+    value = table.get(key, default)
+    if type(value) is not int or value < minimum:
+        raise ConfigError(f"output.{key} must be an integer >= {minimum}")
+    return value
+
+
+def _seconds(table: Mapping[str, Any], key: str, default: float = 0) -> float:
+    value = table.get(key, default)
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0:
+        raise ConfigError(f"timeout {key!r} must be a positive number of seconds")
+    return value
+
+
+class ConfigStore:
+    """Holds the current :class:`Config` and reloads it when the file changes.
+
+    Readers use ``current``, a plain attribute holding an immutable
+    snapshot, so the request path never touches the filesystem. A
+    background task polls the file's mtime and swaps in a new snapshot
+    after a successful parse; a broken edit keeps the previous one.
+    """
+
+    def __init__(
+        self,
+        path: Path | None = None,
+        poll_interval: float = DEFAULT_POLL_INTERVAL,
+    ) -> None:
+        self.path = path if path is not None else default_config_path()
+        self.poll_interval = poll_interval
+        self._mtime = self._stat()
+        try:
+            self.current = load_config(self.path)
+        except (OSError, tomllib.TOMLDecodeError, ConfigError) as exc:
+            logger.warning("Ignoring config %s: %s", self.path, exc)
+            self.current = Config()
+        self._task: asyncio.Task | None = None
+
+    def _stat(self) -> int | None:
+        if self.path is None:
+            return None
+        try:
+            return self.path.stat().st_mtime_ns
+        except OSError:
+            return None
+
+    def reload_if_changed(self) -> bool:
+        """Reload if the file's mtime changed; True if a new config is live."""
+        mtime = self._stat()
+        if mtime == self._mtime:
+            return False
+        self._mtime = mtime
+        try:
+            self.current = load_config(self.path if mtime is not None else None)
+        except (OSError, tomllib.TOMLDecodeError, ConfigError) as exc:
+            logger.warning("Keeping previous config, %s is invalid: %s", self.path, exc)
+            return False
+        return True
+
+    def start(self) -> None:
+        """Start polling for changes (idempotent; no-op without a file)."""
+        if self.path is None or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._poll())
+
+    async def _poll(self) -> None:
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            self.reload_if_changed()
+
+    async def async_close(self) -> None:
+        """Stop polling."""
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
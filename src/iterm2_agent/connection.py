@@ -2,22 +2,245 @@
 
 from __future__ import annotations
 
-from dataclasses import dataclass
+import asyncio
+import itertools
+import operator
+import time
+from array import array
+from collections.abc import Sequence
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Iterable, Iterator, TypeVar, overload
 
 import iterm2
+from iterm2 import api_pb2
+
+from iterm2_agent import metrics
+from iterm2_agent.backend import Backend, ITerm2Backend
+from iterm2_agent.concurrency import SessionLocks
+from iterm2_agent.config import ConfigStore
+from iterm2_agent.jobs import JobScheduler
+from iterm2_agent.metrics import METRICS
+from iterm2_agent.scrollback import ScrollbackStore
+from iterm2_agent.session_index import SessionIndex
+from iterm2_agent.signals import SignalHub
+from iterm2_agent.snapshots import SnapshotStore
+from iterm2_agent.watchers import WatcherRegistry
+
+# Screen must stay unchanged this long after reacting to count as settled
+DEFAULT_SETTLE_QUIET = 0.05
+# Upper bound on how long to wait for the screen to react and settle
+DEFAULT_SETTLE_MAX_WAIT = 0.5
+# Screen reads are shared this long when no streamer reports changes
+DEFAULT_SCREEN_TTL = 0.25
+
+_T = TypeVar("_T")
+
+# Style run flags of a CompactScreen
+BOLD = 1
+FAINT = 2
+ITALIC = 4
+UNDERLINE = 8
+STRIKETHROUGH = 16
+INVERSE = 32
+BLINK = 64
+INVISIBLE = 128
+_FLAG_FIELDS = (
+    ("bold", BOLD), ("faint", FAINT), ("italic", ITALIC), ("underline", UNDERLINE),
+    ("strikethrough", STRIKETHROUGH), ("inverse", INVERSE), ("blink", BLINK),
+    ("invisible", INVISIBLE),
+)
+# Style run colors: 0-255 is the 256-color palette, rgb_color() 24-bit colors
+DEFAULT_COLOR = -1
+RED = (1, 9)  # ANSI red and bright red
+# (row, first offset, end offset, foreground, background, flags) per run
+_RUN_FIELDS = 6
+_HARD_EOL = api_pb2.LineContents.Continuation.Value("CONTINUATION_HARD_EOL")
+
+
+def rgb_color(red: int, green: int, blue: int) -> int:
+    """A 24-bit color as stored in style runs, above the palette range."""
+    return 1 << 24 | red << 16 | green << 8 | blue
+
+
+class ConnectionLostError(RuntimeError):
+    """The websocket to iTerm2 dropped; the server is reconnecting."""
+
+    message = "iTerm2 connection lost; reconnecting — retry shortly"
+
+    def __init__(self, detail: str = "") -> None:
+        super().__init__(f"{self.message} ({detail})" if detail else self.message)
+
+
+class NotConnectedError(ConnectionLostError):
+    """iTerm2 has not been reached since the server started; still trying."""
+
+    message = (
+        "Not connected to iTerm2 yet — is it running with the Python API "
+        "enabled? Retrying in the background"
+    )
+
+
+class ScreenCache:
+    """Per-session screen contents shared between tool calls.
+
+    Callers asking for the same session while a read is in flight share
+    that read. A finished read is reused for ``ttl`` seconds, or for as long
+    as a screen streamer is listening for the session (the scrollback
+    follower reports through :meth:`listen` and :meth:`changed`), since
+    any change would have woken it. Streamers drop updates that arrive
+    while nobody is waiting, so a read only counts as watched if it
+    started after the streamer began waiting. Tools call
+    :meth:`invalidate` after sending input.
+    """
+
+    def __init__(self, ttl: float = DEFAULT_SCREEN_TTL) -> None:
+        self.ttl = ttl
+        # session ID -> (epoch the read started, monotonic time, contents)
+        self._entries: dict[str, tuple[int, float, iterm2.ScreenContents]] = {}
+        self._inflight: dict[str, asyncio.Task[iterm2.ScreenContents]] = {}
+        # Epochs at which a streamer started waiting / the screen last changed
+        self._listening: dict[str, int] = {}
+        self._changed: dict[str, int] = {}
+        self._epochs = itertools.count()
+
+    async def async_get(self, session: iterm2.Session) -> iterm2.ScreenContents:
+        """The session's screen, from the cache or one shared read."""
+        sid = session.session_id
+        entry = self._entries.get(sid)
+        if entry is not None and self._fresh(sid, entry):
+            if METRICS.enabled:
+                METRICS.inc("screen_cache_total", result="hit")
+            return entry[2]
+
+        task = self._inflight.get(sid)
+        if task is None:
+            if METRICS.enabled:
+                METRICS.inc("screen_cache_total", result="miss")
+            task = asyncio.ensure_future(self._fetch(session, next(self._epochs)))
+            self._inflight[sid] = task
+        elif METRICS.enabled:
+            METRICS.inc("screen_cache_total", result="shared")
+        # One caller giving up must not cancel the read for the others
+        return await asyncio.shield(task)
+
+    async def _fetch(self, session: iterm2.Session, epoch: int) -> iterm2.ScreenContents:
+        sid = session.session_id
+        try:
+            contents = await metrics.async_get_screen_contents(session)
+        finally:
+            if self._inflight.get(sid) is asyncio.current_task():
+                del self._inflight[sid]
+        if epoch > self._changed.get(sid, -1):
+            self._entries[sid] = (epoch, time.monotonic(), contents)
+        return contents
+
+    def _fresh(self, sid: str, entry: tuple[int, float, iterm2.ScreenContents]) -> bool:
+        epoch, fetched, _ = entry
+        listening = self._listening.get(sid)
+        if listening is not None and epoch > listening:
+            return True
+        return time.monotonic() - fetched < self.ttl
+
+    def listen(self, session_id: str) -> None:
+        """A streamer for the session is about to wait for the next update."""
+        self._listening[session_id] = next(self._epochs)
+
+    def changed(
+        self,
+        session_id: str,
+        contents: iterm2.ScreenContents | None = None,
+    ) -> None:
+        """A streamer saw the screen change; ``contents`` is the new screen."""
+        self._listening.pop(session_id, None)
+        self.invalidate(session_id)
+        if contents is not None:
+            self._entries[session_id] = (next(self._epochs), time.monotonic(), contents)
+
+    def stop_listening(self, session_id: str) -> None:
+        self._listening.pop(session_id, None)
+
+    def invalidate(self, session_id: str) -> None:
+        """Forget the session's screen, including a read still in flight."""
+        self._changed[session_id] = next(self._epochs)
+        self._entries.pop(session_id, None)
+        self._inflight.pop(session_id, None)
+
+    def discard(self, session_id: str) -> None:
+        """Forget everything about a session that went away."""
+        self.invalidate(session_id)
+        self._listening.pop(session_id, None)
+        self._changed.pop(session_id, None)
 
 
 @dataclass(frozen=True)
 class ITerm2Context:
-    """Immutable container for iTerm2 connection state."""
+    """Immutable container for iTerm2 connection state.
+
+    One context exists per websocket connection. When the connection drops,
+    ``lost`` is set and the supervisor builds a fresh context; config and
+    read_screen snapshots carry over, scrollback, the screen cache and the
+    session index start afresh. ``backend`` performs the connection-level
+    operations; ``connection`` and ``app`` are whatever it returned when
+    connecting. The scrollback follower keeps ``screens`` up to date.
+    Per-session write ``locks`` carry over, so a command still finishing
+    on the old connection is not overlapped by one on the new, and so do
+    background ``jobs``, ``watchers`` and queued shell ``signals``.
+    """
 
     connection: iterm2.Connection
     app: iterm2.App
+    backend: Backend = field(default_factory=ITerm2Backend)
+    scrollback: ScrollbackStore = field(default_factory=ScrollbackStore)
+    config: ConfigStore = field(default_factory=ConfigStore)
+    snapshots: SnapshotStore = field(default_factory=SnapshotStore)
+    sessions: SessionIndex = field(default_factory=SessionIndex)
+    screens: ScreenCache = field(default_factory=ScreenCache)
+    locks: SessionLocks = field(default_factory=SessionLocks)
+    jobs: JobScheduler = field(default_factory=JobScheduler)
+    watchers: WatcherRegistry = field(default_factory=WatcherRegistry)
+    signals: SignalHub = field(default_factory=SignalHub)
+    lost: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+
+    def __post_init__(self) -> None:
+        self.scrollback.screens = self.screens
+        self.jobs.config = self.config
+        self.watchers.config = self.config
+        self.signals.config = self.config
+
+    async def wait_for(self, awaitable: Awaitable[_T], timeout: float) -> _T:
+        """Like :func:`asyncio.wait_for`, but raise :class:`ConnectionLostError`
+        as soon as the connection drops instead of waiting out the timeout."""
+        if self.lost.is_set():
+            raise ConnectionLostError()
+        task = asyncio.ensure_future(awaitable)
+        lost = asyncio.ensure_future(self.lost.wait())
+        try:
+            done, _ = await asyncio.wait(
+                (task, lost), timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+            )
+        finally:
+            lost.cancel()
+            if not task.done():
+                task.cancel()
+        if task in done:
+            return task.result()
+        if lost in done:
+            raise ConnectionLostError()
+        raise asyncio.TimeoutError()
 
     async def resolve_session(self, session_id: str = "") -> iterm2.Session:
-        """Resolve a session by ID, or return the current active session."""
+        """Resolve a session by ID, or return the current active session.
+
+        IDs are looked up in the session index once it is running, else in
+        the app hierarchy.
+        """
         if session_id:
-            session = self.app.get_session_by_id(session_id)
+            if self.sessions.active:
+                entry = self.sessions.get(session_id)
+                session = entry.session if entry is not None else None
+            else:
+                session = self.app.get_session_by_id(session_id)
             if session is None:
                 raise ValueError(f"Session not found: {session_id}")
             return session
@@ -33,22 +256,379 @@ class ITerm2Context:
         await self.app.async_refresh()
 
 
+class CompactScreen(Sequence[str]):
+    """One screen read, as a read-only sequence of its lines.
+
+    The lines are joined with newlines into one string, ``text``, and
+    sliced out on access; an ``array`` holds where each ends and an int
+    the soft-wrap bits. Keeping a screen (``read_screen`` diff snapshots)
+    costs one string instead of one per line. Built by
+    :meth:`from_contents`, which reads the reply without making an
+    ``iterm2.LineContents`` (and its per-cell styles) for every line.
+
+    With ``styles=True`` the rows of the reply are kept and their style
+    runs decoded on the first style query into a flat ``array``, which
+    queries filter in bulk; colors are palette indexes or
+    :func:`rgb_color` values.
+    """
+
+    __slots__ = (
+        "text", "cursor_x", "cursor_y", "lines_above",
+        "_stops", "_soft", "_rows", "_runs", "_urls",
+    )
+
+    def __init__(
+        self,
+        lines: Iterable[str] = (),
+        soft: Iterable[bool] = (),
+        cursor: tuple[int, int] = (0, 0),
+        lines_above: int = 0,
+    ) -> None:
+        lines = list(lines)
+        self.text = "\n".join(lines)
+        if lines and self.text.count("\n") != len(lines) - 1:
+            raise ValueError("screen lines cannot contain newlines")
+        # Offset just past each line's newline: where the next line starts
+        self._stops = array("I", itertools.accumulate(len(line) + 1 for line in lines))
+        self._soft = sum(1 << i for i, wrapped in enumerate(soft) if wrapped)
+        self.cursor_x, self.cursor_y = cursor
+        self.lines_above = lines_above
+        self._rows: Sequence[Any] | None = None
+        self._runs: array | None = None
+        self._urls: list[tuple[int, str]] = []
+
+    @classmethod
+    def from_contents(
+        cls,
+        contents: iterm2.ScreenContents,
+        max_lines: int = -1,
+        styles: bool = False,
+    ) -> CompactScreen:
+        """The first ``max_lines`` lines (-1: all) of a screen read.
+
+        Raises:
+            ValueError: If ``styles`` is set and ``contents`` does not
+                carry iTerm2's reply (only ``iterm2.ScreenContents`` does).
+        """
+        total = contents.number_of_lines
+        count = total if max_lines < 0 else min(max_lines, total)
+        # The reply's line messages: text and wrap flags without decoding
+        # styles. iterm2 has no public accessor: this is the private
+        # ``self.__proto`` of ScreenContents, checked against iterm2 2.30.
+        # Without it text falls back to the public line() API, and styles
+        # are unavailable.
+        reply = getattr(contents, "_ScreenContents__proto", None)
+        if reply is None and styles:
+            raise ValueError(
+                "style queries need the reply inside iterm2.ScreenContents "
+                "(iterm2 2.30 layout); this screen read has none"
+            )
+        if reply is not None:
+            rows = reply.contents[:count]
+            lines = [row.text for row in rows]
+            soft = [row.continuation != _HARD_EOL for row in rows]
+        else:
+            rows = None
+            lines = [contents.line(i).string for i in range(count)]
+            soft = [not getattr(contents.line(i), "hard_eol", True) for i in range(count)]
+        screen = cls(
+            lines,
+            soft,
+            (contents.cursor_coord.x, contents.cursor_coord.y),
+            contents.number_of_lines_above_screen,
+        )
+        if styles:
+            screen._rows = rows
+        return screen
+
+    def __len__(self) -> int:
+        return len(self._stops)
+
+    @overload
+    def __getitem__(self, index: int) -> str: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> list[str]: ...
+
+    def __getitem__(self, index: int | slice) -> str | list[str]:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("screen line index out of range")
+        return self.text[self._start(index):self._stops[index] - 1]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.text.split("\n") if self._stops else ())
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, CompactScreen):
+            return self.text == other.text and self._stops == other._stops
+        if isinstance(other, Sequence) and not isinstance(other, str):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"<CompactScreen {len(self)} lines, {len(self.text)} chars>"
+
+    def _start(self, index: int) -> int:
+        return self._stops[index - 1] if index else 0
+
+    def head(self, count: int) -> CompactScreen:
+        """The first ``count`` lines, sharing this screen's cursor."""
+        count = max(0, min(count, len(self)))
+        if count == len(self):
+            return self
+        head = CompactScreen.__new__(CompactScreen)
+        head.text = self.text[:self._stops[count - 1] - 1] if count else ""
+        head._stops = self._stops[:count]
+        head._soft = self._soft & ((1 << count) - 1)
+        head.cursor_x, head.cursor_y = self.cursor_x, self.cursor_y
+        head.lines_above = self.lines_above
+        head._rows = self._rows[:count] if self._rows is not None else None
+        head._runs = None
+        head._urls = []
+        return head
+
+    def rstrip(self) -> CompactScreen:
+        """Without trailing blank lines."""
+        count = len(self)
+        while count and not self[count - 1].strip():
+            count -= 1
+        return self.head(count)
+
+    def wrapped(self, index: int) -> bool:
+        """True if line ``index`` soft-wraps: its text continues on the next line."""
+        return bool(self._soft >> index & 1)
+
+    def logical_lines(self) -> list[tuple[int, str]]:
+        """Lines with soft wraps re-joined, each with the row it starts on."""
+        joined: list[tuple[int, str]] = []
+        parts: list[str] = []
+        first = 0
+        for index, line in enumerate(self):
+            if not parts:
+                first = index
+            parts.append(line)
+            if not self.wrapped(index):
+                joined.append((first, "".join(parts)))
+                parts = []
+        if parts:
+            joined.append((first, "".join(parts)))
+        return joined
+
+    def styled(
+        self,
+        foreground: Iterable[int] | None = None,
+        background: Iterable[int] | None = None,
+        flags: int = 0,
+    ) -> list[tuple[int, str]]:
+        """(row, text) of every style run in one of the ``foreground``
+        colors and ``background`` colors (None: any), with all ``flags``.
+
+        Raises:
+            ValueError: If the screen was read without styles.
+        """
+        runs = self._style_runs()
+        text = self.text
+        return [
+            (runs[i], text[runs[i + 1]:runs[i + 2]])
+            for i in self._matching(runs, foreground, background, flags)
+        ]
+
+    def lines_with(
+        self,
+        foreground: Iterable[int] | None = None,
+        background: Iterable[int] | None = None,
+        flags: int = 0,
+    ) -> list[int]:
+        """Rows with at least one run matching, as for :meth:`styled`.
+
+        ``screen.lines_with(foreground=RED)`` finds red error text.
+        """
+        runs = self._style_runs()
+        return sorted({runs[i] for i in self._matching(runs, foreground, background, flags)})
+
+    def urls(self) -> list[tuple[int, str]]:
+        """(row, URL) of every hyperlink (OSC 8) run, in screen order.
+
+        Raises:
+            ValueError: If the screen was read without styles.
+        """
+        self._style_runs()
+        return list(self._urls)
+
+    @staticmethod
+    def _matching(
+        runs: array,
+        foreground: Iterable[int] | None,
+        background: Iterable[int] | None,
+        flags: int,
+    ) -> Iterator[int]:
+        """Offsets into ``runs`` of the runs that match, filtered column-wise."""
+        masks = []
+        if foreground is not None:
+            masks.append(map(frozenset(foreground).__contains__, runs[3::_RUN_FIELDS]))
+        if background is not None:
+            masks.append(map(frozenset(background).__contains__, runs[4::_RUN_FIELDS]))
+        if flags:
+            masks.append(map(
+                flags.__eq__,
+                map(operator.and_, runs[5::_RUN_FIELDS], itertools.repeat(flags)),
+            ))
+        offsets = range(0, len(runs), _RUN_FIELDS)
+        if not masks:
+            return iter(offsets)
+        return itertools.compress(offsets, map(all, zip(*masks)))
+
+    def _style_runs(self) -> array:
+        if self._runs is not None:
+            return self._runs
+        if self._rows is None:
+            raise ValueError("screen was read without styles")
+        runs = array("i")
+        urls: list[tuple[int, str]] = []
+        for index, row in enumerate(self._rows):
+            base = self._start(index)
+            end = self._stops[index] - 1
+            for first, stop, style in _row_style_runs(row):
+                fg = _run_color(style, "fgStandard", "fgRgb")
+                bg = _run_color(style, "bgStandard", "bgRgb")
+                flags = 0
+                for name, flag in _FLAG_FIELDS:
+                    if getattr(style, name):
+                        flags |= flag
+                url = style.url.url if style.HasField("url") else ""
+                if url and (not urls or urls[-1] != (index, url)):
+                    urls.append((index, url))
+                if fg == bg == DEFAULT_COLOR and not flags:
+                    continue  # plain text is most of a screen
+                runs.extend((
+                    index, min(base + first, end), min(base + stop, end), fg, bg, flags,
+                ))
+        # Decoded once; the reply's rows are not needed any more
+        self._runs, self._urls, self._rows = runs, urls, None
+        return runs
+
+
+def _row_style_runs(row: api_pb2.LineContents) -> Iterator[tuple[int, int, Any]]:
+    """(first code point, end code point, style) of each style run of a row.
+
+    Style runs count cells; ``code_points_per_cell`` says how many code
+    points each cell holds (one, where it says nothing).
+    """
+    widths = iter(row.code_points_per_cell)
+    width = left = 0
+    offset = 0
+    for style in row.style:
+        first = offset
+        cells = style.repeats
+        while cells:
+            if not left:
+                cell = next(widths, None)
+                width, left = (1, cells) if cell is None else (cell.num_code_points, cell.repeats)
+                continue
+            step = min(cells, left)
+            offset += step * width
+            cells -= step
+            left -= step
+        yield first, offset, style
+
+
+def _run_color(style: Any, standard: str, rgb: str) -> int:
+    if style.HasField(standard):
+        return getattr(style, standard)
+    if style.HasField(rgb):
+        color = getattr(style, rgb)
+        return rgb_color(color.red, color.green, color.blue)
+    return DEFAULT_COLOR
+
+
+async def get_screen(
+    session: iterm2.Session,
+    max_lines: int = -1,
+    cache: ScreenCache | None = None,
+    styles: bool = False,
+) -> CompactScreen:
+    """Read a session's screen, through ``cache`` if given.
+
+    With ``styles`` the result answers style queries (see
+    :class:`CompactScreen`).
+    """
+    if cache is not None:
+        contents = await cache.async_get(session)
+    else:
+        contents = await metrics.async_get_screen_contents(session)
+    return CompactScreen.from_contents(contents, max_lines, styles)
+
+
 async def get_screen_lines(
     session: iterm2.Session,
     max_lines: int = -1,
-) -> tuple[list[str], int, int]:
-    """Read screen text from a session.
+    cache: ScreenCache | None = None,
+) -> tuple[CompactScreen, int, int]:
+    """Read screen text from a session, through ``cache`` if given.
 
     Returns:
-        (lines, cursor_x, cursor_y) where lines is a list of strings,
-        and cursor_x/cursor_y are the cursor position.
+        (lines, cursor_x, cursor_y) where lines is the screen, a sequence
+        of strings, and cursor_x/cursor_y are the cursor position.
     """
-    contents = await session.async_get_screen_contents()
-    total = contents.number_of_lines
-    count = total if max_lines < 0 else min(max_lines, total)
+    screen = await get_screen(session, max_lines, cache)
+    return screen, screen.cursor_x, screen.cursor_y
 
-    lines = [contents.line(i).string for i in range(count)]
-    cursor_x = contents.cursor_coord.x
-    cursor_y = contents.cursor_coord.y
 
-    return lines, cursor_x, cursor_y
+def screen_tail(screen: CompactScreen, count: int = 5) -> str:
+    """The last ``count`` lines of ``screen`` for a preview.
+
+    Trailing blank lines are skipped and soft-wrapped rows are re-joined,
+    so a long line is shown whole; an empty screen reads "(empty)".
+    """
+    lines = [line for _, line in screen.rstrip().logical_lines()[-count:]]
+    return "\n".join(lines) if lines else "(empty)"
+
+
+@asynccontextmanager
+async def wait_for_settle(
+    session: iterm2.Session,
+    quiet: float = DEFAULT_SETTLE_QUIET,
+    max_wait: float = DEFAULT_SETTLE_MAX_WAIT,
+) -> AsyncIterator[None]:
+    """Wait for the screen to settle after input sent inside the block.
+
+    The screen streamer is subscribed (and waiting) before the block runs,
+    so the terminal's first reaction cannot be missed. On exit, returns as
+    soon as the screen has changed and then stayed quiet for ``quiet``
+    seconds, or after ``max_wait`` seconds in total.
+
+    Example::
+
+        async with wait_for_settle(session):
+            await session.async_send_text("q")
+    """
+    async with session.get_screen_streamer(want_contents=False) as streamer:
+        first_update = asyncio.ensure_future(streamer.async_get())
+        # Let the pending get register with the streamer before input is sent
+        await asyncio.sleep(0)
+        try:
+            yield
+            with METRICS.time("phase_seconds", phase="settle"):
+                loop = asyncio.get_event_loop()
+                deadline = loop.time() + max_wait
+                try:
+                    await asyncio.wait_for(first_update, timeout=max_wait)
+                except asyncio.TimeoutError:
+                    return  # The screen never reacted
+
+                while True:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        return
+                    try:
+                        await asyncio.wait_for(
+                            streamer.async_get(), timeout=min(quiet, remaining)
+                        )
+                    except asyncio.TimeoutError:
+                        return  # Quiet long enough
+        finally:
+            first_update.cancel()
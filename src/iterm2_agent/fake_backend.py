@@ -0,0 +1,885 @@
+"""In-process stand-in for iTerm2: emulated terminals driven by real shells.
+
+:class:`FakeBackend` implements :class:`~iterm2_agent.backend.Backend`
+without iTerm2. Each session runs a shell on a pseudo-terminal (``/bin/sh``
+by default) or a scripted pseudo-shell, and feeds its output through
+:class:`TerminalEmulator`, a small VT100 subset with screen and scrollback.
+Sessions expose the part of the ``iterm2.Session`` API the tools use and
+return real ``iterm2.ScreenContents`` / ``LineContents`` objects, so every
+tool runs end to end on Linux. Shell integration is emulated with the
+FinalTerm prompt marks (OSC 133) that iTerm2 itself understands, emitted
+from the shell's ``PS1``; custom control sequences (``OSC 1337 ;
+Custom=id=...``) are delivered like iTerm2's notifications for them.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import codecs
+import fcntl
+import itertools
+import logging
+import os
+import re
+import signal
+import struct
+import subprocess
+import termios
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Protocol, Sequence
+
+import iterm2
+from iterm2 import api_pb2
+from iterm2.session import SessionLineInfo
+from iterm2.util import CoordRange, Point, Size
+
+from iterm2_agent.backend import LayoutCallback, SequenceCallback, SessionCallback
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SHELL = ("/bin/sh", "-i")
+DEFAULT_WIDTH = 80
+DEFAULT_HEIGHT = 24
+DEFAULT_MAX_HISTORY = 10_000
+# FinalTerm marks: command end (with exit status), prompt start, prompt end
+PROMPT_PS1 = "\x1b]133;D;$?\x07\x1b]133;A\x07$ \x1b]133;B\x07"
+
+Mode = iterm2.PromptMonitor.Mode
+
+_HARD_EOL = api_pb2.LineContents.Continuation.Value("CONTINUATION_HARD_EOL")
+_SOFT_EOL = api_pb2.LineContents.Continuation.Value("CONTINUATION_SOFT_EOL")
+
+_TOKEN_RE = re.compile(
+    r"(?P<text>[^\x00-\x1f\x7f]+)"
+    r"|\x1b\[(?P<csi>[0-?]*)[ -/]*(?P<final>[@-~])"
+    r"|\x1b\](?P<osc>[^\x07\x1b]*)(?:\x07|\x1b\\)"
+    r"|\x1b[()*+\-./].|\x1b[^\[\]]"
+    # An escape sequence cut off at the end of a chunk
+    r"|(?P<partial>\x1b(?:\[[0-?]*[ -/]*|\][^\x07\x1b]*\x1b?|[()*+\-./])?)\Z"
+    r"|(?P<ctrl>[\x00-\x1f\x7f])"
+)
+
+
+class TerminalEmulator:
+    """A screen of ``height`` rows over a bounded scrollback history.
+
+    Understands printable text with auto-wrap, CR/LF/BS/TAB, cursor
+    movement and erase sequences, and OSC sequences (passed to
+    ``on_osc``); other escape sequences are ignored. Line numbers are
+    absolute, as in iTerm2: ``lines_above`` counts every line that ever
+    scrolled off the screen, including those dropped from the history.
+    """
+
+    def __init__(
+        self,
+        width: int = DEFAULT_WIDTH,
+        height: int = DEFAULT_HEIGHT,
+        max_history: int = DEFAULT_MAX_HISTORY,
+    ) -> None:
+        self.width = width
+        self.height = height
+        self.max_history = max_history
+        # (text, soft-wrapped) for each line that scrolled off the screen
+        self.history: deque[tuple[str, bool]] = deque()
+        self.overflow = 0
+        self.rows = [""] * height
+        self.soft = [False] * height
+        self.x = 0
+        self.y = 0
+        self.on_osc: Callable[[str], None] | None = None
+        self._pending = ""
+        self._saved = (0, 0)
+
+    @property
+    def lines_above(self) -> int:
+        return self.overflow + len(self.history)
+
+    def feed(self, text: str) -> None:
+        """Process terminal output."""
+        if self._pending:
+            text, self._pending = self._pending + text, ""
+        pos = 0
+        while pos < len(text):
+            match = _TOKEN_RE.match(text, pos)
+            pos = match.end()
+            kind = match.lastgroup
+            if kind == "text":
+                self._put(match.group("text"))
+            elif kind == "final":
+                self._csi(match.group("csi"), match.group("final"))
+            elif kind == "osc":
+                if self.on_osc is not None:
+                    self.on_osc(match.group("osc"))
+            elif kind == "partial":
+                self._pending = match.group("partial")
+            elif kind == "ctrl":
+                self._control(match.group("ctrl"))
+            else:
+                self._escape(match.group())
+
+    def screen_contents(self) -> iterm2.ScreenContents:
+        """The screen as iTerm2 would report it."""
+        proto = api_pb2.GetBufferResponse(num_lines_above_screen=self.lines_above)
+        for text, soft in zip(self.rows, self.soft):
+            _add_line(proto.contents, text, soft)
+        proto.cursor.x = min(self.x, self.width - 1)
+        proto.cursor.y = self.y
+        coords = proto.windowed_coord_range.coord_range
+        coords.start.y = self.lines_above
+        coords.end.x = self.width
+        coords.end.y = self.lines_above + self.height
+        return iterm2.ScreenContents(proto)
+
+    def line_range(self, first_line: int, count: int) -> list[iterm2.LineContents]:
+        """Lines ``[first_line, first_line + count)`` that still exist."""
+        proto = api_pb2.GetBufferResponse()
+        above = self.lines_above
+        for number in range(max(first_line, self.overflow), first_line + count):
+            if number < above:
+                text, soft = self.history[number - self.overflow]
+            elif number < above + self.height:
+                text, soft = self.rows[number - above], self.soft[number - above]
+            else:
+                break
+            _add_line(proto.contents, text, soft)
+        return [iterm2.LineContents(line) for line in proto.contents]
+
+    def _put(self, text: str) -> None:
+        while text:
+            if self.x >= self.width:
+                # Deferred auto-wrap: the row continues on the next one
+                self.soft[self.y] = True
+                self.x = 0
+                self._index()
+            n = self.width - self.x
+            segment, text = text[:n], text[n:]
+            row = self.rows[self.y].ljust(self.x)
+            self.rows[self.y] = row[:self.x] + segment + row[self.x + len(segment):]
+            self.x += len(segment)
+
+    def _index(self) -> None:
+        """Move down a row, scrolling the top row into history at the bottom."""
+        if self.y + 1 < self.height:
+            self.y += 1
+            return
+        self.history.append((self.rows.pop(0), self.soft.pop(0)))
+        self.rows.append("")
+        self.soft.append(False)
+        if len(self.history) > self.max_history:
+            self.history.popleft()
+            self.overflow += 1
+
+    def _control(self, char: str) -> None:
+        if char == "\r":
+            self.x = 0
+        elif char in "\n\x0b\x0c":
+            self.soft[self.y] = False
+            self._index()
+        elif char == "\b":
+            self.x = max(0, min(self.x, self.width - 1) - 1)
+        elif char == "\t":
+            self.x = min(self.width - 1, (self.x // 8 + 1) * 8)
+
+    def _escape(self, sequence: str) -> None:
+        code = sequence[1:]
+        if code == "7":
+            self._saved = (self.x, self.y)
+        elif code == "8":
+            self.x, self.y = self._saved
+        elif code == "D":
+            self._index()
+        elif code == "E":
+            self.x = 0
+            self._index()
+        elif code == "M":
+            self.y = max(0, self.y - 1)
+        elif code == "c":
+            self._erase_screen(2)
+            self.x = self.y = 0
+
+    def _csi(self, params: str, final: str) -> None:
+        if params.startswith(("?", ">", "=", "<")):
+            return  # Private modes: nothing to emulate
+        args = [int(p) if p.isdigit() else 0 for p in params.split(";")]
+        n = max(args[0], 1)
+        if final == "A":
+            self.y = max(0, self.y - n)
+        elif final == "B":
+            self.y = min(self.height - 1, self.y + n)
+        elif final == "C":
+            self.x = min(self.width - 1, self.x + n)
+        elif final == "D":
+            self.x = max(0, min(self.x, self.width - 1) - n)
+        elif final == "G":
+            self.x = min(self.width - 1, n - 1)
+        elif final == "d":
+            self.y = min(self.height - 1, n - 1)
+        elif final in "Hf":
+            column = args[1] if len(args) > 1 else 0
+            self.y = min(self.height - 1, n - 1)
+            self.x = min(self.width - 1, max(column, 1) - 1)
+        elif final == "K":
+            self._erase_line(args[0])
+        elif final == "J":
+            self._erase_screen(args[0])
+        elif final == "P":
+            row = self.rows[self.y]
+            self.rows[self.y] = row[:self.x] + row[self.x + n:]
+        elif final == "@":
+            row = self.rows[self.y]
+            inserted = row[:self.x] + " " * n + row[self.x:]
+            self.rows[self.y] = inserted[:self.width]
+        elif final == "X":
+            row = self.rows[self.y].ljust(self.x + n)
+            self.rows[self.y] = row[:self.x] + " " * n + row[self.x + n:]
+
+    def _erase_line(self, mode: int) -> None:
+        row = self.rows[self.y]
+        if mode == 0:
+            self.rows[self.y] = row[:self.x]
+            self.soft[self.y] = False
+        elif mode == 1:
+            self.rows[self.y] = " " * (self.x + 1) + row[self.x + 1:]
+        else:
+            self.rows[self.y] = ""
+            self.soft[self.y] = False
+
+    def _erase_screen(self, mode: int) -> None:
+        if mode == 0:
+            self._erase_line(0)
+            below = range(self.y + 1, self.height)
+        elif mode == 1:
+            self._erase_line(1)
+            below = range(self.y)
+        else:
+            below = range(self.height)
+            if mode == 3:
+                # Clear scrollback too; line numbers keep counting
+                self.overflow += len(self.history)
+                self.history.clear()
+        for row in below:
+            self.rows[row] = ""
+            self.soft[row] = False
+
+
+def _add_line(contents, text: str, soft: bool) -> None:
+    text = text.rstrip()
+    line = contents.add(text=text, continuation=_SOFT_EOL if soft else _HARD_EOL)
+    if text:
+        line.code_points_per_cell.add(num_code_points=1, repeats=len(text))
+
+
+class Shell(Protocol):
+    """What drives a fake session: receives keystrokes, produces output."""
+
+    def start(self, session: FakeSession) -> None: ...
+
+    def write(self, text: str) -> None: ...
+
+    def cwd(self) -> str: ...
+
+    def job_name(self) -> str: ...
+
+    async def async_close(self) -> None: ...
+
+
+ShellFactory = Callable[[], Shell]
+
+
+class PtyShell:
+    """A real shell process on a pseudo-terminal.
+
+    Keystrokes go through the pty's line discipline, so echo, Ctrl+C and
+    Ctrl+D behave as in a terminal. ``cwd`` and ``job_name`` are read from
+    ``/proc`` and are empty where it does not exist.
+    """
+
+    def __init__(
+        self,
+        argv: Sequence[str] = DEFAULT_SHELL,
+        env: dict[str, str] | None = None,
+        cwd: str | None = None,
+    ) -> None:
+        self.argv = list(argv)
+        self.env = env
+        self.start_cwd = cwd
+        self.process: subprocess.Popen | None = None
+        self._fd = -1
+        self._session: FakeSession | None = None
+        self._decoder = codecs.getincrementaldecoder("utf-8")("replace")
+
+    def start(self, session: FakeSession) -> None:
+        self._session = session
+        master, slave = os.openpty()
+        size = struct.pack("HHHH", session.grid_size.height, session.grid_size.width, 0, 0)
+        fcntl.ioctl(slave, termios.TIOCSWINSZ, size)
+        env = {
+            "PATH": os.environ.get("PATH", "/usr/bin:/bin"),
+            "HOME": os.environ.get("HOME", "/"),
+            "TERM": "vt100",
+            "PS1": PROMPT_PS1,
+        }
+        env.update(self.env or {})
+        self.process = subprocess.Popen(
+            self.argv,
+            stdin=slave,
+            stdout=slave,
+            stderr=slave,
+            env=env,
+            cwd=self.start_cwd,
+            start_new_session=True,
+            # Make the pty the controlling terminal so Ctrl+C reaches jobs
+            preexec_fn=lambda: fcntl.ioctl(0, termios.TIOCSCTTY, 0),
+        )
+        os.close(slave)
+        self._fd = master
+        asyncio.get_running_loop().add_reader(master, self._on_readable)
+
+    def _on_readable(self) -> None:
+        try:
+            data = os.read(self._fd, 65536)
+        except OSError:  # EIO once the shell has exited
+            data = b""
+        if not data:
+            asyncio.get_running_loop().remove_reader(self._fd)
+            self._session.ended()
+            return
+        self._session.output(self._decoder.decode(data))
+
+    def write(self, text: str) -> None:
+        if self._fd >= 0:
+            os.write(self._fd, text.encode())
+
+    def cwd(self) -> str:
+        try:
+            return os.readlink(f"/proc/{self.process.pid}/cwd")
+        except (OSError, AttributeError):
+            return ""
+
+    def job_name(self) -> str:
+        try:
+            with open(f"/proc/{os.tcgetpgrp(self._fd)}/comm") as f:
+                return f.read().strip()
+        except OSError:
+            return ""
+
+    async def async_close(self) -> None:
+        fd, self._fd = self._fd, -1
+        if fd < 0:
+            return
+        asyncio.get_running_loop().remove_reader(fd)
+        os.close(fd)
+        process = self.process
+        try:
+            os.killpg(process.pid, signal.SIGHUP)
+        except ProcessLookupError:
+            pass
+        try:
+            await asyncio.wait_for(asyncio.to_thread(process.wait), timeout=2)
+        except asyncio.TimeoutError:
+            process.kill()
+
+
+# A scripted command's output, or (output, exit status), or None for a
+# command that runs until interrupted
+ScriptResult = str | tuple[str, int] | None
+
+
+class ScriptedShell:
+    """A deterministic pseudo-shell answering commands from a function.
+
+    Typed text is echoed; on Enter the line is passed to ``handler`` and
+    its output printed, followed by a prompt with the same marks as
+    :data:`PROMPT_PS1`. Output is produced synchronously, so timing does
+    not depend on a process. A handler returning None leaves the command
+    running (no prompt) until Ctrl+C, which, like Ctrl+C on a typed line,
+    prints a prompt with status 130.
+    """
+
+    def __init__(self, handler: Callable[[str], ScriptResult] | None = None) -> None:
+        self.handler = handler or _default_script
+        self.line = ""
+        self._session: FakeSession | None = None
+
+    def start(self, session: FakeSession) -> None:
+        self._session = session
+        self._prompt(0)
+
+    def write(self, text: str) -> None:
+        for char in text:
+            if char in "\r\n":
+                command, self.line = self.line, ""
+                self._session.output("\r\n")
+                if not command.strip():
+                    self._prompt(0)
+                    continue
+                result = self.handler(command)
+                if result is None:
+                    continue
+                output, status = result if isinstance(result, tuple) else (result, 0)
+                if output:
+                    self._session.output(output.replace("\n", "\r\n") + "\r\n")
+                self._prompt(status)
+            elif char == "\x03":
+                self.line = ""
+                self._session.output("^C\r\n")
+                self._prompt(130)
+            elif char == "\x15":
+                self._session.output("\r\x1b[K$ ")
+                self.line = ""
+            elif char >= " ":
+                self.line += char
+                self._session.output(char)
+
+    def _prompt(self, status: int) -> None:
+        self._session.output(PROMPT_PS1.replace("$?", str(status)))
+
+    def cwd(self) -> str:
+        return "/"
+
+    def job_name(self) -> str:
+        return "sh"
+
+    async def async_close(self) -> None:
+        pass
+
+
+def _default_script(command: str) -> ScriptResult:
+    name, _, rest = command.strip().partition(" ")
+    if name == "echo":
+        return rest
+    if name == "true":
+        return ""
+    if name == "false":
+        return "", 1
+    if name == "sleep":
+        return None
+    if name == "seq" and rest.isdigit():
+        return "\n".join(str(i) for i in range(1, int(rest) + 1))
+    return f"sh: {name}: not found", 127
+
+
+def pty_shell(argv: Sequence[str] = DEFAULT_SHELL, **kwargs: Any) -> ShellFactory:
+    """Shell factory running ``argv`` on a pseudo-terminal."""
+    return lambda: PtyShell(argv, **kwargs)
+
+
+def scripted_shell(handler: Callable[[str], ScriptResult] | None = None) -> ShellFactory:
+    """Shell factory for :class:`ScriptedShell`."""
+    return lambda: ScriptedShell(handler)
+
+
+class FakeScreenStreamer:
+    """Like ``iterm2.ScreenStreamer``: ``async_get`` resolves on the next
+    screen change after it is called; changes in between are not queued."""
+
+    def __init__(self, session: FakeSession, want_contents: bool) -> None:
+        self._session = session
+        self._want_contents = want_contents
+        self._future: asyncio.Future | None = None
+
+    async def __aenter__(self) -> FakeScreenStreamer:
+        self._session.streamers.append(self)
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        self._session.streamers.remove(self)
+
+    def notify(self) -> None:
+        future, self._future = self._future, None
+        if future is not None and not future.done():
+            future.set_result(None)
+
+    async def async_get(self, style: bool = False) -> iterm2.ScreenContents | None:
+        self._future = asyncio.get_running_loop().create_future()
+        await self._future
+        if not self._want_contents:
+            return None
+        return self._session.terminal.screen_contents()
+
+
+class FakePromptMonitor:
+    """Like ``iterm2.PromptMonitor``, fed by the session's OSC 133 marks."""
+
+    Mode = Mode
+
+    def __init__(self, session: FakeSession, modes: list[Mode] | None = None) -> None:
+        self._session = session
+        self.modes = modes or [Mode.PROMPT]
+        self._queue: asyncio.Queue = asyncio.Queue()
+
+    async def __aenter__(self) -> FakePromptMonitor:
+        self._session.monitors.append(self)
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        self._session.monitors.remove(self)
+
+    def deliver(self, mode: Mode, value: Any) -> None:
+        if mode in self.modes:
+            self._queue.put_nowait((mode, value))
+
+    async def async_get(self, include_id: bool = False):
+        mode, value = await self._queue.get()
+        return (mode, value, None) if include_id else (mode, value)
+
+
+@dataclass(frozen=True)
+class FakePrompt:
+    """Where the last shell prompt started (absolute line number, column)."""
+
+    line: int
+    column: int = 0
+
+    @property
+    def prompt_range(self) -> CoordRange:
+        """Like ``iterm2.Prompt.prompt_range``; only its start is known."""
+        start = Point(self.column, self.line)
+        return CoordRange(start, start)
+
+
+class FakeSession:
+    """A terminal session: a :class:`TerminalEmulator` driven by a shell."""
+
+    def __init__(
+        self,
+        backend: FakeBackend,
+        session_id: str,
+        shell: Shell,
+        width: int,
+        height: int,
+        max_history: int = DEFAULT_MAX_HISTORY,
+    ) -> None:
+        self.backend = backend
+        self.session_id = session_id
+        self.name = "sh"
+        self.grid_size = Size(width, height)
+        self.terminal = TerminalEmulator(width, height, max_history)
+        self.terminal.on_osc = self._on_osc
+        self.shell = shell
+        self.tab: FakeTab | None = None
+        self.streamers: list[FakeScreenStreamer] = []
+        self.monitors: list[FakePromptMonitor] = []
+        self.last_prompt: FakePrompt | None = None
+        self.closed = False
+
+    def output(self, text: str) -> None:
+        """Feed shell output to the terminal and wake screen streamers."""
+        self.terminal.feed(text)
+        for streamer in list(self.streamers):
+            streamer.notify()
+
+    def ended(self) -> None:
+        """The shell exited; close the pane like iTerm2 does."""
+        if not self.closed:
+            asyncio.ensure_future(self.backend.async_close_session(self))
+
+    def _on_osc(self, payload: str) -> None:
+        code, _, rest = payload.partition(";")
+        if code == "1337" and rest.startswith("Custom=id="):
+            identity, _, data = rest[len("Custom=id="):].partition(":")
+            asyncio.ensure_future(
+                self.backend._notify("custom_sequence", self.session_id, identity, data)
+            )
+            return
+        if code != "133":
+            return
+        mark, _, value = rest.partition(";")
+        if mark == "A":
+            self.last_prompt = FakePrompt(
+                self.terminal.lines_above + self.terminal.y, self.terminal.x
+            )
+            event = (Mode.PROMPT, self.last_prompt)
+        elif mark == "D":
+            event = (Mode.COMMAND_END, int(value) if value.isdigit() else 0)
+        elif mark == "C":
+            event = (Mode.COMMAND_START, value)
+        else:
+            return
+        for monitor in list(self.monitors):
+            monitor.deliver(*event)
+
+    async def async_send_text(self, text: str, suppress_broadcast: bool = False) -> None:
+        self.shell.write(text)
+
+    async def async_get_screen_contents(self) -> iterm2.ScreenContents:
+        return self.terminal.screen_contents()
+
+    async def async_get_contents(
+        self, first_line: int, number_of_lines: int
+    ) -> list[iterm2.LineContents]:
+        return self.terminal.line_range(first_line, number_of_lines)
+
+    async def async_get_line_info(self) -> SessionLineInfo:
+        terminal = self.terminal
+        return SessionLineInfo((
+            terminal.height,
+            len(terminal.history),
+            terminal.overflow,
+            terminal.lines_above,
+        ))
+
+    async def async_get_variable(self, name: str) -> Any:
+        if name == "path":
+            return self.shell.cwd()
+        if name == "jobName":
+            return self.shell.job_name()
+        if name == "name":
+            return self.name
+        return None
+
+    def get_screen_streamer(self, want_contents: bool = True) -> FakeScreenStreamer:
+        return FakeScreenStreamer(self, want_contents)
+
+    async def async_split_pane(
+        self,
+        vertical: bool = False,
+        before: bool = False,
+        profile: str | None = None,
+        profile_customizations: Any = None,
+    ) -> FakeSession:
+        return await self.backend.async_split(self, before)
+
+    async def async_close(self, force: bool = False) -> None:
+        await self.backend.async_close_session(self)
+
+    async def async_activate(
+        self, select_tab: bool = True, order_window_front: bool = True
+    ) -> None:
+        self.backend.activate(self)
+
+
+class FakeTab:
+    def __init__(self, tab_id: str, window: FakeWindow) -> None:
+        self.tab_id = tab_id
+        self.window = window
+        self.sessions: list[FakeSession] = []
+        self.current_session: FakeSession | None = None
+
+
+class FakeWindow:
+    def __init__(self, window_id: str) -> None:
+        self.window_id = window_id
+        self.tabs: list[FakeTab] = []
+        self.current_tab: FakeTab | None = None
+
+
+class FakeApp:
+    """The window → tab → session hierarchy of a :class:`FakeBackend`."""
+
+    def __init__(self) -> None:
+        self.windows: list[FakeWindow] = []
+        self.current_terminal_window: FakeWindow | None = None
+
+    @property
+    def terminal_windows(self) -> list[FakeWindow]:
+        return list(self.windows)
+
+    def get_session_by_id(self, session_id: str) -> FakeSession | None:
+        for session in self.sessions():
+            if session.session_id == session_id:
+                return session
+        return None
+
+    def get_tab_by_id(self, tab_id: str) -> FakeTab | None:
+        for window in self.windows:
+            for tab in window.tabs:
+                if tab.tab_id == tab_id:
+                    return tab
+        return None
+
+    def sessions(self) -> list[FakeSession]:
+        return [s for w in self.windows for t in w.tabs for s in t.sessions]
+
+    async def async_refresh(self) -> None:
+        pass
+
+
+class FakeConnection:
+    """One "websocket" to the fake; :meth:`close` simulates a drop."""
+
+    def __init__(self) -> None:
+        self.closed = asyncio.Event()
+
+    def close(self) -> None:
+        self.closed.set()
+
+
+class FakeBackend:
+    """A :class:`~iterm2_agent.backend.Backend` over emulated terminals.
+
+    Connecting the first time opens one window with one session. Sessions
+    and windows outlive connections, so a simulated drop
+    (``connection.close()``) behaves like a reconnect to a running iTerm2.
+    ``connect_latency`` makes each connect take that many seconds, standing
+    in for the websocket handshake and app fetch of a real iTerm2.
+    """
+
+    name = "fake"
+
+    def __init__(
+        self,
+        shell: ShellFactory | None = None,
+        width: int = DEFAULT_WIDTH,
+        height: int = DEFAULT_HEIGHT,
+        max_history: int = DEFAULT_MAX_HISTORY,
+        connect_latency: float = 0.0,
+    ) -> None:
+        self.shell = shell or pty_shell()
+        self.connect_latency = connect_latency
+        self.width = width
+        self.height = height
+        self.max_history = max_history
+        self.app = FakeApp()
+        self._ids = itertools.count(1)
+        self._subscribers: dict[str, list[Callable]] = {
+            "layout": [], "new_session": [], "terminate_session": [], "custom_sequence": [],
+        }
+        self._started = False
+
+    async def async_connect(self) -> tuple[FakeConnection, FakeApp]:
+        if self.connect_latency:
+            await asyncio.sleep(self.connect_latency)
+        if not self._started:
+            self._started = True
+            await self.async_create_window(None)
+        return FakeConnection(), self.app
+
+    async def async_wait_closed(self, connection: FakeConnection) -> None:
+        await connection.closed.wait()
+
+    def fail_pending_requests(self, connection: FakeConnection) -> None:
+        pass
+
+    async def async_close_connection(self, connection: FakeConnection) -> None:
+        connection.close()
+
+    async def async_close(self) -> None:
+        """Close every session and stop their shells."""
+        for session in self.app.sessions():
+            session.closed = True
+            await session.shell.async_close()
+        self.app.windows.clear()
+        self.app.current_terminal_window = None
+
+    async def async_create_window(self, connection: Any) -> FakeWindow:
+        window = FakeWindow(f"window-{next(self._ids)}")
+        tab = FakeTab(str(next(self._ids)), window)
+        window.tabs.append(tab)
+        window.current_tab = tab
+        self.app.windows.append(window)
+        self.app.current_terminal_window = window
+        session = self._new_session()
+        self._place(session, tab, len(tab.sessions))
+        await self._announce(session)
+        return window
+
+    async def async_split(self, session: FakeSession, before: bool = False) -> FakeSession:
+        tab = session.tab
+        new = self._new_session()
+        index = tab.sessions.index(session)
+        self._place(new, tab, index if before else index + 1)
+        await self._announce(new)
+        return new
+
+    async def async_close_session(self, session: FakeSession) -> None:
+        if session.closed:
+            return
+        session.closed = True
+        tab = session.tab
+        tab.sessions.remove(session)
+        if tab.current_session is session:
+            tab.current_session = tab.sessions[0] if tab.sessions else None
+        if not tab.sessions:
+            window = tab.window
+            window.tabs.remove(tab)
+            window.current_tab = window.tabs[0] if window.tabs else None
+            if not window.tabs:
+                self.app.windows.remove(window)
+                if self.app.current_terminal_window is window:
+                    windows = self.app.windows
+                    self.app.current_terminal_window = windows[0] if windows else None
+        await session.shell.async_close()
+        await self._notify("terminate_session", session.session_id)
+        await self._notify("layout", self.app.terminal_windows)
+
+    def activate(self, session: FakeSession) -> None:
+        tab = session.tab
+        tab.current_session = session
+        tab.window.current_tab = tab
+        self.app.current_terminal_window = tab.window
+
+    def _new_session(self) -> FakeSession:
+        return FakeSession(
+            self,
+            f"session-{next(self._ids)}",
+            self.shell(),
+            self.width,
+            self.height,
+            self.max_history,
+        )
+
+    def _place(self, session: FakeSession, tab: FakeTab, index: int) -> None:
+        session.tab = tab
+        tab.sessions.insert(index, session)
+        tab.current_session = session
+        session.shell.start(session)
+
+    async def _announce(self, session: FakeSession) -> None:
+        await self._notify("new_session", session.session_id)
+        await self._notify("layout", self.app.terminal_windows)
+
+    async def async_get_last_prompt(self, connection: Any, session_id: str) -> FakePrompt | None:
+        session = self.app.get_session_by_id(session_id)
+        if session is None:
+            raise iterm2.RPCException("SESSION_NOT_FOUND")
+        return session.last_prompt
+
+    def prompt_monitor(
+        self,
+        connection: Any,
+        session_id: str,
+        modes: list[Mode] | None = None,
+    ) -> FakePromptMonitor:
+        session = self.app.get_session_by_id(session_id)
+        if session is None:
+            raise iterm2.RPCException("SESSION_NOT_FOUND")
+        return FakePromptMonitor(session, modes)
+
+    async def async_subscribe_layout(self, connection: Any, callback: LayoutCallback) -> Any:
+        return self._subscribe("layout", callback)
+
+    async def async_subscribe_new_session(
+        self, connection: Any, callback: SessionCallback
+    ) -> Any:
+        return self._subscribe("new_session", callback)
+
+    async def async_subscribe_terminate_session(
+        self, connection: Any, callback: SessionCallback
+    ) -> Any:
+        return self._subscribe("terminate_session", callback)
+
+    async def async_subscribe_custom_sequence(
+        self, connection: Any, callback: SequenceCallback
+    ) -> Any:
+        return self._subscribe("custom_sequence", callback)
+
+    async def async_unsubscribe(self, connection: Any, token: Any) -> None:
+        kind, callback = token
+        if callback in self._subscribers[kind]:
+            self._subscribers[kind].remove(callback)
+
+    async def async_list_windows(self, connection: Any) -> list[FakeWindow]:
+        return self.app.terminal_windows
+
+    def _subscribe(self, kind: str, callback: Callable) -> tuple[str, Callable]:
+        self._subscribers[kind].append(callback)
+        return kind, callback
+
+    async def _notify(self, kind: str, *arguments: Any) -> None:
+        for callback in list(self._subscribers[kind]):
+            try:
+                await callback(*arguments)
+            except Exception:
+                logger.exception("Fake %s notification handler failed", kind)
@@ -0,0 +1,253 @@
+"""Per-session job queue for commands run in the background.
+
+``enqueue_command`` turns a command into a :class:`Job` and returns at
+once; ``poll_job`` and ``cancel_job`` look it up later by ID. Jobs for one
+session run one after another in submission order, and at most
+``[jobs] max_concurrent`` run at once across all sessions. The scheduler
+only tracks state: what a job does, and how a running one is interrupted,
+are callbacks given to :meth:`JobScheduler.submit`.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import collections
+import itertools
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable
+
+from iterm2_agent.config import ConfigStore, JobsConfig
+from iterm2_agent.metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+TIMED_OUT = "timed_out"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = (DONE, TIMED_OUT, FAILED, CANCELLED)
+
+
+@dataclass(eq=False)
+class Job:
+    """One command queued for, running in, or finished in a session.
+
+    The runner fills in ``output``, ``exit_status`` and ``timed_out``;
+    the scheduler owns ``state`` and the timestamps (monotonic seconds).
+    ``owner`` is the MCP client that submitted it (None: unknown).
+    """
+
+    id: str
+    session_id: str
+    command: str
+    timeout: float
+    state: str = QUEUED
+    submitted: float = field(default_factory=time.monotonic)
+    started: float | None = None
+    ended: float | None = None
+    output: str = ""
+    exit_status: int | None = None
+    timed_out: bool = False
+    error: str = ""
+    cancel_requested: bool = False
+    owner: str | None = None
+    _run: Callable[[Job], Awaitable[None]] | None = field(default=None, repr=False)
+    _interrupt: Callable[[Job], Awaitable[None]] | None = field(default=None, repr=False)
+    _task: asyncio.Task[None] | None = field(default=None, repr=False)
+    _finished: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+
+    @property
+    def finished(self) -> bool:
+        return self.state in FINISHED_STATES
+
+    @property
+    def elapsed(self) -> float:
+        """Seconds the job has run (so far), or 0 while queued."""
+        if self.started is None:
+            return 0.0
+        return (self.ended or time.monotonic()) - self.started
+
+    async def wait(self, timeout: float | None = None) -> bool:
+        """Wait for the job to finish; False if ``timeout`` ran out first."""
+        try:
+            await asyncio.wait_for(self._finished.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+
+class JobScheduler:
+    """Runs :class:`Job` objects: FIFO per session, bounded in total.
+
+    Each session with queued jobs has one worker task. A worker starts its
+    next job once fewer than ``max_concurrent`` jobs run, and runs it in a
+    task of its own so that cancelling a job never stops the worker.
+    Limits come from ``config`` (set by :class:`ITerm2Context`) and follow
+    hot reloads.
+    """
+
+    def __init__(self, config: ConfigStore | None = None) -> None:
+        self.config = config
+        self._jobs: dict[str, Job] = {}
+        self._queues: dict[str, collections.deque[Job]] = {}
+        self._workers: dict[str, asyncio.Task[None]] = {}
+        self._running: dict[str, Job] = {}
+        self._slots = asyncio.Condition()
+        self._active = 0
+        self._ids = itertools.count(1)
+
+    @property
+    def limits(self) -> JobsConfig:
+        return self.config.current.jobs if self.config is not None else JobsConfig()
+
+    def submit(
+        self,
+        session_id: str,
+        command: str,
+        timeout: float,
+        run: Callable[[Job], Awaitable[None]],
+        interrupt: Callable[[Job], Awaitable[None]],
+        owner: str | None = None,
+    ) -> Job:
+        """Queue a job behind the session's earlier ones.
+
+        ``run`` executes the command and records its outcome on the job;
+        ``interrupt`` asks a running command to stop (Ctrl+C).
+        """
+        job = Job(
+            f"job-{next(self._ids)}", session_id, command, timeout,
+            owner=owner, _run=run, _interrupt=interrupt,
+        )
+        self._jobs[job.id] = job
+        self._queues.setdefault(session_id, collections.deque()).append(job)
+        if session_id not in self._workers:
+            self._workers[session_id] = asyncio.create_task(
+                self._work(session_id), name=f"jobs-{session_id}"
+            )
+        return job
+
+    def get(self, job_id: str) -> Job | None:
+        return self._jobs.get(job_id)
+
+    def jobs(self, owner: str | None = None) -> list[Job]:
+        """Known jobs, oldest first; only the owner's if given."""
+        return [job for job in self._jobs.values() if owner is None or job.owner == owner]
+
+    def position(self, job: Job) -> int:
+        """Jobs ahead of ``job`` in its session, the running one included."""
+        if job.state != QUEUED:
+            return 0
+        running = self._running.get(job.session_id)
+        if running is job:  # waiting for a free slot
+            return 0
+        queue = self._queues.get(job.session_id, ())
+        ahead = list(queue).index(job) if job in queue else 0
+        return ahead + (running is not None)
+
+    async def cancel(self, job: Job) -> None:
+        """Cancel a job and wait until it has finished.
+
+        A queued job is dropped. A running one is interrupted and given
+        ``cancel_grace`` seconds to exit before its task is cancelled.
+        """
+        if job.finished:
+            return
+        job.cancel_requested = True
+        if job.state == QUEUED:
+            queue = self._queues.get(job.session_id)
+            if queue is not None and job in queue:
+                queue.remove(job)
+                self._finish(job, CANCELLED)
+            else:
+                # Popped by its worker, waiting for a slot
+                async with self._slots:
+                    self._slots.notify_all()
+            await job.wait()
+            return
+
+        try:
+            await job._interrupt(job)
+        except Exception as exc:  # connection lost, session closed, ...
+            logger.info("Could not interrupt %s: %r", job.id, exc)
+        else:
+            if await job.wait(self.limits.cancel_grace):
+                return
+        if job._task is not None:
+            job._task.cancel()
+        await job.wait()
+
+    async def async_close(self) -> None:
+        """Cancel every queued and running job."""
+        for job in self._running.values():
+            if job._task is not None:
+                job._task.cancel()
+        workers = list(self._workers.values())
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        for job in self._jobs.values():
+            if not job.finished:
+                self._finish(job, CANCELLED)
+
+    async def _work(self, session_id: str) -> None:
+        queue = self._queues[session_id]
+        try:
+            while queue:
+                job = queue.popleft()
+                self._running[session_id] = job
+                try:
+                    await self._run(job)
+                finally:
+                    del self._running[session_id]
+        finally:
+            del self._workers[session_id]
+            if not queue:
+                del self._queues[session_id]
+
+    async def _run(self, job: Job) -> None:
+        async with self._slots:
+            await self._slots.wait_for(
+                lambda: job.cancel_requested or self._active < self.limits.max_concurrent
+            )
+            if job.cancel_requested:
+                self._finish(job, CANCELLED)
+                return
+            self._active += 1
+
+        try:
+            job.state = RUNNING
+            job.started = time.monotonic()
+            job._task = asyncio.ensure_future(job._run(job))
+            # Not awaited directly: cancelling the job must not cancel us
+            await asyncio.wait((job._task,))
+        finally:
+            async with self._slots:
+                self._active -= 1
+                self._slots.notify_all()
+
+        task = job._task
+        if task.cancelled():
+            self._finish(job, CANCELLED)
+        elif task.exception() is not None:
+            job.error = str(task.exception()) or repr(task.exception())
+            self._finish(job, FAILED)
+        elif job.cancel_requested:
+            self._finish(job, CANCELLED)
+        else:
+            self._finish(job, TIMED_OUT if job.timed_out else DONE)
+
+    def _finish(self, job: Job, state: str) -> None:
+        job.state = state
+        job.ended = time.monotonic()
+        job._finished.set()
+        if METRICS.enabled:
+            METRICS.inc("jobs_total", state=state)
+
+        # Forget the oldest finished jobs beyond the limit
+        finished = [other for other in self._jobs.values() if other.finished]
+        for other in finished[: max(0, len(finished) - self.limits.max_finished)]:
+            del self._jobs[other.id]
@@ -0,0 +1,359 @@
+"""Latency and RPC instrumentation: counters and histograms, off by default.
+
+:data:`METRICS` is the process-wide registry. Tool functions are wrapped
+with :func:`timed`, whole MCP calls (argument validation and result
+serialization included) are timed by :class:`MetricsMiddleware`, iTerm2
+RPCs go through the ``async_*`` helpers below, and slow phases such as
+``run_command``'s prompt or idle wait are timed with :meth:`Metrics.time`.
+Every hook checks ``METRICS.enabled`` first and does nothing else while it
+is false, so disabled instrumentation costs one attribute read per call.
+
+The ``[metrics]`` config table turns it on; :class:`MetricsExporter`
+applies that setting and optionally writes the registry to a file in
+Prometheus text or JSON format. The ``get_metrics`` tool reports it.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import bisect
+import functools
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Iterator, TypeVar
+
+import iterm2
+from fastmcp.server.middleware import CallNext, Middleware, MiddlewareContext
+
+from iterm2_agent.config import ConfigStore
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds, in seconds, of the histogram buckets (plus +Inf)
+BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+    0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0,
+)
+PROMETHEUS_PREFIX = "iterm2_agent_"
+FORMATS = ("text", "json", "prometheus")
+
+_F = TypeVar("_F", bound=Callable[..., Awaitable[Any]])
+Labels = tuple[tuple[str, str], ...]
+
+
+class Histogram:
+    """Observation counts in fixed buckets, with their sum and maximum."""
+
+    __slots__ = ("counts", "count", "sum", "max")
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> float:
+        """Estimate a quantile by interpolating inside its bucket."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                low = BUCKETS[index - 1] if index else 0.0
+                high = BUCKETS[index] if index < len(BUCKETS) else self.max
+                return min(low + (high - low) * (rank - seen) / count, self.max)
+            seen += count
+        return self.max
+
+
+class Metrics:
+    """A registry of labelled counters and latency histograms."""
+
+    def __init__(self, enabled: bool = False) -> None:
+        self.enabled = enabled
+        self.counters: dict[tuple[str, Labels], float] = {}
+        self.histograms: dict[tuple[str, Labels], Histogram] = {}
+        self.started = time.time()
+
+    def inc(self, name: str, value: float = 1, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram()
+        histogram.observe(seconds)
+
+    @contextmanager
+    def time(self, name: str, **labels: str) -> Iterator[None]:
+        """Observe the duration of the block, if enabled."""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def reset(self) -> None:
+        self.counters.clear()
+        self.histograms.clear()
+        self.started = time.time()
+
+    def snapshot(self) -> dict[str, Any]:
+        """Everything recorded so far, as JSON-serializable data."""
+        return {
+            "enabled": self.enabled,
+            "started": self.started,
+            "uptime_seconds": round(time.time() - self.started, 3),
+            "counters": [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self.counters.items())
+            ],
+            "histograms": [
+                {
+                    "name": name,
+                    "labels": dict(labels),
+                    "count": h.count,
+                    "sum": round(h.sum, 6),
+                    "max": round(h.max, 6),
+                    "p50": round(h.quantile(0.50), 6),
+                    "p95": round(h.quantile(0.95), 6),
+                    "p99": round(h.quantile(0.99), 6),
+                }
+                for (name, labels), h in sorted(self.histograms.items())
+            ],
+        }
+
+    def render_json(self) -> str:
+        return json.dumps(self.snapshot(), indent=2)
+
+    def render_prometheus(self) -> str:
+        """The registry in the Prometheus text exposition format."""
+        out: list[str] = []
+        typed: set[str] = set()
+        for (name, labels), value in sorted(self.counters.items()):
+            metric = f"{PROMETHEUS_PREFIX}{name}"
+            if metric not in typed:
+                typed.add(metric)
+                out.append(f"# TYPE {metric} counter")
+            out.append(f"{metric}{_labels(labels)} {value:g}")
+        for (name, labels), h in sorted(self.histograms.items()):
+            metric = f"{PROMETHEUS_PREFIX}{name}"
+            if metric not in typed:
+                typed.add(metric)
+                out.append(f"# TYPE {metric} histogram")
+            cumulative = 0
+            for bound, count in zip((*BUCKETS, "+Inf"), h.counts):
+                cumulative += count
+                le = bound if isinstance(bound, str) else f"{bound:g}"
+                out.append(f"{metric}_bucket{_labels((*labels, ('le', le)))} {cumulative}")
+            out.append(f"{metric}_sum{_labels(labels)} {h.sum:.6f}")
+            out.append(f"{metric}_count{_labels(labels)} {h.count}")
+        return "\n".join(out) + "\n"
+
+    def render_text(self) -> str:
+        """A readable summary: latency per tool, MCP call, phase and RPC."""
+        state = "enabled" if self.enabled else "disabled"
+        uptime = _duration(time.time() - self.started)
+        lines = [f"Metrics ({state}, collected over {uptime})"]
+        sections = (
+            ("tool_seconds", "tool", "Tools"),
+            ("mcp_call_seconds", "tool", "MCP calls (incl. validation and serialization)"),
+            ("phase_seconds", "phase", "Phases"),
+            ("rpc_seconds", "method", "iTerm2 RPCs"),
+        )
+        for name, label, title in sections:
+            rows = [
+                (dict(labels).get(label, ""), h)
+                for (metric, labels), h in sorted(self.histograms.items())
+                if metric == name
+            ]
+            if not rows:
+                continue
+            lines.append(f"\n{title}:")
+            for key, h in rows:
+                row = (
+                    f"  {key:<22} n={h.count:<6} p50={_duration(h.quantile(0.5)):>8}"
+                    f" p95={_duration(h.quantile(0.95)):>8} p99={_duration(h.quantile(0.99)):>8}"
+                    f" total={_duration(h.sum):>8}"
+                )
+                if name == "tool_seconds":
+                    errors = self.counters.get(("tool_errors_total", (("tool", key),)), 0)
+                    row += f" errors={errors:g}" if errors else ""
+                if name == "rpc_seconds":
+                    size = self.counters.get(("rpc_bytes_total", (("method", key),)), 0)
+                    row += f" bytes={size:g}"
+                lines.append(row)
+        if len(lines) == 1:
+            lines.append("(nothing recorded yet)")
+        return "\n".join(lines)
+
+
+def _labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    body = ",".join(f'{key}="{_escape(value)}"' for key, value in labels)
+    return "{" + body + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _duration(seconds: float) -> str:
+    if seconds < 1:
+        return f"{seconds * 1000:.1f}ms"
+    if seconds < 120:
+        return f"{seconds:.2f}s"
+    return f"{seconds / 60:.1f}m"
+
+
+METRICS = Metrics()
+
+
+def timed(fn: _F) -> _F:
+    """Record the latency (and exceptions) of a tool function by its name."""
+    tool = fn.__name__
+
+    @functools.wraps(fn)
+    async def wrapper(*args: Any, **kwargs: Any) -> Any:
+        if not METRICS.enabled:
+            return await fn(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return await fn(*args, **kwargs)
+        except BaseException:
+            METRICS.inc("tool_errors_total", tool=tool)
+            raise
+        finally:
+            METRICS.observe("tool_seconds", time.perf_counter() - start, tool=tool)
+
+    return wrapper  # type: ignore[return-value]
+
+
+class MetricsMiddleware(Middleware):
+    """Times whole ``tools/call`` requests, including the MCP layer."""
+
+    async def on_call_tool(self, context: MiddlewareContext, call_next: CallNext) -> Any:
+        if not METRICS.enabled:
+            return await call_next(context)
+        with METRICS.time("mcp_call_seconds", tool=context.message.name):
+            return await call_next(context)
+
+
+async def _rpc(method: str, call: Awaitable[Any], size: Callable[[Any], int]) -> Any:
+    start = time.perf_counter()
+    result = await call
+    METRICS.observe("rpc_seconds", time.perf_counter() - start, method=method)
+    METRICS.inc("rpc_total", method=method)
+    METRICS.inc("rpc_bytes_total", size(result), method=method)
+    return result
+
+
+async def async_get_screen_contents(session: iterm2.Session) -> iterm2.ScreenContents:
+    """``session.async_get_screen_contents()``, counted when enabled."""
+    if not METRICS.enabled:
+        return await session.async_get_screen_contents()
+    return await _rpc(
+        "get_screen_contents",
+        session.async_get_screen_contents(),
+        lambda contents: sum(
+            len(contents.line(i).string.encode()) for i in range(contents.number_of_lines)
+        ),
+    )
+
+
+async def async_get_contents(
+    session: iterm2.Session, first_line: int, number_of_lines: int
+) -> list[iterm2.LineContents]:
+    """``session.async_get_contents()``, counted when enabled."""
+    if not METRICS.enabled:
+        return await session.async_get_contents(first_line, number_of_lines)
+    return await _rpc(
+        "get_contents",
+        session.async_get_contents(first_line, number_of_lines),
+        lambda lines: sum(len(line.string.encode()) for line in lines),
+    )
+
+
+async def async_send_text(session: iterm2.Session, text: str) -> None:
+    """``session.async_send_text()``, counted when enabled."""
+    if not METRICS.enabled:
+        return await session.async_send_text(text)
+    size = len(text.encode())
+    return await _rpc("send_text", session.async_send_text(text), lambda _: size)
+
+
+class MetricsExporter:
+    """Applies the ``[metrics]`` config and writes periodic dumps.
+
+    A background task re-reads the current config as often as the
+    :class:`~iterm2_agent.config.ConfigStore` polls its file, so enabling
+    metrics or changing the dump file takes effect without a restart, and
+    dumps every ``dump_interval`` seconds. The file is replaced atomically;
+    a last dump is written on close.
+    """
+
+    def __init__(self, config: ConfigStore, registry: Metrics = METRICS) -> None:
+        self.config = config
+        self.registry = registry
+        self._task: asyncio.Task | None = None
+        self.apply()
+
+    def apply(self) -> None:
+        self.registry.enabled = self.config.current.metrics.enabled
+
+    def dump(self) -> None:
+        """Write the registry to the configured file, if any."""
+        settings = self.config.current.metrics
+        if not settings.enabled or settings.dump_path is None:
+            return
+        if settings.dump_format == "json":
+            text = self.registry.render_json() + "\n"
+        else:
+            text = self.registry.render_prometheus()
+        path = settings.dump_path.expanduser()
+        temporary = path.with_name(f".{path.name}.tmp")
+        try:
+            temporary.write_text(text)
+            os.replace(temporary, path)
+        except OSError as exc:
+            logger.warning("Cannot write metrics to %s: %s", path, exc)
+
+    def start(self) -> None:
+        """Start the background task (idempotent)."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        next_dump = loop.time() + self.config.current.metrics.dump_interval
+        while True:
+            await asyncio.sleep(self.config.poll_interval)
+            self.apply()
+            if loop.time() >= next_dump:
+                self.dump()
+                next_dump = loop.time() + self.config.current.metrics.dump_interval
+
+    async def async_close(self) -> None:
+        """Stop the task and write a final dump."""
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        self.dump()
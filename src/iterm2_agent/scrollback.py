@@ -0,0 +1,256 @@
+"""Bounded per-session scrollback buffers fed by background screen streamers."""
+
+from __future__ import annotations
+
+import asyncio
+import itertools
+from collections import deque
+from typing import TYPE_CHECKING, Sequence
+
+import iterm2
+
+from iterm2_agent import metrics
+
+if TYPE_CHECKING:
+    from iterm2_agent.connection import ScreenCache
+
+DEFAULT_MAX_LINES_PER_SESSION = 10_000
+DEFAULT_MAX_TOTAL_LINES = 100_000
+# Most lines fetched from iTerm2 in one ranged read
+DEFAULT_READ_CHUNK_LINES = 1_000
+
+
+async def async_read_range(
+    session: iterm2.Session,
+    start: int,
+    count: int,
+    chunk_lines: int = DEFAULT_READ_CHUNK_LINES,
+) -> list[str]:
+    """Read ``count`` lines from absolute line ``start`` of a session.
+
+    Long ranges are fetched in sequential batches of ``chunk_lines`` so one
+    huge output never becomes one huge RPC response. Stops early if iTerm2
+    returns fewer lines than asked for.
+    """
+    lines: list[str] = []
+    end = start + count
+    while start < end:
+        size = min(chunk_lines, end - start)
+        fetched = await metrics.async_get_contents(session, start, size)
+        lines.extend(line.string for line in fetched)
+        if len(fetched) < size:
+            break
+        start += size
+    return lines
+
+
+class SessionScrollback:
+    """Lines of one session, addressed by absolute line number.
+
+    Absolute line numbers count every line the session has produced
+    (``number_of_lines_above_screen`` + screen row), so they stay stable
+    as output scrolls off the screen. Lines at or after ``screen_top`` were
+    on the mutable screen when last seen and may still change.
+    """
+
+    def __init__(self, max_lines: int) -> None:
+        self.max_lines = max_lines
+        self.first_line = 0
+        self.screen_top = 0
+        self._lines: deque[str] = deque()
+
+    def __len__(self) -> int:
+        return len(self._lines)
+
+    @property
+    def end_line(self) -> int:
+        """Absolute line number one past the last stored line."""
+        return self.first_line + len(self._lines)
+
+    def update(self, start: int, lines: Sequence[str]) -> int:
+        """Replace everything from ``start`` onwards with ``lines``.
+
+        A ``start`` outside the stored range discards the buffer, since the
+        lines in between are unknown.
+
+        Returns:
+            The change in the number of stored lines.
+        """
+        before = len(self._lines)
+        if not self._lines or start < self.first_line or start > self.end_line:
+            self._lines.clear()
+            self.first_line = start
+        else:
+            for _ in range(self.end_line - start):
+                self._lines.pop()
+        self._lines.extend(lines)
+
+        overflow = len(self._lines) - self.max_lines
+        if overflow > 0:
+            self.evict(overflow)
+        return len(self._lines) - before
+
+    def evict(self, count: int) -> int:
+        """Drop up to ``count`` of the oldest lines. Returns the number dropped."""
+        count = min(count, len(self._lines))
+        for _ in range(count):
+            self._lines.popleft()
+        self.first_line += count
+        return count
+
+    def read(self, start: int, end: int) -> list[str]:
+        """Return the stored lines in ``[start, end)``, clipped to what is held."""
+        start = max(start, self.first_line)
+        end = min(end, self.end_line)
+        if start >= end:
+            return []
+        offset = self.first_line
+        return list(itertools.islice(self._lines, start - offset, end - offset))
+
+
+class ScrollbackStore:
+    """Per-session scrollback buffers with per-session and global line caps.
+
+    When the global cap is exceeded, the oldest lines of the least recently
+    updated sessions are evicted first. Lines not held in memory are read
+    back from iTerm2 in batches of ``read_chunk_lines``. Background
+    streamers also report screen changes to ``screens``, if set.
+    """
+
+    def __init__(
+        self,
+        max_lines_per_session: int = DEFAULT_MAX_LINES_PER_SESSION,
+        max_total_lines: int = DEFAULT_MAX_TOTAL_LINES,
+        read_chunk_lines: int = DEFAULT_READ_CHUNK_LINES,
+        screens: ScreenCache | None = None,
+    ) -> None:
+        self.max_lines_per_session = max_lines_per_session
+        self.max_total_lines = max_total_lines
+        self.read_chunk_lines = read_chunk_lines
+        self.screens = screens
+        # Insertion order doubles as least-recently-updated order
+        self._buffers: dict[str, SessionScrollback] = {}
+        self._tasks: dict[str, asyncio.Task[None]] = {}
+        self._total = 0
+
+    @property
+    def total_lines(self) -> int:
+        return self._total
+
+    def get(self, session_id: str) -> SessionScrollback | None:
+        return self._buffers.get(session_id)
+
+    def ingest(self, session_id: str, start: int, lines: Sequence[str]) -> None:
+        """Store ``lines`` at absolute line ``start`` for a session."""
+        buffer = self._buffers.pop(session_id, None)
+        if buffer is None:
+            buffer = SessionScrollback(self.max_lines_per_session)
+        self._buffers[session_id] = buffer
+
+        self._total += buffer.update(start, lines)
+
+        for other in self._buffers.values():
+            excess = self._total - self.max_total_lines
+            if excess <= 0:
+                break
+            self._total -= other.evict(excess)
+
+    async def async_ingest_contents(
+        self,
+        session: iterm2.Session,
+        contents: iterm2.ScreenContents,
+    ) -> None:
+        """Store a screen snapshot, first fetching any lines that scrolled
+        off the screen since the previous snapshot."""
+        sid = session.session_id
+        above = contents.number_of_lines_above_screen
+        buffer = self._buffers.get(sid)
+
+        if buffer is not None and len(buffer) and buffer.screen_top < above:
+            first = max(buffer.screen_top, above - self.max_lines_per_session)
+            missed = await async_read_range(
+                session, first, above - first, self.read_chunk_lines
+            )
+            self.ingest(sid, first, missed)
+
+        screen = [contents.line(i).string for i in range(contents.number_of_lines)]
+        self.ingest(sid, above, screen)
+        self._buffers[sid].screen_top = above
+
+    async def async_read_lines(
+        self,
+        session: iterm2.Session,
+        start: int,
+        end: int,
+    ) -> list[str]:
+        """Return lines ``[start, end)`` from memory, reading any evicted
+        head of the range back from iTerm2."""
+        buffer = self._buffers.get(session.session_id)
+        if buffer is None or not len(buffer):
+            return await async_read_range(
+                session, start, end - start, self.read_chunk_lines
+            )
+
+        head: list[str] = []
+        if start < buffer.first_line:
+            count = min(end, buffer.first_line) - start
+            head = await async_read_range(session, start, count, self.read_chunk_lines)
+        return head + buffer.read(start, end)
+
+    def attach(self, session: iterm2.Session) -> None:
+        """Keep a session's buffer filled from a background screen streamer.
+
+        Calling this for an already-followed session is a no-op.
+        """
+        task = self._tasks.get(session.session_id)
+        if task is not None and not task.done():
+            return
+        self._tasks[session.session_id] = asyncio.create_task(
+            self._follow(session),
+            name=f"scrollback-{session.session_id}",
+        )
+
+    def followed(self) -> list[str]:
+        """IDs of sessions with a live background streamer."""
+        return [sid for sid, task in self._tasks.items() if not task.done()]
+
+    def discard(self, session_id: str) -> None:
+        """Stop following a session and free its buffer."""
+        task = self._tasks.pop(session_id, None)
+        if task is not None:
+            task.cancel()
+        buffer = self._buffers.pop(session_id, None)
+        if buffer is not None:
+            self._total -= len(buffer)
+        if self.screens is not None:
+            self.screens.discard(session_id)
+
+    async def async_close(self) -> None:
+        """Cancel all background streamers."""
+        tasks = list(self._tasks.values())
+        self._tasks.clear()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _follow(self, session: iterm2.Session) -> None:
+        sid = session.session_id
+        screens = self.screens
+        try:
+            async with session.get_screen_streamer() as streamer:
+                contents = await metrics.async_get_screen_contents(session)
+                await self.async_ingest_contents(session, contents)
+                while True:
+                    if screens is not None:
+                        screens.listen(sid)
+                    contents = await streamer.async_get()
+                    if screens is not None:
+                        screens.changed(sid, contents)
+                    await self.async_ingest_contents(session, contents)
+        except iterm2.RPCException:
+            # The session went away — its lines are no longer reachable
+            self._tasks.pop(sid, None)
+            self.discard(sid)
+        finally:
+            if screens is not None:
+                screens.stop_listening(sid)
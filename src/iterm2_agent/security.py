@@ -2,7 +2,9 @@
 
 from __future__ import annotations
 
+import re
 from enum import Enum
+from typing import Any, Iterable
 
 
 class SecurityLevel(Enum):
@@ -45,29 +47,357 @@ DANGEROUS_PREFIXES = frozenset({
 })
 
 
+class RuleSet:
+    """Prefix rules indexed by first character.
+
+    Built once (at import for the defaults, or when configuration is
+    loaded) and immutable afterwards. ``allow`` prefixes are always SAFE
+    and ``deny`` prefixes always DANGEROUS; deny wins over allow, and both
+    win over the built-in sets. Runs of whitespace count as one space, in
+    prefixes and in commands.
+
+    Pipeline patterns ("curl | sh") are checked across pipeline stages
+    rather than as literal prefixes, since segments are split at pipes.
+    Device redirections ("> /dev/") are detected by the lexer.
+    """
+
+    __slots__ = ("_levels", "_pipe_pairs", "_pipe_sources", "_verdicts")
+
+    def __init__(
+        self,
+        safe: Iterable[str] = SAFE_PREFIXES,
+        caution: Iterable[str] = CAUTION_PREFIXES,
+        dangerous: Iterable[str] = DANGEROUS_PREFIXES,
+        allow: Iterable[str] = (),
+        deny: Iterable[str] = (),
+    ) -> None:
+        levels = (
+            (SecurityLevel.DANGEROUS, _normalized(deny)),
+            (SecurityLevel.SAFE, _normalized(allow)),
+            (SecurityLevel.DANGEROUS, _normalized(dangerous)),
+            (SecurityLevel.SAFE, _normalized(safe)),
+            (SecurityLevel.CAUTION, _normalized(caution)),
+        )
+        self._pipe_pairs = frozenset(
+            tuple(part.strip() for part in p.split("|", 1))
+            for p in levels[0][1] | levels[2][1] if "|" in p
+        )
+        self._pipe_sources = frozenset(source for source, _ in self._pipe_pairs)
+
+        # Prefixes by first character, one tuple per level for
+        # str.startswith, tried in priority order: any dangerous prefix
+        # wins over a safe one, and safe wins over caution
+        self._levels: list[tuple[SecurityLevel, dict[str, tuple[str, ...]]]] = []
+        for level, prefixes in levels:
+            index: dict[str, list[str]] = {}
+            for p in sorted(prefixes):
+                if p and "|" not in p and not p.startswith(">"):
+                    index.setdefault(p[0], []).append(p)
+            if index:
+                self._levels.append(
+                    (level, {char: tuple(group) for char, group in index.items()})
+                )
+        # Segments repeat (in scripts, and across calls): remember verdicts
+        self._verdicts: dict[str, SecurityLevel | None] = {}
+
+    def classify(self, segment: str) -> SecurityLevel | None:
+        """Classify one simple command; None if it is only shell syntax."""
+        level = self._verdicts.get(segment, _UNKNOWN)
+        if level is _UNKNOWN:
+            if len(self._verdicts) >= _MAX_VERDICTS:
+                self._verdicts.clear()
+            level = self._verdicts[segment] = self._classify(segment)
+        return level
+
+    def _classify(self, segment: str) -> SecurityLevel | None:
+        lower = _strip_noise(" ".join(segment.lower().split()))
+        if not lower:
+            return None
+        first = lower[0]
+        for level, index in self._levels:
+            prefixes = index.get(first)
+            if prefixes is not None and lower.startswith(prefixes):
+                return level
+        # Unknown commands default to caution
+        return SecurityLevel.CAUTION
+
+    def pipes_into_shell(self, pipeline: list[str]) -> bool:
+        """True if a download stage (curl/wget) feeds a later shell stage."""
+        words = [_first_word(segment) for segment in pipeline]
+        for i, source in enumerate(words):
+            if source in self._pipe_sources:
+                for sink in words[i + 1:]:
+                    if (source, sink) in self._pipe_pairs:
+                        return True
+        return False
+
+
+_UNKNOWN: Any = object()
+
+# Segments whose verdict a rule set remembers
+_MAX_VERDICTS = 4096
+
+
+def _normalized(prefixes: Iterable[str]) -> frozenset[str]:
+    """Lowercased prefixes with runs of whitespace collapsed."""
+    return frozenset(_WHITESPACE_RE.sub(" ", p.lower()).lstrip() for p in prefixes)
+
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+# Target of an output redirection that writes to a device ("> /dev/sda");
+# the harmless sinks are allowed
+_DEVICE_TARGET = r"\s*/dev/(?!null\b|stdout\b|stderr\b|tty\b|fd/)"
+_DEVICE_TARGET_RE = re.compile(_DEVICE_TARGET)
+
+# Shell keywords, group braces and variable assignments around the real
+# command
+_LEADING_NOISE_RE = re.compile(
+    r"^(?:(?:if|then|else|elif|fi|do|done|while|until|esac|!|\{|\})(?:\s+|$)"
+    r"|\w+=\S*(?:\s+|$))+"
+)
+
+# Unquoted shell text: runs on through quoted strings (see _UNQUOTE_RE),
+# parameters, lone '$' and redirections other than to a device.
+# Possessive quantifiers keep the scan linear: a text run never gives
+# characters back.
+_TEXT = r"""(?:
+        [^'"\\`$;&|\n()#<>]++
+      | '[^']*+'
+      | "(?:[^"\\`$]++|\$\{[^}"]*+\}|\$(?![({]))*+"
+      | \$\{[^}'"]*+\}
+      | \$(?![({])
+      | (?:\d*[<>]&\d*-?|&>>?|>\||[<>]++)(?!""" + _DEVICE_TARGET + r""")
+    )++"""
+
+# Lexer for unquoted shell text. A text run and the separator or pipe
+# after it are one token; '&' followed by '>' is a redirection, not a
+# separator. A double-quoted string with a substitution switches to the
+# quoted lexer.
+_COMMAND_TOKEN_RE = re.compile(r"""
+    (?P<delimiter>(?P<last>""" + _TEXT + r""")?+(?:
+        (?P<separator>&&|\|\||;;|;|&(?!>)|\n)[\s;]*+
+      | \|&?
+    ))
+  | (?P<text>""" + _TEXT + r""")
+  | (?P<param>\$\{[^}]*\}?)
+  | (?P<redirect>\d*[<>]&\d*-?|&>>?|>\||[<>]+)
+  | (?P<single>'[^']*'?)
+  | (?P<escape>\\.?)
+  | (?P<double>")
+  | (?P<backtick>`)
+  | (?P<subst>\$\()
+  | (?P<open>\()
+  | (?P<close>\))
+  | (?P<comment>\#)
+  | (?P<dollar>\$)
+""", re.VERBOSE)
+
+# Characters the command lexer does not take as text
+_SPECIAL_RE = re.compile(r"['\"\\`$;&|\n()#<>]")
+
+# The quoted strings inside a text token, to remove their quotes
+_UNQUOTE_RE = re.compile(r"""'([^']*+)'|"((?:[^"\\`$]++|\$\{[^}"]*+\}|\$(?![({]))*+)\"""")
+
+# Lexer for text inside double quotes
+_QUOTED_TOKEN_RE = re.compile(r"""
+    (?P<text>(?:[^"\\`$]++|\$\{[^}"]*+\}|\$(?![({]))++)
+  | (?P<param>\$\{[^}]*\}?)
+  | (?P<escape>\\.?)
+  | (?P<double>")
+  | (?P<backtick>`)
+  | (?P<subst>\$\()
+  | (?P<dollar>\$)
+""", re.VERBOSE)
+
+
+class _Frame:
+    """A command context: top level, subshell, or command substitution."""
+
+    __slots__ = ("kind", "words", "pipeline")
+
+    def __init__(self, kind: str) -> None:
+        self.kind = kind
+        self.words: list[str] = []
+        self.pipeline: list[str] = []
+
+
+def split_pipelines(command: str) -> list[list[str]]:
+    """Split a shell command line into pipelines of simple-command segments.
+
+    Splits on ``;``, ``&&``, ``||``, ``&``, newlines, subshells,
+    ``$(...)`` and backticks (also inside double quotes), while keeping
+    quoted text together. Segments are returned with quotes removed;
+    segments joined by ``|`` share a pipeline. Malformed input (unbalanced
+    quotes or parentheses) is tolerated.
+    """
+    return _lex(command)[0]
+
+
+def _lex(command: str) -> tuple[list[list[str]], bool]:
+    """Tokenize a command line.
+
+    Returns:
+        (pipelines, writes_device) — see :func:`split_pipelines`;
+        writes_device is True if an unquoted output redirection targets a
+        device under /dev.
+    """
+    pipelines: list[list[str]] = []
+    writes_device = False
+    stack = [_Frame("top")]
+    quoted = False  # inside double quotes of the innermost frame
+    pos = 0
+    length = len(command)
+    if not _SPECIAL_RE.search(command):
+        # A single simple command: nothing to split
+        segment = command.strip()
+        return ([[segment]] if segment else []), False
+
+    def end_segment(frame: _Frame) -> None:
+        segment = "".join(frame.words).strip()
+        frame.words.clear()
+        if segment:
+            frame.pipeline.append(segment)
+
+    def end_pipeline(frame: _Frame) -> None:
+        end_segment(frame)
+        if frame.pipeline:
+            pipelines.append(frame.pipeline)
+            frame.pipeline = []
+
+    def close_frame() -> bool:
+        nonlocal quoted
+        frame = stack.pop()
+        end_pipeline(frame)
+        quoted = frame.kind == "quoted-subst" or frame.kind == "quoted-backtick"
+        return quoted
+
+    while pos < length:
+        # One pass over the tokens until the lexer changes (quotes,
+        # substitutions) or a comment skips ahead
+        lexer = _QUOTED_TOKEN_RE if quoted else _COMMAND_TOKEN_RE
+        frame = stack[-1]
+        words = frame.words
+        resume = length
+        for match in lexer.finditer(command, pos):
+            kind = match.lastgroup
+            if kind == "delimiter":
+                token, separator = match.group("last", "separator")
+                if token:
+                    if "'" in token or '"' in token:
+                        token = "".join(filter(None, _UNQUOTE_RE.split(token)))
+                    words.append(token)
+                if separator:
+                    end_pipeline(frame)
+                else:
+                    end_segment(frame)
+            elif kind == "text":
+                token = match.group()
+                if not quoted and ("'" in token or '"' in token):
+                    token = "".join(filter(None, _UNQUOTE_RE.split(token)))
+                words.append(token)
+            elif kind == "param" or kind == "dollar":
+                words.append(match.group())
+            elif kind == "redirect":
+                token = match.group()
+                words.append(token)
+                if ">" in token and _DEVICE_TARGET_RE.match(command, match.end()):
+                    writes_device = True
+            elif kind == "single":
+                token = match.group()
+                words.append(token[1:].rstrip("'") if len(token) > 1 else "")
+            elif kind == "escape":
+                words.append(match.group()[1:])
+            elif kind == "comment":
+                # '#' only starts a comment at the beginning of a word; inside
+                # one (even after quotes: ""#) it is text, and separators
+                # after it still split
+                if words and not command[match.start() - 1].isspace():
+                    words.append("#")
+                else:
+                    newline = command.find("\n", match.end())
+                    resume = length if newline < 0 else newline
+                    break
+            elif kind == "open":
+                end_pipeline(frame)
+                frame = _Frame("subshell")
+                stack.append(frame)
+                words = frame.words
+            elif kind == "close" and (len(stack) == 1 or frame.kind.endswith("backtick")):
+                end_pipeline(frame)
+            else:
+                # The lexer changes: double quote, substitution, backtick or
+                # the end of a subshell or substitution
+                resume = match.end()
+                if kind == "double":
+                    quoted = not quoted
+                elif kind == "subst":
+                    stack.append(_Frame("quoted-subst" if quoted else "subst"))
+                    quoted = False
+                elif kind == "backtick":
+                    if frame.kind.endswith("backtick"):
+                        close_frame()
+                    else:
+                        stack.append(_Frame("quoted-backtick" if quoted else "backtick"))
+                        quoted = False
+                else:  # close
+                    close_frame()
+                break
+        pos = resume
+
+    while stack:
+        end_pipeline(stack.pop())
+    return pipelines, writes_device
+
+
+def _first_word(segment: str) -> str:
+    words = _strip_noise(segment.lower()).split(None, 1)
+    return words[0] if words else ""
+
+
+def _strip_noise(text: str) -> str:
+    match = _LEADING_NOISE_RE.match(text)
+    return text[match.end():] if match else text
+
+
+DEFAULT_RULES = RuleSet()
+
+
 class SecurityGuard:
     """Classify commands by security risk level."""
 
     @classmethod
-    def check(cls, command: str) -> SecurityLevel:
-        """Return the security level for a command."""
-        stripped = command.strip()
-        lower = stripped.lower()
+    def check(cls, command: str, rules: RuleSet | None = None) -> SecurityLevel:
+        """Return the security level for a command.
 
-        for prefix in DANGEROUS_PREFIXES:
-            if lower.startswith(prefix):
-                return SecurityLevel.DANGEROUS
+        Compound commands are split into their simple commands and the
+        worst level across all of them is returned.
 
-        for prefix in SAFE_PREFIXES:
-            if lower.startswith(prefix):
-                return SecurityLevel.SAFE
+        Args:
+            command: Shell command line.
+            rules: Rules to apply; defaults to the built-in prefix sets.
+        """
+        rules = rules or DEFAULT_RULES
+        pipelines, writes_device = _lex(command)
+        if writes_device:
+            return SecurityLevel.DANGEROUS
 
-        for prefix in CAUTION_PREFIXES:
-            if lower.startswith(prefix):
-                return SecurityLevel.CAUTION
+        worst = None
+        for pipeline in pipelines:
+            if len(pipeline) > 1 and rules.pipes_into_shell(pipeline):
+                return SecurityLevel.DANGEROUS
+            for segment in pipeline:
+                level = rules.classify(segment)
+                if level is None:
+                    continue
+                if level is SecurityLevel.DANGEROUS:
+                    return level
+                # Worst so far: any caution beats safe
+                if worst is None or level is SecurityLevel.CAUTION:
+                    worst = level
 
-        # Unknown commands default to caution
-        return SecurityLevel.CAUTION
+        # Empty or unknown commands default to caution
+        return worst or SecurityLevel.CAUTION
 
     @classmethod
     def format_warning(cls, command: str, level: SecurityLevel) -> str:
@@ -5,27 +5,29 @@ from __future__ import annotations
 from contextlib import asynccontextmanager
 from typing import AsyncIterator
 
-import iterm2
 from fastmcp import FastMCP
 
-from iterm2_agent.connection import ITerm2Context
+from iterm2_agent.backend import create_backend
+from iterm2_agent.metrics import MetricsMiddleware
+from iterm2_agent.supervisor import ConnectionSupervisor, ConnectMiddleware
 
 
 @asynccontextmanager
-async def iterm2_lifespan(server: FastMCP) -> AsyncIterator[ITerm2Context]:
+async def iterm2_lifespan(server: FastMCP) -> AsyncIterator[ConnectionSupervisor]:
     """Manage iTerm2 connection lifecycle.
 
-    Connects on startup, yields the context for tools to use,
-    and ensures cleanup on shutdown.
+    Yields a supervisor that connects in the background, so the MCP
+    handshake does not wait for iTerm2, and reconnects if iTerm2 goes
+    away; tools get the live context from it, and the first calls wait
+    for the connection. Background tasks are stopped on shutdown.
+    $ITERM2_AGENT_BACKEND=fake swaps iTerm2 for the in-process fake terminal.
     """
-    connection = await iterm2.Connection.async_create()
-    app = await iterm2.async_get_app(connection)
-    ctx = ITerm2Context(connection=connection, app=app)
+    supervisor = ConnectionSupervisor(create_backend())
+    supervisor.start()
     try:
-        yield ctx
+        yield supervisor
     finally:
-        # iterm2 library handles its own cleanup on GC
-        pass
+        await supervisor.async_close()
 
 
 mcp = FastMCP(
@@ -37,4 +39,5 @@ mcp = FastMCP(
     ),
     version="0.1.0",
     lifespan=iterm2_lifespan,
+    middleware=[MetricsMiddleware(), ConnectMiddleware()],
 )
@@ -0,0 +1,167 @@
+"""In-memory session index kept current by iTerm2 layout notifications."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from dataclasses import dataclass, replace
+from typing import Iterable
+
+import iterm2
+
+from iterm2_agent.backend import Backend, ITerm2Backend
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class SessionEntry:
+    """Where a session lives and what is known about it."""
+
+    session: iterm2.Session
+    window_id: str
+    tab_id: str
+    title: str
+    cwd: str = ""
+
+    @property
+    def session_id(self) -> str:
+        return self.session.session_id
+
+
+class SessionIndex:
+    """Session ID → :class:`SessionEntry`, in window/tab/pane order.
+
+    Seeded from the app hierarchy and then maintained from the backend's
+    layout-change, new-session and terminate-session notifications, so
+    lookups are a dict access and never trigger a full app refresh. Until
+    :meth:`async_start` has run the index is inactive and callers should
+    fall back to the app.
+    """
+
+    def __init__(self, backend: Backend | None = None) -> None:
+        self.backend = backend if backend is not None else ITerm2Backend()
+        self._entries: dict[str, SessionEntry] = {}
+        self._connection: iterm2.Connection | None = None
+        self._tokens: list = []
+        self.active = False
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, session_id: str) -> SessionEntry | None:
+        return self._entries.get(session_id)
+
+    def entries(self) -> list[SessionEntry]:
+        return list(self._entries.values())
+
+    def rebuild(self, windows: Iterable[iterm2.Window]) -> None:
+        """Replace the index with the sessions of ``windows``, keeping the
+        last-known cwd of sessions that still exist."""
+        entries: dict[str, SessionEntry] = {}
+        for window in windows:
+            for tab in window.tabs:
+                for session in tab.sessions:
+                    old = self._entries.get(session.session_id)
+                    entries[session.session_id] = SessionEntry(
+                        session=session,
+                        window_id=window.window_id,
+                        tab_id=tab.tab_id,
+                        title=session.name or "",
+                        cwd=old.cwd if old else "",
+                    )
+        self._entries = entries
+
+    def add(self, session: iterm2.Session, window_id: str, tab_id: str) -> None:
+        """Record a session created by this server ahead of its notification."""
+        self._entries[session.session_id] = SessionEntry(
+            session=session,
+            window_id=window_id,
+            tab_id=tab_id,
+            title=session.name or "",
+        )
+
+    def remove(self, session_id: str) -> None:
+        self._entries.pop(session_id, None)
+
+    def record_cwd(self, session_id: str, cwd: str) -> None:
+        entry = self._entries.get(session_id)
+        if entry is not None and cwd and entry.cwd != cwd:
+            self._entries[session_id] = replace(entry, cwd=cwd)
+
+    async def async_start(self, connection: iterm2.Connection, app: iterm2.App) -> None:
+        """Seed from ``app`` and subscribe to layout notifications."""
+        self._connection = connection
+        self.rebuild(app.terminal_windows)
+        backend = self.backend
+        # Independent RPCs: one round trip instead of three
+        results = await asyncio.gather(
+            backend.async_subscribe_layout(connection, self._on_layout_change),
+            backend.async_subscribe_new_session(connection, self._on_new_session),
+            backend.async_subscribe_terminate_session(connection, self._on_terminate_session),
+            return_exceptions=True,
+        )
+        # Keep the subscriptions that were made, so async_stop can undo them
+        self._tokens = [result for result in results if not isinstance(result, BaseException)]
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        self.active = True
+
+    async def async_stop(self) -> None:
+        """Unsubscribe; safe to call on a connection that already closed."""
+        self.active = False
+        tokens, self._tokens = self._tokens, []
+        for token in tokens:
+            try:
+                await self.backend.async_unsubscribe(self._connection, token)
+            except Exception:  # the websocket may already be gone
+                pass
+
+    async def async_check(self, repair: bool = True) -> list[str]:
+        """Compare the index with a full session listing from the backend.
+
+        Returns:
+            One line per discrepancy; empty if the index is consistent.
+            With ``repair`` the index is rebuilt from the listing.
+        """
+        windows = await self.backend.async_list_windows(self._connection)
+        actual = {
+            session.session_id: (window.window_id, tab.tab_id)
+            for window in windows
+            for tab in window.tabs
+            for session in tab.sessions
+        }
+
+        problems = []
+        for session_id, (window_id, tab_id) in actual.items():
+            entry = self._entries.get(session_id)
+            if entry is None:
+                problems.append(f"missing: {session_id}")
+            elif (entry.window_id, entry.tab_id) != (window_id, tab_id):
+                problems.append(
+                    f"moved: {session_id} indexed in window {entry.window_id} "
+                    f"tab {entry.tab_id}, actually window {window_id} tab {tab_id}"
+                )
+        problems.extend(
+            f"stale: {session_id}" for session_id in self._entries
+            if session_id not in actual
+        )
+        if problems and repair:
+            self.rebuild(windows)
+        return problems
+
+    async def _on_layout_change(self, windows: list[iterm2.Window]) -> None:
+        self.rebuild(windows)
+
+    async def _on_new_session(self, session_id: str) -> None:
+        # A layout change normally follows and fills in window and tab;
+        # resync only if it did not arrive first
+        if session_id not in self._entries:
+            try:
+                await self.async_check()
+            except Exception as exc:
+                logger.info("Session index resync failed: %r", exc)
+
+    async def _on_terminate_session(self, session_id: str) -> None:
+        self.remove(session_id)
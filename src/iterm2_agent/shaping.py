@@ -0,0 +1,213 @@
+"""Output shaping: bound and condense text before a tool returns it.
+
+Every tool that returns terminal text passes it through :func:`shape_output`.
+Lines are normalized (ANSI escapes stripped, carriage-return overwrites
+resolved, tabs expanded, trailing blanks removed), runs of identical lines
+are collapsed, and output over the line or byte budget keeps a head and a
+tail window. Lines dropped from the middle that match an error pattern are
+kept and listed with their line numbers, so a failure buried in a long log
+is not lost. :class:`OutputShaper` is a single pass whose memory is bounded
+by the budget, not by the size of the output.
+"""
+
+from __future__ import annotations
+
+import re
+from collections import deque
+from dataclasses import dataclass
+from typing import Iterable
+
+# CSI sequences, OSC sequences (BEL or ST terminated) and two-byte escapes
+_ANSI_RE = re.compile(
+    r"\x1b\[[0-?]*[ -/]*[@-~]"
+    r"|\x1b\][^\x07\x1b]*(?:\x07|\x1b\\)?"
+    r"|\x1b[@-Z\\-_]"
+)
+# Other C0 controls (tab is expanded separately)
+_CONTROL_RE = re.compile(r"[\x00-\x08\x0b-\x1f\x7f]")
+
+DEFAULT_ERROR_PATTERNS = (
+    r"\berror\b",
+    r"\bfail(?:ed|ure|s)?\b",
+    r"\bfatal\b",
+    r"\bexception\b",
+    r"\btraceback\b",
+    r"\bpanic\b",
+    r"\bsegmentation fault\b",
+    r"\bpermission denied\b",
+    r"\bnot found\b",
+)
+
+
+def compile_error_patterns(patterns: Iterable[str]) -> re.Pattern[str] | None:
+    """Combine error patterns into one case-insensitive regex.
+
+    Raises:
+        re.error: If a pattern is not a valid regex.
+    """
+    patterns = list(patterns)
+    if not patterns:
+        return None
+    return re.compile("|".join(f"(?:{p})" for p in patterns), re.IGNORECASE)
+
+
+DEFAULT_ERROR_RE = compile_error_patterns(DEFAULT_ERROR_PATTERNS)
+
+
+@dataclass(frozen=True)
+class OutputConfig:
+    """Budgets and filters for tool output.
+
+    ``max_lines`` and ``max_bytes`` bound the shaped text; ``head_lines`` of
+    those lines (and a proportional share of the bytes) come from the start
+    of the output and the rest from the end. Runs of at least
+    ``collapse_repeats`` identical lines become one line plus a marker
+    (0 disables). Up to ``max_error_lines`` dropped lines matching
+    ``errors`` are listed between the head and the tail.
+    """
+
+    max_lines: int = 400
+    max_bytes: int = 64_000
+    head_lines: int = 100
+    max_line_length: int = 2_000
+    collapse_repeats: int = 3
+    max_error_lines: int = 20
+    error_patterns: tuple[str, ...] = DEFAULT_ERROR_PATTERNS
+    errors: re.Pattern[str] | None = DEFAULT_ERROR_RE
+
+
+def normalize_line(line: str, max_length: int = 0) -> str:
+    """Strip ANSI escapes and control characters from one line.
+
+    Text before a carriage return was overwritten on the terminal (progress
+    bars, spinners), so only the last non-empty segment is kept. Lines
+    longer than ``max_length`` (when positive) are cut with a marker.
+    """
+    if "\x1b" in line:
+        line = _ANSI_RE.sub("", line)
+    if "\r" in line:
+        segments = [s for s in line.split("\r") if s]
+        line = segments[-1] if segments else ""
+    if "\t" in line:
+        line = line.expandtabs()
+    line = _CONTROL_RE.sub("", line).rstrip()
+    if max_length > 0 and len(line) > max_length:
+        line = f"{line[:max_length]}… [+{len(line) - max_length} chars]"
+    return line
+
+
+class OutputShaper:
+    """Streaming head/tail shaper; feed lines, then call :meth:`result`.
+
+    The head is filled first; once it is full, lines go to a tail window
+    whose oldest lines are evicted, and counted as omitted, whenever it goes
+    over its line or byte budget. Memory is bounded by the budget plus
+    ``max_error_lines``.
+    """
+
+    def __init__(self, config: OutputConfig | None = None) -> None:
+        config = config or OutputConfig()
+        self.config = config
+        head_lines = min(config.head_lines, config.max_lines)
+        self._head_budget = (head_lines, config.max_bytes * head_lines // config.max_lines)
+        self._tail_budget = (
+            config.max_lines - head_lines,
+            config.max_bytes - self._head_budget[1],
+        )
+        self._head: list[str] = []
+        self._head_bytes = 0
+        self._head_open = True
+        self._tail: deque[tuple[int, str, bool]] = deque()
+        self._tail_bytes = 0
+        self._errors: list[tuple[int, str]] = []
+        self._error_count = 0
+        self._omitted = 0
+        self._line_no = 0
+        # Pending run of identical lines: (first line number, text, count)
+        self._run: tuple[int, str, int] | None = None
+
+    def feed(self, line: str) -> None:
+        """Add one raw output line."""
+        self._line_no += 1
+        text = normalize_line(line, self.config.max_line_length)
+        run = self._run
+        if run is not None and run[1] == text:
+            self._run = (run[0], text, run[2] + 1)
+            return
+        self._flush_run()
+        self._run = (self._line_no, text, 1)
+
+    def feed_all(self, lines: Iterable[str]) -> OutputShaper:
+        for line in lines:
+            self.feed(line)
+        return self
+
+    def result(self) -> str:
+        """The shaped text; trailing blank lines are dropped."""
+        if self._run is not None and not self._run[1]:
+            self._run = None
+        self._flush_run()
+        parts = list(self._head)
+        if self._omitted:
+            note = f"[… {self._omitted} lines omitted"
+            if self._error_count:
+                shown = len(self._errors)
+                more = self._error_count - shown
+                note += f"; {self._error_count} matched error patterns"
+                note += f", first {shown} shown" if more else ""
+            parts.append(note + " …]")
+            parts.extend(f"{number}: {text}" for number, text in self._errors)
+            if self._errors:
+                parts.append("[…]")
+        parts.extend(text for _, text, _ in self._tail)
+        while parts and not parts[-1]:
+            parts.pop()
+        return "\n".join(parts)
+
+    def _flush_run(self) -> None:
+        run, self._run = self._run, None
+        if run is None:
+            return
+        number, text, count = run
+        minimum = self.config.collapse_repeats
+        if minimum and count >= minimum:
+            self._emit(number, text, True)
+            self._emit(number + 1, f"[previous line repeated {count - 1} more times]", False)
+        else:
+            for offset in range(count):
+                self._emit(number + offset, text, True)
+
+    def _emit(self, number: int, text: str, output: bool) -> None:
+        size = len(text.encode()) + 1
+        max_lines, max_bytes = self._head_budget
+        if self._head_open:
+            if len(self._head) < max_lines and self._head_bytes + size <= max_bytes:
+                self._head.append(text)
+                self._head_bytes += size
+                return
+            self._head_open = False
+
+        self._tail.append((number, text, output))
+        self._tail_bytes += size
+        max_lines, max_bytes = self._tail_budget
+        while self._tail and (
+            len(self._tail) > max_lines or self._tail_bytes > max_bytes
+        ):
+            old_number, old_text, old_output = self._tail.popleft()
+            self._tail_bytes -= len(old_text.encode()) + 1
+            self._omitted += 1
+            if old_output:
+                self._note_error(old_number, old_text)
+
+    def _note_error(self, number: int, text: str) -> None:
+        errors = self.config.errors
+        if errors is None or not errors.search(text):
+            return
+        self._error_count += 1
+        if len(self._errors) < self.config.max_error_lines:
+            self._errors.append((number, text))
+
+
+def shape_output(lines: Iterable[str], config: OutputConfig | None = None) -> str:
+    """Normalize, collapse and budget ``lines`` in one pass; see :class:`OutputShaper`."""
+    return OutputShaper(config).feed_all(lines).result()
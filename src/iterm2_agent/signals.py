@@ -0,0 +1,193 @@
+"""Signals from programs in a session to the agent, over custom control sequences.
+
+A script tells the agent something by printing an iTerm2 custom control
+sequence with the configured identity::
+
+    printf '\\033]1337;Custom=id=%s:%s\\a' iterm2-agent "done exit=0 id=build"
+
+iTerm2 does not display it; it notifies API clients instead. The payload
+is parsed into a :class:`Signal`: a name (``done``), ``key=value`` fields
+(``exit``, ``id``) and any other words as arguments, split like a shell
+command line. A signal goes to the first waiter it satisfies (``run_command``
+with ``completion="signal"``, ``watch_output`` with ``source="signal"``),
+otherwise into a bounded per-session queue read by ``poll_signals``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import collections
+import shlex
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Any, Callable, Iterator, Mapping
+
+from iterm2_agent.backend import Backend
+from iterm2_agent.config import ConfigStore, SignalsConfig
+from iterm2_agent.metrics import METRICS
+
+SignalPredicate = Callable[["Signal"], bool]
+
+
+@dataclass(frozen=True)
+class Signal:
+    """One parsed payload, as sent by a program in ``session_id``."""
+
+    session_id: str
+    name: str
+    fields: Mapping[str, str] = field(default_factory=lambda: MappingProxyType({}))
+    args: tuple[str, ...] = ()
+    payload: str = ""
+    at: float = field(default_factory=time.time)
+
+
+def parse_signal(session_id: str, payload: str) -> Signal:
+    """Parse ``name key=value ... word ...``.
+
+    Quoting follows shell rules (``msg="two words"``); a payload with
+    unbalanced quotes is split on whitespace instead.
+    """
+    try:
+        words = shlex.split(payload)
+    except ValueError:
+        words = payload.split()
+    name = words.pop(0) if words and "=" not in words[0] else ""
+    fields, args = {}, []
+    for word in words:
+        key, eq, value = word.partition("=")
+        if eq:
+            fields[key] = value
+        else:
+            args.append(word)
+    return Signal(session_id, name, MappingProxyType(fields), tuple(args), payload)
+
+
+def signal_command(identity: str, payload: str) -> str:
+    """A POSIX shell command that sends ``payload`` (shell expansions allowed)."""
+    return f"printf '\\033]1337;Custom=id=%s:%s\\a' {shlex.quote(identity)} \"{payload}\""
+
+
+class SignalHub:
+    """Receives custom control sequences and routes the parsed signals.
+
+    Subscribed per connection by the supervisor (:meth:`async_start` /
+    :meth:`async_stop`); queued signals and waiters carry over reconnects.
+    Sequences with an identity other than ``[signals] identity`` belong to
+    someone else and are ignored.
+    """
+
+    def __init__(self, config: ConfigStore | None = None) -> None:
+        self.config = config
+        self._queues: dict[str, collections.deque[Signal]] = {}
+        self._waiters: list[tuple[str, SignalPredicate, asyncio.Future[Signal]]] = []
+        self._arrived = asyncio.Event()
+        self._backend: Backend | None = None
+        self._connection: Any = None
+        self._token: Any = None
+        self.dropped = 0
+
+    @property
+    def limits(self) -> SignalsConfig:
+        return self.config.current.signals if self.config is not None else SignalsConfig()
+
+    async def async_start(self, backend: Backend, connection: Any) -> None:
+        """Subscribe to custom control sequences on ``connection``."""
+        self._backend, self._connection = backend, connection
+        self._token = await backend.async_subscribe_custom_sequence(
+            connection, self._on_sequence
+        )
+
+    async def async_stop(self) -> None:
+        """Unsubscribe; safe to call on a connection that already closed."""
+        token, self._token = self._token, None
+        if token is None:
+            return
+        try:
+            await self._backend.async_unsubscribe(self._connection, token)
+        except Exception:  # the websocket may already be gone
+            pass
+
+    async def _on_sequence(self, session_id: str, identity: str, payload: str) -> None:
+        if identity != self.limits.identity:
+            return
+        self.deliver(parse_signal(session_id, payload))
+
+    def deliver(self, signal: Signal) -> None:
+        """Hand a signal to the first waiter it satisfies, else queue it."""
+        if METRICS.enabled:
+            METRICS.inc("signals_total")
+        for waiter in self._waiters:
+            session_id, predicate, future = waiter
+            if session_id == signal.session_id and not future.done() and predicate(signal):
+                future.set_result(signal)
+                self._waiters.remove(waiter)
+                return
+        queue = self._queues.setdefault(signal.session_id, collections.deque())
+        if len(queue) >= self.limits.max_queued:
+            queue.popleft()
+            self.dropped += 1
+        queue.append(signal)
+        self._arrived.set()
+
+    @contextmanager
+    def expect(
+        self,
+        session_id: str,
+        predicate: SignalPredicate,
+    ) -> Iterator[asyncio.Future[Signal]]:
+        """Wait for a signal that has not been sent yet.
+
+        Yields a future resolved by the first matching signal delivered
+        inside the block, so the waiter is in place before whatever
+        triggers the signal runs.
+        """
+        future: asyncio.Future[Signal] = asyncio.get_running_loop().create_future()
+        waiter = (session_id, predicate, future)
+        self._waiters.append(waiter)
+        try:
+            yield future
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    def take(
+        self,
+        session_id: str = "",
+        predicate: SignalPredicate | None = None,
+        limit: int | None = None,
+    ) -> list[Signal]:
+        """Remove and return queued signals, oldest first per session."""
+        taken = []
+        for sid in [session_id] if session_id else list(self._queues):
+            queue = self._queues.get(sid)
+            if not queue:
+                continue
+            kept = collections.deque()
+            for signal in queue:
+                wanted = predicate is None or predicate(signal)
+                if wanted and (limit is None or len(taken) < limit):
+                    taken.append(signal)
+                else:
+                    kept.append(signal)
+            if kept:
+                self._queues[sid] = kept
+            else:
+                del self._queues[sid]
+        return taken
+
+    async def wait_any(self, session_id: str = "", timeout: float = 0) -> None:
+        """Wait up to ``timeout`` seconds until a signal is queued (for the
+        session, if given)."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while not (self._queues.get(session_id) if session_id else self._queues):
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return
+            self._arrived.clear()
+            try:
+                await asyncio.wait_for(self._arrived.wait(), remaining)
+            except asyncio.TimeoutError:
+                return
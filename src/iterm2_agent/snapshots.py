@@ -0,0 +1,95 @@
+"""Remembered screen snapshots for diff-based ``read_screen`` responses."""
+
+from __future__ import annotations
+
+import itertools
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Sequence
+
+DEFAULT_MAX_SNAPSHOTS = 256
+DEFAULT_MAX_SNAPSHOT_LINES = 50_000
+
+
+@dataclass(frozen=True)
+class ScreenSnapshot:
+    """Screen text of one session as returned to a client.
+
+    ``lines`` is any immutable sequence of lines: ``read_screen`` stores the
+    :class:`~iterm2_agent.connection.CompactScreen` it read, one string
+    for the whole screen.
+    """
+
+    session_id: str
+    lines: Sequence[str]
+
+
+class SnapshotStore:
+    """Snapshots addressed by opaque tokens, with LRU eviction.
+
+    Every ``read_screen`` response carries the token of the snapshot it
+    returned; a client passes it back as ``since`` to get only what changed.
+    Tokens are per response rather than per session, so several clients
+    polling the same session each diff against what they last saw.
+    """
+
+    def __init__(
+        self,
+        max_snapshots: int = DEFAULT_MAX_SNAPSHOTS,
+        max_total_lines: int = DEFAULT_MAX_SNAPSHOT_LINES,
+    ) -> None:
+        self.max_snapshots = max_snapshots
+        self.max_total_lines = max_total_lines
+        self._snapshots: OrderedDict[str, ScreenSnapshot] = OrderedDict()
+        self._counter = itertools.count(1)
+        self._total = 0
+
+    def __len__(self) -> int:
+        return len(self._snapshots)
+
+    @property
+    def total_lines(self) -> int:
+        return self._total
+
+    def get(self, token: str, session_id: str) -> ScreenSnapshot | None:
+        """Look up a snapshot of ``session_id``, marking it recently used."""
+        snapshot = self._snapshots.get(token)
+        if snapshot is None or snapshot.session_id != session_id:
+            return None
+        self._snapshots.move_to_end(token)
+        return snapshot
+
+    def put(self, snapshot: ScreenSnapshot) -> str:
+        """Store a snapshot and return its token, evicting the least
+        recently used snapshots beyond the caps."""
+        token = f"s{next(self._counter):x}"
+        self._snapshots[token] = snapshot
+        self._total += len(snapshot.lines)
+        # The newest snapshot is always kept, even if it alone is over the cap
+        while len(self._snapshots) > 1 and (
+            len(self._snapshots) > self.max_snapshots
+            or self._total > self.max_total_lines
+        ):
+            _, evicted = self._snapshots.popitem(last=False)
+            self._total -= len(evicted.lines)
+        return token
+
+
+def changed_ranges(
+    old: Sequence[str],
+    new: Sequence[str],
+) -> list[tuple[int, int]]:
+    """Half-open ``[start, end)`` ranges of ``new`` whose lines differ from
+    ``old``. Lines past the end of ``old`` count as changed."""
+    ranges: list[tuple[int, int]] = []
+    start = None
+    for i, line in enumerate(new):
+        if i < len(old) and old[i] == line:
+            if start is not None:
+                ranges.append((start, i))
+                start = None
+        elif start is None:
+            start = i
+    if start is not None:
+        ranges.append((start, len(new)))
+    return ranges
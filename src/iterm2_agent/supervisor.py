@@ -0,0 +1,308 @@
+"""Connection supervisor: detects a dropped iTerm2 websocket and reconnects."""
+
+from __future__ import annotations
+
+import asyncio
+import dataclasses
+import logging
+from typing import Any
+
+from fastmcp import Context
+from fastmcp.server.middleware import CallNext, Middleware, MiddlewareContext
+
+from iterm2_agent.backend import Backend, ITerm2Backend
+from iterm2_agent.connection import (
+    ConnectionLostError,
+    ITerm2Context,
+    NotConnectedError,
+    ScreenCache,
+)
+from iterm2_agent.metrics import MetricsExporter
+from iterm2_agent.scrollback import ScrollbackStore
+from iterm2_agent.session_index import SessionIndex
+from iterm2_agent.signals import SignalHub
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INITIAL_BACKOFF = 0.5
+DEFAULT_MAX_BACKOFF = 10.0
+# How long a tool call waits for a first connection still being made
+DEFAULT_CONNECT_WAIT = 10.0
+
+
+class ConnectionSupervisor:
+    """Owns the live :class:`ITerm2Context` and replaces it after a drop.
+
+    ``ITerm2Context`` is frozen and bound to one websocket, so tools look
+    it up through the supervisor on every call (see
+    :func:`get_iterm_context`). When the websocket closes, the old context
+    is marked lost, RPCs still waiting for a reply fail with
+    :class:`ConnectionLostError`, and a new connection is opened with
+    exponential backoff. Sessions that had a background scrollback
+    streamer or watchers are followed again if they still exist after
+    reconnecting.
+
+    :meth:`async_start` connects before returning; :meth:`start` connects
+    in the background, retrying with the same backoff, so a server can
+    answer the MCP handshake meanwhile (see :class:`ConnectMiddleware`).
+    """
+
+    def __init__(
+        self,
+        backend: Backend | None = None,
+        initial_backoff: float = DEFAULT_INITIAL_BACKOFF,
+        max_backoff: float = DEFAULT_MAX_BACKOFF,
+        connect_wait: float = DEFAULT_CONNECT_WAIT,
+    ) -> None:
+        self.backend = backend if backend is not None else ITerm2Backend()
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.connect_wait = connect_wait
+        self._context: ITerm2Context | None = None
+        self._last_context: ITerm2Context | None = None
+        self._task: asyncio.Task[None] | None = None
+        self._connected = asyncio.Event()
+        self._exporter: MetricsExporter | None = None
+        self.reconnects = 0
+        self.attempts = 0
+        self.last_error: Exception | None = None
+
+    @property
+    def connected(self) -> bool:
+        return self._context is not None
+
+    @property
+    def connecting(self) -> bool:
+        """True until the first connection is made."""
+        return self._last_context is None
+
+    @property
+    def context(self) -> ITerm2Context:
+        """The live context.
+
+        Raises:
+            NotConnectedError: Before the first connection.
+            ConnectionLostError: While reconnecting.
+        """
+        if self._context is None:
+            if self.connecting:
+                detail = f"attempt {self.attempts}"
+                if self.last_error is not None:
+                    detail += f": {self.last_error!r}"
+                raise NotConnectedError(detail)
+            raise ConnectionLostError(f"reconnect attempt {self.attempts}")
+        return self._context
+
+    async def async_start(self) -> ITerm2Context:
+        """Connect (failing if iTerm2 is unreachable) and start supervising."""
+        context = await self._open()
+        self._task = asyncio.create_task(self._supervise(), name="iterm2-supervisor")
+        return context
+
+    def start(self) -> None:
+        """Connect and supervise in the background; returns at once."""
+        if self._task is None:
+            self._task = asyncio.create_task(
+                self._connect_and_supervise(), name="iterm2-supervisor"
+            )
+
+    async def _open(self) -> ITerm2Context:
+        self.attempts += 1
+        connection, app = await self.backend.async_connect()
+        context = ITerm2Context(
+            connection=connection,
+            app=app,
+            backend=self.backend,
+            sessions=SessionIndex(self.backend),
+        )
+        await self._subscribe(connection, app, context.sessions, context.signals)
+        context.config.start()
+        self._exporter = MetricsExporter(context.config)
+        self._exporter.start()
+        self._set_context(context)
+        return context
+
+    async def _subscribe(
+        self,
+        connection: Any,
+        app: Any,
+        sessions: SessionIndex,
+        signals: SignalHub,
+    ) -> None:
+        """Start the session index and signal hub on a new connection.
+
+        If either fails, the subscriptions already made are cancelled and
+        the connection is closed, so the next attempt starts clean.
+        """
+        results = await asyncio.gather(
+            sessions.async_start(connection, app),
+            signals.async_start(self.backend, connection),
+            return_exceptions=True,
+        )
+        errors = [result for result in results if isinstance(result, BaseException)]
+        if errors:
+            await sessions.async_stop()
+            await signals.async_stop()
+            await self.backend.async_close_connection(connection)
+            raise errors[0]
+
+    async def _connect_and_supervise(self) -> None:
+        delay = self.initial_backoff
+        # Connecting resets self.attempts, so count the failures here
+        failures = 0
+        while True:
+            try:
+                await self._open()
+                break
+            except Exception as exc:  # iTerm2 not running, API disabled, ...
+                self.last_error = exc
+                failures += 1
+                log = logger.warning if self.attempts == 1 else logger.info
+                log("Connecting to iTerm2 failed (attempt %d): %r", self.attempts, exc)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_backoff)
+        if failures:
+            logger.warning("Connected to iTerm2 after %d failed attempts", failures)
+        await self._supervise()
+
+    async def wait_connected(self, timeout: float | None = None) -> ITerm2Context:
+        """Wait until a live context is available."""
+        await asyncio.wait_for(self._connected.wait(), timeout)
+        return self.context
+
+    async def async_close(self) -> None:
+        """Stop supervising and release the current context."""
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        exporter, self._exporter = self._exporter, None
+        if exporter is not None:
+            await exporter.async_close()
+        context = self._context or self._last_context
+        self._context = None
+        self._connected.clear()
+        if context is not None:
+            await context.jobs.async_close()
+            await context.watchers.async_close()
+            await context.signals.async_stop()
+            await context.sessions.async_stop()
+            await context.scrollback.async_close()
+            await context.config.async_close()
+        await self.backend.async_close()
+
+    def _set_context(self, context: ITerm2Context) -> None:
+        self._context = self._last_context = context
+        self.attempts = 0
+        self._connected.set()
+
+    async def _supervise(self) -> None:
+        while True:
+            context = self.context
+            await self.backend.async_wait_closed(context.connection)
+            followed = await self._drop(context)
+            await self._reconnect(context, followed)
+
+    async def _drop(self, context: ITerm2Context) -> list[str]:
+        """Retire a context whose websocket closed.
+
+        Returns:
+            IDs of sessions that were followed by scrollback streamers.
+        """
+        logger.warning("iTerm2 connection lost; reconnecting")
+        self._context = None
+        self._connected.clear()
+        context.lost.set()
+        self.backend.fail_pending_requests(context.connection)
+        await context.watchers.async_stop()
+        await context.signals.async_stop()
+        await context.sessions.async_stop()
+        followed = context.scrollback.followed()
+        await context.scrollback.async_close()
+        return followed
+
+    async def _reconnect(self, old: ITerm2Context, followed: list[str]) -> None:
+        delay = self.initial_backoff
+        sessions = SessionIndex(self.backend)
+        while True:
+            self.attempts += 1
+            try:
+                connection, app = await self.backend.async_connect()
+                await self._subscribe(connection, app, sessions, old.signals)
+                break
+            except Exception as exc:  # refused sockets, handshake errors, ...
+                logger.info("Reconnect attempt %d failed: %r", self.attempts, exc)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_backoff)
+
+        # Config and read_screen snapshots survive; line numbers may not
+        context = dataclasses.replace(
+            old,
+            connection=connection,
+            app=app,
+            scrollback=ScrollbackStore(
+                old.scrollback.max_lines_per_session,
+                old.scrollback.max_total_lines,
+                old.scrollback.read_chunk_lines,
+            ),
+            screens=ScreenCache(old.screens.ttl),
+            sessions=sessions,
+            lost=asyncio.Event(),
+        )
+        for session_id in followed:
+            entry = sessions.get(session_id)
+            if entry is not None:
+                context.scrollback.attach(entry.session)
+        context.watchers.resume(context)
+        self.reconnects += 1
+        self._set_context(context)
+        logger.warning("Reconnected to iTerm2")
+
+
+class ConnectMiddleware(Middleware):
+    """Holds tool calls made while the first connection is being made.
+
+    With :meth:`ConnectionSupervisor.start` the server takes requests
+    before iTerm2 is reached; a ``tools/call`` in that window waits up to
+    ``connect_wait`` seconds for the connection, then runs anyway (and
+    fails with :class:`NotConnectedError` if it needs iTerm2). Calls made
+    while reconnecting later are not held.
+    """
+
+    async def on_call_tool(self, context: MiddlewareContext, call_next: CallNext) -> Any:
+        fastmcp_context = context.fastmcp_context
+        request_context = fastmcp_context.request_context if fastmcp_context else None
+        state = request_context.lifespan_context if request_context else None
+        if isinstance(state, ConnectionSupervisor) and state.connecting:
+            try:
+                await state.wait_connected(timeout=state.connect_wait)
+            except asyncio.TimeoutError:
+                pass
+        return await call_next(context)
+
+
+def get_iterm_context(ctx: Context) -> ITerm2Context:
+    """Return the live :class:`ITerm2Context` for a tool call.
+
+    The lifespan context is normally a :class:`ConnectionSupervisor`; a bare
+    ``ITerm2Context`` (as used by tests and embedders) is returned as is.
+
+    Raises:
+        ConnectionLostError: While the supervisor is reconnecting.
+    """
+    return live_context(ctx.request_context.lifespan_context)
+
+
+def live_context(state: ConnectionSupervisor | ITerm2Context) -> ITerm2Context:
+    """The live context behind a lifespan context.
+
+    For work that outlives the tool call (background jobs), which keeps
+    the lifespan context and looks the connection up when it needs it.
+
+    Raises:
+        ConnectionLostError: While the supervisor is reconnecting.
+    """
+    if isinstance(state, ConnectionSupervisor):
+        return state.context
+    return state
+
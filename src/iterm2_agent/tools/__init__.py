@@ -6,3 +6,12 @@ from iterm2_agent.tools.send_text import send_text  # noqa: F401
 from iterm2_agent.tools.send_control import send_control  # noqa: F401
 from iterm2_agent.tools.watch_output import watch_output  # noqa: F401
 from iterm2_agent.tools.manage_session import manage_session  # noqa: F401
+from iterm2_agent.tools.run_command_multi import run_command_multi  # noqa: F401
+from iterm2_agent.tools.get_metrics import get_metrics  # noqa: F401
+from iterm2_agent.tools.enqueue_command import enqueue_command  # noqa: F401
+from iterm2_agent.tools.poll_job import poll_job  # noqa: F401
+from iterm2_agent.tools.cancel_job import cancel_job  # noqa: F401
+from iterm2_agent.tools.add_watcher import add_watcher  # noqa: F401
+from iterm2_agent.tools.poll_events import poll_events  # noqa: F401
+from iterm2_agent.tools.remove_watcher import remove_watcher  # noqa: F401
+from iterm2_agent.tools.poll_signals import poll_signals  # noqa: F401
@@ -0,0 +1,74 @@
+"""Tool: add_watcher — Register patterns to watch for in the background."""
+
+from __future__ import annotations
+
+from fastmcp import Context
+
+from iterm2_agent.concurrency import client_id
+from iterm2_agent.metrics import timed
+from iterm2_agent.server import mcp
+from iterm2_agent.supervisor import get_iterm_context
+from iterm2_agent.watchers import WatchEvent
+
+
+@mcp.tool()
+@timed
+async def add_watcher(
+    ctx: Context,
+    patterns: list[str],
+    session_id: str = "",
+    scope: str = "new",
+    ttl: int | None = None,
+    once: bool = False,
+    notify: bool = False,
+) -> str:
+    """Watch a session for regex patterns in the background.
+
+    Returns a watcher ID at once. Every new or changed line of the session
+    is matched against the patterns; each match queues an event, read with
+    poll_events. Unlike watch_output, no tool call stays open, and one
+    session can have many watchers at little extra cost.
+
+    Args:
+        patterns: Regular expressions; a line matching any of them is an event.
+        session_id: Target session ID. Empty string uses the current active session.
+        scope: 'new' (only output from now on) or 'screen' (also the lines
+            currently on screen).
+        ttl: Seconds until the watcher is removed. Defaults to the
+            configured TTL (600s unless overridden).
+        once: Remove the watcher after its first event.
+        notify: Also push each event to the client as a log notification
+            (best effort; poll_events still returns it).
+
+    Returns:
+        The watcher ID and when it expires.
+    """
+    iterm_ctx = get_iterm_context(ctx)
+    session = await iterm_ctx.resolve_session(session_id)
+
+    async def push(event: WatchEvent) -> None:
+        await ctx.info(f"[{event.watcher_id}] {event.line}", logger_name="watcher")
+
+    try:
+        watcher = await iterm_ctx.watchers.add(
+            iterm_ctx,
+            session,
+            patterns,
+            scope=scope,
+            ttl=ttl,
+            once=once,
+            notify=push if notify else None,
+            owner=client_id(ctx),
+        )
+    except ValueError as exc:
+        return str(exc)
+
+    ttl = iterm_ctx.watchers.limits.default_ttl if ttl is None else ttl
+    count = len(watcher.compiled)
+    lines = [
+        f"Watching session {watcher.session_id} as {watcher.id}: "
+        f"{count} pattern{'s' if count != 1 else ''}, expires in {ttl:g}s"
+    ]
+    if watcher.events:
+        lines.append(f"{watcher.events} event(s) from the current screen queued")
+    return "\n".join(lines)
@@ -0,0 +1,40 @@
+"""Tool: cancel_job — Cancel a queued or running background job."""
+
+from __future__ import annotations
+
+from fastmcp import Context
+
+from iterm2_agent.metrics import timed
+from iterm2_agent.server import mcp
+from iterm2_agent.supervisor import get_iterm_context
+from iterm2_agent.tools.poll_job import describe_job
+
+
+@mcp.tool()
+@timed
+async def cancel_job(
+    ctx: Context,
+    job_id: str,
+) -> str:
+    """Cancel a background job started by enqueue_command.
+
+    A queued job is removed from its session's queue. A running job is
+    interrupted with Ctrl+C; if it has not exited after the configured
+    grace period (5s unless overridden), the server stops waiting for it.
+
+    Args:
+        job_id: Job ID returned by enqueue_command.
+
+    Returns:
+        The job's final state and any output it produced.
+    """
+    iterm_ctx = get_iterm_context(ctx)
+    job = iterm_ctx.jobs.get(job_id)
+    if job is None:
+        return f"Job not found: {job_id}"
+    output = iterm_ctx.config.current.output
+    if job.finished:
+        return f"Job already finished\n{describe_job(job, iterm_ctx.jobs, output)}"
+
+    await iterm_ctx.jobs.cancel(job)
+    return describe_job(job, iterm_ctx.jobs, output)
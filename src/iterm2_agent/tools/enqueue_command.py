@@ -0,0 +1,110 @@
+"""Tool: enqueue_command — Queue a command to run as a background job."""
+
+from __future__ import annotations
+
+from fastmcp import Context
+
+from iterm2_agent import metrics
+from iterm2_agent.concurrency import client_id
+from iterm2_agent.connection import ITerm2Context
+from iterm2_agent.jobs import Job
+from iterm2_agent.metrics import timed
+from iterm2_agent.server import mcp
+from iterm2_agent.supervisor import ConnectionSupervisor, get_iterm_context, live_context
+from iterm2_agent.tools.run_command import COMPLETION_MODES, execute_locked
+from iterm2_agent.tools.send_control import CONTROL_MAP
+
+
+@mcp.tool()
+@timed
+async def enqueue_command(
+    ctx: Context,
+    command: str,
+    timeout: int | None = None,
+    session_id: str = "",
+    completion: str = "auto",
+) -> str:
+    """Queue a command in an iTerm2 session and return a job ID at once.
+
+    Jobs in one session run one after another (after any run_command
+    already running there); jobs in different sessions run in parallel,
+    up to the configured limit. Use poll_job to follow a job and fetch
+    its output, and cancel_job to stop it.
+
+    Args:
+        command: Shell command to execute.
+        timeout: Maximum seconds the command may run once started (time
+            spent queued does not count). On timeout it is interrupted with
+            Ctrl+C. Defaults to the configured timeout (30s unless overridden).
+        session_id: Target session ID. Empty string uses the current active session.
+        completion: How to detect completion — 'auto', 'prompt', 'idle',
+            or 'signal' (see run_command).
+
+    Returns:
+        The job ID and its place in the session's queue, plus security
+        warnings if applicable.
+    """
+    if completion not in COMPLETION_MODES:
+        valid = ", ".join(COMPLETION_MODES)
+        return f"Invalid completion mode: {completion!r}. Valid options: {valid}"
+
+    iterm_ctx = get_iterm_context(ctx)
+    config = iterm_ctx.config.current
+    if timeout is None:
+        timeout = config.timeouts.for_tool("enqueue_command")
+
+    warning = config.security.warning(command)
+
+    session = await iterm_ctx.resolve_session(session_id)
+
+    # The job outlives this call and maybe this connection
+    state = ctx.request_context.lifespan_context
+    job = iterm_ctx.jobs.submit(
+        session.session_id,
+        command,
+        timeout,
+        run=lambda job: _run_job(state, job, completion),
+        interrupt=lambda job: _interrupt_job(live_context(state), job),
+        owner=client_id(ctx),
+    )
+
+    parts = []
+    if warning:
+        parts.append(warning)
+    ahead = iterm_ctx.jobs.position(job)
+    place = f"{ahead} job{'s' if ahead != 1 else ''} ahead" if ahead else "starting"
+    parts.append(f"Queued {job.id} in session {job.session_id} ({place})")
+    parts.append(f"$ {command}")
+    return "\n".join(parts)
+
+
+async def _run_job(
+    state: ConnectionSupervisor | ITerm2Context,
+    job: Job,
+    completion: str,
+) -> None:
+    """Run a job's command and record the outcome on it.
+
+    A command that times out is interrupted so the next job in the
+    session starts at a prompt.
+    """
+    iterm_ctx = live_context(state)
+    session = await iterm_ctx.resolve_session(job.session_id)
+    # No wait limit: the job's timeout covers the command only
+    async with iterm_ctx.locks.command(job.session_id, None):
+        result = await execute_locked(
+            iterm_ctx, session, job.command, job.timeout, completion, None
+        )
+        if result.timed_out:
+            await _interrupt_job(iterm_ctx, job)
+    job.output = result.output
+    job.exit_status = result.exit_status
+    job.timed_out = result.timed_out
+
+
+async def _interrupt_job(iterm_ctx: ITerm2Context, job: Job) -> None:
+    """Send Ctrl+C to the job's session."""
+    session = await iterm_ctx.resolve_session(job.session_id)
+    async with iterm_ctx.locks.typing(job.session_id):
+        await metrics.async_send_text(session, CONTROL_MAP["C"])
+    iterm_ctx.screens.invalidate(job.session_id)
@@ -0,0 +1,48 @@
+"""Tool: get_metrics — Report tool latency and iTerm2 RPC counters."""
+
+from __future__ import annotations
+
+from fastmcp import Context
+
+from iterm2_agent.metrics import FORMATS, METRICS, timed
+from iterm2_agent.server import mcp
+
+
+@mcp.tool()
+@timed
+async def get_metrics(
+    ctx: Context,
+    output_format: str = "text",
+    reset: bool = False,
+) -> str:
+    """Report where time went: per-tool latency, phases and iTerm2 RPCs.
+
+    Latency is shown as p50/p95/p99 per tool, per whole MCP call (which
+    adds argument validation and result serialization), per phase
+    (run_command's prompt or idle wait and capture, the settle wait after
+    send_text/send_control) and per RPC, with RPC call and byte counts.
+    Collection is off unless enabled with ``[metrics] enabled = true`` in
+    the config.
+
+    Args:
+        output_format: 'text' (summary), 'json', or 'prometheus' (text exposition format).
+        reset: Clear everything recorded after reporting it.
+
+    Returns:
+        The metrics in the requested format.
+    """
+    if output_format not in FORMATS:
+        valid = ", ".join(FORMATS)
+        return f"Invalid format: {output_format!r}. Valid options: {valid}"
+
+    if output_format == "json":
+        report = METRICS.render_json()
+    elif output_format == "prometheus":
+        report = METRICS.render_prometheus()
+    else:
+        report = METRICS.render_text()
+        if not METRICS.enabled:
+            report += "\n\nCollection is off; set enabled = true under [metrics] in the config."
+    if reset:
+        METRICS.reset()
+    return report
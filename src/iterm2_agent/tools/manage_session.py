@@ -2,14 +2,30 @@
 
 from __future__ import annotations
 
+import asyncio
+from dataclasses import dataclass
+
 import iterm2
 from fastmcp import Context
 
+from iterm2_agent import metrics
+from iterm2_agent.concurrency import coalesced
 from iterm2_agent.connection import ITerm2Context
+from iterm2_agent.metrics import timed
 from iterm2_agent.server import mcp
+from iterm2_agent.supervisor import get_iterm_context
+
+# Maximum number of sessions queried at once by 'list'
+LIST_CONCURRENCY = 16
+# Screen rows read first when looking for a session's last line
+PREVIEW_WINDOW = 8
+# Actions that only read; identical concurrent calls share one run
+READ_ONLY_ACTIONS = ("list", "check")
 
 
 @mcp.tool()
+@timed
+@coalesced(when=lambda args: args["action"] in READ_ONLY_ACTIONS)
 async def manage_session(
     ctx: Context,
     action: str,
@@ -19,19 +35,22 @@ async def manage_session(
     """Manage iTerm2 terminal sessions.
 
     Args:
-        action: One of 'list', 'create', 'split', 'close', 'focus'.
-            - list: List all sessions across all windows and tabs.
+        action: One of 'list', 'create', 'split', 'close', 'focus', 'check'.
+            - list: List all sessions across all windows and tabs, with
+              window/tab IDs, size, title, job, cwd and last line.
             - create: Create a new terminal window.
             - split: Split the current/specified session.
             - close: Close the specified session.
             - focus: Bring the specified session into focus.
+            - check: Verify the session index against a full listing from
+              iTerm2 and repair it.
         session_id: Target session ID (required for close/focus, optional for split).
         direction: Split direction — 'horizontal' or 'vertical' (only for split).
 
     Returns:
         Result description or session listing.
     """
-    iterm_ctx: ITerm2Context = ctx.request_context.lifespan_context
+    iterm_ctx = get_iterm_context(ctx)
 
     if action == "list":
         return await _list_sessions(iterm_ctx)
@@ -43,43 +62,141 @@ async def manage_session(
         return await _close_session(iterm_ctx, session_id)
     if action == "focus":
         return await _focus_session(iterm_ctx, session_id)
+    if action == "check":
+        return await _check_index(iterm_ctx)
 
     return (
         f"Unknown action: {action!r}. "
-        "Valid actions: list, create, split, close, focus"
+        "Valid actions: list, create, split, close, focus, check"
     )
 
 
-async def _list_sessions(ctx: ITerm2Context) -> str:
-    """List all sessions with their IDs and last line of content."""
-    lines = []
-    for window in ctx.app.terminal_windows:
-        for tab in window.tabs:
-            for session in tab.sessions:
-                contents = await session.async_get_screen_contents()
-                # Find last non-empty line
-                last_line = ""
-                for i in range(contents.number_of_lines - 1, -1, -1):
-                    text = contents.line(i).string.strip()
-                    if text:
-                        last_line = text
-                        break
-
-                lines.append(
-                    f"  {session.session_id}  |  {last_line[:80]}"
-                )
-
-    if not lines:
+@dataclass(frozen=True)
+class SessionInfo:
+    """Structured description of one session for listings."""
+
+    session_id: str
+    window_id: str
+    tab_id: str
+    title: str
+    cwd: str
+    job: str
+    columns: int
+    rows: int
+    last_line: str
+
+
+async def _list_sessions(
+    ctx: ITerm2Context,
+    concurrency: int = LIST_CONCURRENCY,
+) -> str:
+    """List all sessions with their location, size, cwd, job and last line."""
+    infos = await _collect_sessions(ctx, concurrency)
+    if not infos:
         return "No sessions found."
 
+    lines = [
+        f"  {info.session_id}  |  window {info.window_id} tab {info.tab_id}"
+        f"  |  {info.columns}x{info.rows}  |  {info.title}"
+        f"  |  job: {info.job or '-'}  |  cwd: {info.cwd or '-'}"
+        f"  |  {info.last_line[:80]}"
+        for info in infos
+    ]
     header = f"Sessions ({len(lines)}):\n"
     return header + "\n".join(lines)
 
 
+async def _collect_sessions(
+    ctx: ITerm2Context,
+    concurrency: int = LIST_CONCURRENCY,
+) -> list[SessionInfo]:
+    """Describe every session, with at most ``concurrency`` sessions being
+    queried at once. Results keep window/tab/pane order."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def describe(window_id, tab_id, session) -> SessionInfo:
+        async with semaphore:
+            return await _describe_session(ctx, window_id, tab_id, session)
+
+    return list(await asyncio.gather(*(
+        describe(window_id, tab_id, session)
+        for window_id, tab_id, session in _session_locations(ctx)
+    )))
+
+
+def _session_locations(ctx: ITerm2Context):
+    """Yield (window_id, tab_id, session) from the session index, or from
+    the app hierarchy if the index is not running."""
+    if ctx.sessions.active:
+        for entry in ctx.sessions.entries():
+            yield entry.window_id, entry.tab_id, entry.session
+        return
+    for window in ctx.app.terminal_windows:
+        for tab in window.tabs:
+            for session in tab.sessions:
+                yield window.window_id, tab.tab_id, session
+
+
+async def _describe_session(
+    ctx: ITerm2Context,
+    window_id: str,
+    tab_id: str,
+    session: iterm2.Session,
+) -> SessionInfo:
+    """Fetch a session's variables and last line concurrently."""
+    cwd, job, last_line = await asyncio.gather(
+        session.async_get_variable("path"),
+        session.async_get_variable("jobName"),
+        _last_nonempty_line(ctx, session),
+    )
+    ctx.sessions.record_cwd(session.session_id, cwd or "")
+    size = session.grid_size
+    return SessionInfo(
+        session_id=session.session_id,
+        window_id=window_id,
+        tab_id=tab_id,
+        title=session.name or "",
+        cwd=cwd or "",
+        job=job or "",
+        columns=size.width if size else 0,
+        rows=size.height if size else 0,
+        last_line=last_line,
+    )
+
+
+async def _last_nonempty_line(ctx: ITerm2Context, session: iterm2.Session) -> str:
+    """Find the last non-empty line with a ranged read of the bottom of
+    the screen, then at most one read of the rest of it, instead of
+    fetching the full screen every time."""
+    buffer = ctx.scrollback.get(session.session_id)
+    if buffer is not None and len(buffer):
+        for text in reversed(buffer.read(buffer.screen_top, buffer.end_line)):
+            if text.strip():
+                return text.strip()
+
+    info = await session.async_get_line_info()
+    top = info.overflow + info.scrollback_buffer_height
+    end = top + info.mutable_area_height
+    # The bottom rows, then everything above them (a blank or cleared screen)
+    tail = max(top, end - PREVIEW_WINDOW)
+    for start, stop in ((tail, end), (top, tail)):
+        if stop <= start:
+            continue
+        lines = await metrics.async_get_contents(session, start, stop - start)
+        for line in reversed(lines):
+            text = line.string.strip()
+            if text:
+                return text
+    return ""
+
+
 async def _create_window(ctx: ITerm2Context) -> str:
     """Create a new iTerm2 window."""
-    window = await iterm2.Window.async_create(ctx.connection)
-    session = window.current_tab.current_session
+    window = await ctx.backend.async_create_window(ctx.connection)
+    tab = window.current_tab
+    session = tab.current_session
+    # Index it now rather than waiting for the layout notification
+    ctx.sessions.add(session, window.window_id, tab.tab_id)
     return f"Created new window. Session ID: {session.session_id}"
 
 
@@ -92,6 +209,9 @@ async def _split_session(
     session = await ctx.resolve_session(session_id)
     vertical = direction.lower() == "vertical"
     new_session = await session.async_split_pane(vertical=vertical)
+    entry = ctx.sessions.get(session.session_id)
+    if entry is not None:
+        ctx.sessions.add(new_session, entry.window_id, entry.tab_id)
     return (
         f"Split {'vertically' if vertical else 'horizontally'}. "
         f"New session ID: {new_session.session_id}"
@@ -104,6 +224,7 @@ async def _close_session(ctx: ITerm2Context, session_id: str) -> str:
         return "session_id is required for close action."
     session = await ctx.resolve_session(session_id)
     await session.async_close()
+    ctx.sessions.remove(session_id)
     return f"Closed session: {session_id}"
 
 
@@ -114,3 +235,16 @@ async def _focus_session(ctx: ITerm2Context, session_id: str) -> str:
     session = await ctx.resolve_session(session_id)
     await session.async_activate()
     return f"Focused session: {session_id}"
+
+
+async def _check_index(ctx: ITerm2Context) -> str:
+    """Compare the session index with iTerm2 and repair any drift."""
+    if not ctx.sessions.active:
+        return "Session index is not running; sessions are resolved from the app."
+    problems = await ctx.sessions.async_check()
+    if not problems:
+        return f"Session index consistent ({len(ctx.sessions)} sessions)."
+    return (
+        f"Session index repaired ({len(problems)} discrepancies):\n"
+        + "\n".join(f"  {problem}" for problem in problems)
+    )
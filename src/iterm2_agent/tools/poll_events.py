@@ -0,0 +1,71 @@
+"""Tool: poll_events — Collect events queued by background watchers."""
+
+from __future__ import annotations
+
+import time
+
+from fastmcp import Context
+
+from iterm2_agent.concurrency import client_id
+from iterm2_agent.metrics import timed
+from iterm2_agent.server import mcp
+from iterm2_agent.shaping import normalize_line
+from iterm2_agent.supervisor import get_iterm_context
+
+
+@mcp.tool()
+@timed
+async def poll_events(
+    ctx: Context,
+    watcher_id: str = "",
+    wait: float = 0,
+    limit: int = 100,
+) -> str:
+    """Return and clear events queued by watchers (see add_watcher).
+
+    Args:
+        watcher_id: Only this watcher's events. Empty string takes events
+            from all of this client's watchers.
+        wait: Seconds to wait for an event when none is queued (0 returns
+            immediately).
+        limit: Maximum number of events to return; the rest stay queued.
+
+    Returns:
+        The events, oldest first, each with its watcher, session, time and
+        matching line, followed by this client's active watchers.
+    """
+    iterm_ctx = get_iterm_context(ctx)
+    registry = iterm_ctx.watchers
+    if limit < 1:
+        return f"Invalid limit: {limit}. Must be at least 1"
+
+    # A shared server's other clients keep their own events
+    owner = None if watcher_id else client_id(ctx)
+    events = await registry.poll(watcher_id, wait=wait, limit=limit, owner=owner)
+    max_length = iterm_ctx.config.current.output.max_line_length
+
+    parts = []
+    if events:
+        parts.append(f"Events ({len(events)}):")
+        for event in events:
+            clock = time.strftime("%H:%M:%S", time.localtime(event.at))
+            line = normalize_line(event.line, max_length)
+            parts.append(f"  [{event.watcher_id}] {event.session_id} {clock}  {line}")
+    else:
+        parts.append("No events")
+    if registry.dropped:
+        parts.append(f"({registry.dropped} older events were dropped; the queue was full)")
+
+    watchers = registry.watchers(owner=client_id(ctx))
+    if watchers:
+        parts.append(f"\nActive watchers ({len(watchers)}):")
+        now = time.monotonic()
+        for watcher in watchers:
+            patterns = ", ".join(repr(pattern) for pattern in watcher.patterns)
+            parts.append(
+                f"  {watcher.id} {watcher.session_id}"
+                f" ({watcher.events} events, {max(0, watcher.expires - now):.0f}s left): {patterns}"
+            )
+    else:
+        parts.append("\nNo active watchers")
+    return "\n".join(parts)
@@ -0,0 +1,85 @@
+"""Tool: poll_job — Report the state and output of background jobs."""
+
+from __future__ import annotations
+
+from fastmcp import Context
+
+from iterm2_agent.concurrency import client_id
+from iterm2_agent.jobs import CANCELLED, QUEUED, Job, JobScheduler
+from iterm2_agent.metrics import timed
+from iterm2_agent.server import mcp
+from iterm2_agent.shaping import OutputConfig, shape_output
+from iterm2_agent.supervisor import get_iterm_context
+
+
+@mcp.tool()
+@timed
+async def poll_job(
+    ctx: Context,
+    job_id: str = "",
+    wait: float = 0,
+) -> str:
+    """Report a background job's state, and its output once finished.
+
+    Args:
+        job_id: Job ID returned by enqueue_command. Empty string lists
+            all of this client's jobs the server remembers.
+        wait: Seconds to wait for the job to finish before reporting
+            (0 reports immediately).
+
+    Returns:
+        The job's state (queued, running, done, timed_out, failed or
+        cancelled), its queue position or run time, and once finished its
+        output (shaped to the configured output budget) and exit status.
+    """
+    iterm_ctx = get_iterm_context(ctx)
+    jobs = iterm_ctx.jobs
+
+    if not job_id:
+        listed = jobs.jobs(owner=client_id(ctx))
+        if not listed:
+            return "No jobs"
+        lines = [f"Jobs ({len(listed)}):"]
+        lines.extend(f"  {summarize_job(job, jobs)}" for job in listed)
+        return "\n".join(lines)
+
+    job = jobs.get(job_id)
+    if job is None:
+        return f"Job not found: {job_id}"
+    if wait > 0:
+        await job.wait(wait)
+    return describe_job(job, jobs, iterm_ctx.config.current.output)
+
+
+def summarize_job(job: Job, jobs: JobScheduler, status: bool = True) -> str:
+    """One line: ID, state, session, timing (with the exit status unless
+    ``status`` is False) and command."""
+    if job.state == QUEUED:
+        ahead = jobs.position(job)
+        timing = f"{ahead} ahead" if ahead else "next"
+    else:
+        timing = f"{job.elapsed:.1f}s"
+    if status and job.exit_status is not None:
+        timing += f", exit status {job.exit_status}"
+    return f"{job.id} [{job.state}] {job.session_id} ({timing}) $ {job.command}"
+
+
+def describe_job(job: Job, jobs: JobScheduler, output: OutputConfig) -> str:
+    """The summary line, then the output and outcome of a finished job.
+
+    The exit status is reported once, after the output, as run_command does.
+    """
+    parts = [summarize_job(job, jobs, status=False)]
+    if not job.finished:
+        return parts[0]
+    if job.output:
+        parts.append(shape_output(job.output.split("\n"), output))
+    if job.error:
+        parts.append(f"\nError: {job.error}")
+    if job.exit_status is not None:
+        parts.append(f"\nExit status: {job.exit_status}")
+    if job.timed_out:
+        parts.append(f"\n⏱️ Command timed out after {job.timeout}s and was interrupted")
+    elif job.state == CANCELLED and job.started is not None:
+        parts.append("\nCancelled while running (sent Ctrl+C)")
+    return "\n".join(parts)
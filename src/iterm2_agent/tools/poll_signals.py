@@ -0,0 +1,69 @@
+"""Tool: poll_signals — Collect signals sent by programs in sessions."""
+
+from __future__ import annotations
+
+import time
+
+from fastmcp import Context
+
+from iterm2_agent.concurrency import shared_call
+from iterm2_agent.metrics import timed
+from iterm2_agent.server import mcp
+from iterm2_agent.shaping import normalize_line
+from iterm2_agent.signals import signal_command
+from iterm2_agent.supervisor import get_iterm_context
+
+
+@mcp.tool()
+@timed
+async def poll_signals(
+    ctx: Context,
+    session_id: str = "",
+    wait: float = 0,
+    limit: int = 100,
+) -> str:
+    """Return and clear signals that programs sent to the agent.
+
+    A program signals by printing an iTerm2 custom control sequence with
+    the configured identity, e.g. from a shell script:
+    printf '\\033]1337;Custom=id=%s:%s\\a' iterm2-agent "done exit=$? id=build"
+    Signals are invisible on screen and need no shell integration.
+
+    Args:
+        session_id: Only signals from this session. Empty string takes
+            signals from all sessions (over stdio only: on a shared HTTP
+            server other clients' programs signal too).
+        wait: Seconds to wait for a signal when none is queued (0 returns
+            immediately).
+        limit: Maximum number of signals to return; the rest stay queued.
+
+    Returns:
+        The signals, oldest first per session, each with its session, time
+        and payload.
+    """
+    iterm_ctx = get_iterm_context(ctx)
+    hub = iterm_ctx.signals
+    if limit < 1:
+        return f"Invalid limit: {limit}. Must be at least 1"
+    if not session_id and shared_call(ctx):
+        return (
+            "session_id is required on a shared server: signals from other "
+            "sessions may belong to other clients"
+        )
+
+    if wait > 0:
+        await hub.wait_any(session_id, wait)
+    signals = hub.take(session_id, limit=limit)
+    max_length = iterm_ctx.config.current.output.max_line_length
+
+    if not signals:
+        example = signal_command(hub.limits.identity, "done exit=$? id=build")
+        return f"No signals. Programs can send one with:\n  {example}"
+    parts = [f"Signals ({len(signals)}):"]
+    for signal in signals:
+        clock = time.strftime("%H:%M:%S", time.localtime(signal.at))
+        payload = normalize_line(signal.payload, max_length)
+        parts.append(f"  {signal.session_id} {clock}  {payload}")
+    if hub.dropped:
+        parts.append(f"({hub.dropped} older signals were dropped; the queue was full)")
+    return "\n".join(parts)
@@ -2,39 +2,109 @@
 
 from __future__ import annotations
 
+from dataclasses import replace
+from typing import Sequence
+
 from fastmcp import Context
 
-from iterm2_agent.connection import ITerm2Context, get_screen_lines
+from iterm2_agent.concurrency import coalesced
+from iterm2_agent.connection import get_screen
+from iterm2_agent.metrics import timed
 from iterm2_agent.server import mcp
+from iterm2_agent.shaping import shape_output
+from iterm2_agent.snapshots import ScreenSnapshot, changed_ranges
+from iterm2_agent.supervisor import get_iterm_context
 
 
 @mcp.tool()
+@timed
+@coalesced()
 async def read_screen(
     ctx: Context,
     lines: int = -1,
     session_id: str = "",
+    since: str = "",
 ) -> str:
     """Read the screen contents of an iTerm2 session.
 
+    Every response includes a token. Pass it back as ``since`` on the next
+    call to get only the lines that changed (or "unchanged") instead of the
+    whole screen. Unknown or expired tokens return the full screen.
+
     Args:
         lines: Number of lines to read. -1 means all visible lines.
         session_id: Target session ID. Empty string uses the current active session.
+        since: Token from a previous read_screen of the same session.
 
     Returns:
-        Screen text with cursor position and line count metadata.
+        Screen text (or changed line ranges) with cursor position, line
+        count and token metadata.
     """
-    iterm_ctx: ITerm2Context = ctx.request_context.lifespan_context
+    iterm_ctx = get_iterm_context(ctx)
     session = await iterm_ctx.resolve_session(session_id)
-    screen_lines, cursor_x, cursor_y = await get_screen_lines(session, lines)
+    screen = await get_screen(session, lines, cache=iterm_ctx.screens)
+    cursor_x, cursor_y = screen.cursor_x, screen.cursor_y
 
     # Strip trailing empty lines for cleaner output
-    while screen_lines and not screen_lines[-1].strip():
-        screen_lines.pop()
+    screen = screen.rstrip()
 
-    text = "\n".join(screen_lines)
-    return (
+    snapshot = ScreenSnapshot(session.session_id, screen)
+    snapshots = iterm_ctx.snapshots
+    previous = snapshots.get(since, session.session_id) if since else None
+
+    header = (
         f"Session: {session.session_id}\n"
         f"Cursor: line {cursor_y}, column {cursor_x}\n"
-        f"Lines: {len(screen_lines)}\n"
-        f"---\n{text}"
+        f"Lines: {len(screen)}\n"
     )
+
+    if previous is not None and previous.lines == snapshot.lines:
+        # Reuse the token; the client already holds this text
+        return f"{header}Token: {since}\n---\n(unchanged)"
+
+    token = snapshots.put(snapshot)
+    header += f"Token: {token}\n"
+
+    if previous is not None:
+        ranges = changed_ranges(previous.lines, snapshot.lines)
+        changed = sum(end - start for start, end in ranges)
+        # Diffs only pay off while most of the screen is unchanged
+        if changed * 2 <= len(screen):
+            return header + _format_diff(screen, ranges, len(previous.lines))
+    elif since:
+        header += "Note: unknown or expired token, returning full screen\n"
+
+    # Collapsing repeats would shift rows away from the cursor and diff
+    # line numbers, so only the budget and normalization apply here
+    output = replace(iterm_ctx.config.current.output, collapse_repeats=0)
+    text = shape_output(screen, output)
+    return f"{header}---\n{text}"
+
+
+def _format_diff(
+    screen_lines: Sequence[str],
+    ranges: list[tuple[int, int]],
+    previous_count: int,
+) -> str:
+    """Render changed ranges as ``@@ first-last @@`` hunks.
+
+    Line numbers are 0-based, like the cursor line. Lines that were present
+    before but are now past the end of the screen are listed as cleared.
+    """
+    count = len(screen_lines)
+    cleared = f"{_span(count, previous_count)} cleared" if count < previous_count else ""
+
+    spans = [_span(start, end) for start, end in ranges]
+    if cleared:
+        spans.append(cleared)
+    parts = [f"Changed: {', '.join(spans)}", "---"]
+    for start, end in ranges:
+        parts.append(f"@@ {_span(start, end)} @@")
+        parts.extend(screen_lines[start:end])
+    if cleared:
+        parts.append(f"@@ {cleared} @@")
+    return "\n".join(parts)
+
+
+def _span(start: int, end: int) -> str:
+    return str(start) if end - start == 1 else f"{start}-{end - 1}"
@@ -0,0 +1,32 @@
+"""Tool: remove_watcher — Stop a background watcher."""
+
+from __future__ import annotations
+
+from fastmcp import Context
+
+from iterm2_agent.metrics import timed
+from iterm2_agent.server import mcp
+from iterm2_agent.supervisor import get_iterm_context
+
+
+@mcp.tool()
+@timed
+async def remove_watcher(
+    ctx: Context,
+    watcher_id: str,
+) -> str:
+    """Remove a watcher registered with add_watcher.
+
+    Events it already queued stay available to poll_events.
+
+    Args:
+        watcher_id: Watcher ID returned by add_watcher.
+
+    Returns:
+        Confirmation with the number of events the watcher produced.
+    """
+    iterm_ctx = get_iterm_context(ctx)
+    watcher = iterm_ctx.watchers.remove(watcher_id)
+    if watcher is None:
+        return f"Watcher not found: {watcher_id}"
+    return f"Removed watcher {watcher.id} ({watcher.events} events)"
@@ -3,103 +3,464 @@
 from __future__ import annotations
 
 import asyncio
+import itertools
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable
 
+import iterm2
 from fastmcp import Context
+from iterm2.capabilities import AppVersionTooOld
 
-from iterm2_agent.connection import ITerm2Context, get_screen_lines
-from iterm2_agent.security import SecurityGuard, SecurityLevel
+from iterm2_agent import metrics
+from iterm2_agent.concurrency import SessionBusyError
+from iterm2_agent.connection import ITerm2Context
+from iterm2_agent.metrics import METRICS, timed
+from iterm2_agent.scrollback import ScrollbackStore
 from iterm2_agent.server import mcp
+from iterm2_agent.shaping import normalize_line, shape_output
+from iterm2_agent.signals import Signal, signal_command
+from iterm2_agent.supervisor import get_iterm_context
+
+COMPLETION_MODES = ("auto", "prompt", "idle", "signal")
+
+# Tokens telling apart the done signals of signal-mode commands
+_signal_tokens = itertools.count(1)
+# Columns of the default "> " continuation prompt
+_PS2_WIDTH = 2
+
+# Streaming mode: at most this many progress updates per second
+STREAM_MAX_RATE = 4.0
+# Lines of output repeated in the final result of a streamed command
+STREAM_TAIL_LINES = 20
+
+# Receives newly completed output lines and the running line count
+OutputCallback = Callable[[list[str], int], Awaitable[None]]
 
 
 @mcp.tool()
+@timed
 async def run_command(
     ctx: Context,
     command: str,
-    timeout: int = 30,
+    timeout: int | None = None,
     session_id: str = "",
+    completion: str = "auto",
+    stream: bool = False,
 ) -> str:
     """Execute a command in an iTerm2 session and return the output.
 
-    Sends the command, waits for output to stabilize (no new output for 2s),
-    then returns the new lines produced.
+    Sends the command and waits for it to finish. With shell integration
+    installed, completion is detected from the next shell prompt (and the
+    exit status is reported); otherwise it waits for output to stabilize
+    (no new output for 2s by default). In 'signal' mode the command is
+    followed by a printf that sends a done signal with the exit status
+    through a custom control sequence, which needs a POSIX shell but no
+    shell integration.
 
     Args:
         command: Shell command to execute.
-        timeout: Maximum seconds to wait for command completion.
+        timeout: Maximum seconds to wait for command completion, including
+            any wait for a command already running in the session. Defaults
+            to the configured timeout (30s unless overridden).
         session_id: Target session ID. Empty string uses the current active session.
+        completion: How to detect completion — 'auto' (prompt markers if
+            shell integration is installed, else idle), 'prompt', 'idle',
+            or 'signal'.
+        stream: Push output lines as they appear through progress and log
+            notifications (at most 4 updates per second). The result then
+            holds only a line count and the last 20 lines.
 
     Returns:
-        Command output text, plus security warnings if applicable.
+        Command output text (shaped to the configured output budget), plus
+        security warnings if applicable.
     """
+    if completion not in COMPLETION_MODES:
+        valid = ", ".join(COMPLETION_MODES)
+        return f"Invalid completion mode: {completion!r}. Valid options: {valid}"
+
+    iterm_ctx = get_iterm_context(ctx)
+    config = iterm_ctx.config.current
+    if timeout is None:
+        timeout = config.timeouts.for_tool("run_command")
+
     # Security check
-    level = SecurityGuard.check(command)
-    warning = SecurityGuard.format_warning(command, level)
+    warning = config.security.warning(command)
 
-    iterm_ctx: ITerm2Context = ctx.request_context.lifespan_context
     session = await iterm_ctx.resolve_session(session_id)
 
-    # Capture baseline screen state
-    pre_contents = await session.async_get_screen_contents()
-    baseline = (
+    on_output: OutputCallback | None = None
+    if stream:
+        async def on_output(lines: list[str], total: int) -> None:
+            max_length = config.output.max_line_length
+            lines = [normalize_line(line, max_length) for line in lines]
+            await ctx.report_progress(progress=total, message=lines[-1])
+            await ctx.info("\n".join(lines), logger_name="run_command")
+
+    try:
+        result = await execute_command(
+            iterm_ctx, session, command, timeout, completion, on_output
+        )
+    except SessionBusyError as exc:
+        return str(exc)
+
+    parts = []
+    if warning:
+        parts.append(warning)
+    parts.append(f"$ {command}")
+    if stream:
+        lines = result.output.split("\n") if result.output else []
+        tail = lines[-STREAM_TAIL_LINES:]
+        parts.append(f"[streamed {len(lines)} lines; last {len(tail)} shown]")
+        parts.append(shape_output(tail, config.output))
+    else:
+        parts.append(shape_output(result.output.split("\n"), config.output))
+    if result.exit_status is not None:
+        parts.append(f"\nExit status: {result.exit_status}")
+    if result.timed_out:
+        parts.append(f"\n⏱️ Command timed out after {timeout}s (output may be incomplete)")
+
+    return "\n".join(parts)
+
+
+@dataclass(frozen=True)
+class CommandResult:
+    """Outcome of running one command in one session."""
+
+    output: str
+    exit_status: int | None
+    timed_out: bool
+
+
+async def execute_command(
+    iterm_ctx: ITerm2Context,
+    session: iterm2.Session,
+    command: str,
+    timeout: float,
+    completion: str = "auto",
+    on_output: OutputCallback | None = None,
+) -> CommandResult:
+    """Send a command to a session, wait for completion and capture its output.
+
+    With ``on_output``, completed output lines are also reported while the
+    command runs (see :func:`_stream_output`). Commands in one session run
+    one at a time; waiting for the previous one counts against ``timeout``.
+
+    Raises:
+        SessionBusyError: If the session was still busy when ``timeout`` ran out.
+    """
+    async with iterm_ctx.locks.command(session.session_id, timeout) as remaining:
+        return await execute_locked(
+            iterm_ctx, session, command, remaining, completion, on_output
+        )
+
+
+async def execute_locked(
+    iterm_ctx: ITerm2Context,
+    session: iterm2.Session,
+    command: str,
+    timeout: float,
+    completion: str,
+    on_output: OutputCallback | None,
+) -> CommandResult:
+    """Like :func:`execute_command`, for a caller already holding the
+    session's command lock (``iterm_ctx.locks.command``)."""
+    with METRICS.time("phase_seconds", phase="integration_check"):
+        use_prompt = completion == "prompt" or (
+            completion == "auto"
+            and await _shell_integration_available(iterm_ctx, session)
+        )
+
+    token = ""
+    typed = command
+    if completion == "signal":
+        token = f"cmd-{next(_signal_tokens)}"
+        identity = iterm_ctx.config.current.signals.identity
+        typed = _with_done_signal(command, identity, token)
+
+    # Follow the session so output that scrolls off screen is kept
+    scrollback = iterm_ctx.scrollback
+    scrollback.attach(session)
+
+    # Capture baseline screen state; output starts on the line after the
+    # one the command is typed on
+    pre_contents = await metrics.async_get_screen_contents(session)
+    await scrollback.async_ingest_contents(session, pre_contents)
+    output_start = (
         pre_contents.number_of_lines_above_screen
-        + pre_contents.number_of_lines
+        + pre_contents.cursor_coord.y
+        + 1
     )
+    # The prompt the command is typed after, to recognise its successor
+    cursor = pre_contents.cursor_coord
+    shell_prompt = pre_contents.line(cursor.y).string[:cursor.x].rstrip()
+    # A command line wider than the screen wraps onto more rows
+    width = session.grid_size.width
+    first, _, last = typed.partition("\n")
+    output_start += _wrapped_rows(pre_contents.cursor_coord.x + len(first), width)
+    if token:
+        # The signal group's closing line follows, after the "> " PS2 prompt
+        output_start += 1 + _wrapped_rows(_PS2_WIDTH + len(last), width)
 
-    # Send command with CR (not LF)
-    await session.async_send_text(command + "\r")
+    streaming: asyncio.Task[None] | None = None
+    if on_output is not None:
+        streaming = asyncio.create_task(
+            _stream_output(scrollback, session, output_start, on_output)
+        )
 
-    # Wait for output to stabilize using ScreenStreamer
-    timed_out = False
-    idle_count = 0
-    max_idle = 2  # consecutive idle cycles before declaring "done"
+    exit_status: int | None = None
+    prompt: Any = None
+    try:
+        if token:
+            with METRICS.time("phase_seconds", phase="signal_wait"):
+                timed_out, exit_status = await _run_until_signal(
+                    iterm_ctx, session, typed, token, timeout
+                )
+        elif use_prompt:
+            with METRICS.time("phase_seconds", phase="prompt_wait"):
+                timed_out, exit_status, prompt = await _run_until_prompt(
+                    iterm_ctx, session, command, timeout
+                )
+        else:
+            # Send command with CR (not LF)
+            async with iterm_ctx.locks.typing(session.session_id):
+                await metrics.async_send_text(session, command + "\r")
+            idle_cycles = iterm_ctx.config.current.timeouts.idle_threshold
+            with METRICS.time("phase_seconds", phase="idle_wait"):
+                timed_out = await _wait_for_idle(iterm_ctx, session, timeout, idle_cycles)
+    finally:
+        if streaming is not None:
+            streaming.cancel()
+            await asyncio.gather(streaming, return_exceptions=True)
+        iterm_ctx.screens.invalidate(session.session_id)
+
+    # Read final screen state, back-filling anything that scrolled away
+    with METRICS.time("phase_seconds", phase="capture"):
+        post_contents = await metrics.async_get_screen_contents(session)
+        await scrollback.async_ingest_contents(session, post_contents)
+        output_end = (
+            post_contents.number_of_lines_above_screen
+            + post_contents.cursor_coord.y
+            + 1
+        )
+        # With shell integration the output ends where the new prompt starts
+        prompt_line = _prompt_line(prompt)
+        if prompt_line is not None and output_start <= prompt_line < output_end:
+            output_end = prompt_line
+        output_lines = await scrollback.async_read_lines(
+            session, output_start, output_end
+        )
+
+    # Without a prompt position, drop a last row that is only a fresh prompt
+    if (
+        prompt_line is None
+        and not timed_out
+        and shell_prompt
+        and output_lines
+        and output_lines[-1].rstrip() == shell_prompt
+    ):
+        output_lines.pop()
+
+    # Strip trailing empty lines
+    while output_lines and not output_lines[-1].strip():
+        output_lines.pop()
+
+    return CommandResult(
+        output="\n".join(output_lines),
+        exit_status=exit_status,
+        timed_out=timed_out,
+    )
+
+
+async def _stream_output(
+    scrollback: ScrollbackStore,
+    session: iterm2.Session,
+    start: int,
+    on_output: OutputCallback,
+    max_rate: float = STREAM_MAX_RATE,
+) -> None:
+    """Report output lines from absolute line ``start`` as they complete.
+
+    Runs until cancelled. Screen updates arriving within ``1 / max_rate``
+    seconds of the last report are coalesced into the next one. The
+    cursor line may still be growing, so only lines above it are reported.
+    """
+    loop = asyncio.get_running_loop()
+    interval = 1.0 / max_rate
+    next_report = loop.time()
+    reported = start
+
+    # Change notifications only: the screen is read once per report,
+    # after the rate limit, not for every update
+    async with session.get_screen_streamer(want_contents=False) as streamer:
+        while True:
+            await streamer.async_get()
+            delay = next_report - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            contents = await metrics.async_get_screen_contents(session)
+            await scrollback.async_ingest_contents(session, contents)
+            end = contents.number_of_lines_above_screen + contents.cursor_coord.y
+            if end <= reported:
+                continue
+            lines = await scrollback.async_read_lines(session, reported, end)
+            await on_output(lines, end - start)
+            reported = end
+            next_report = loop.time() + interval
+
+
+async def _shell_integration_available(
+    iterm_ctx: ITerm2Context,
+    session: iterm2.Session,
+) -> bool:
+    """Return True if the session reports shell-integration prompt marks."""
+    try:
+        prompt = await iterm_ctx.backend.async_get_last_prompt(
+            iterm_ctx.connection, session.session_id
+        )
+    except iterm2.RPCException:
+        return False
+    return prompt is not None
+
+
+async def _run_until_prompt(
+    iterm_ctx: ITerm2Context,
+    session: iterm2.Session,
+    command: str,
+    timeout: float,
+) -> tuple[bool, int | None, Any]:
+    """Send a command and wait for the next shell prompt.
+
+    The prompt monitor is subscribed before the command is sent so the
+    prompt that follows a fast command cannot be missed.
+
+    Returns:
+        (timed_out, exit_status, prompt) — exit_status is None when iTerm2
+        is too old to report COMMAND_END or the command did not finish in
+        time; prompt is the new ``iterm2.Prompt`` (None on timeout, or if
+        iTerm2 is too old to send it).
+    """
+    backend, connection = iterm_ctx.backend, iterm_ctx.connection
+    modes = [iterm2.PromptMonitor.Mode.COMMAND_END, iterm2.PromptMonitor.Mode.PROMPT]
+    try:
+        monitor = backend.prompt_monitor(connection, session.session_id, modes)
+    except AppVersionTooOld:
+        # Only PROMPT notifications are available; no exit status
+        monitor = backend.prompt_monitor(connection, session.session_id)
+
+    exit_status: int | None = None
     deadline = asyncio.get_event_loop().time() + timeout
 
-    async with session.get_screen_streamer() as streamer:
+    async with monitor:
+        async with iterm_ctx.locks.typing(session.session_id):
+            await metrics.async_send_text(session, command + "\r")
+
         while True:
             remaining = deadline - asyncio.get_event_loop().time()
             if remaining <= 0:
-                timed_out = True
-                break
+                return True, exit_status, None
 
             try:
-                wait_time = min(1.0, remaining)
-                await asyncio.wait_for(streamer.async_get(), timeout=wait_time)
-                idle_count = 0  # New output received, reset idle counter
+                mode, value = await iterm_ctx.wait_for(
+                    monitor.async_get(), timeout=remaining
+                )
             except asyncio.TimeoutError:
-                idle_count += 1
-                if idle_count >= max_idle:
-                    break  # Output has stabilized
-
-    # Read final screen state
-    post_contents = await session.async_get_screen_contents()
-    post_total = (
-        post_contents.number_of_lines_above_screen
-        + post_contents.number_of_lines
-    )
+                return True, exit_status, None
 
-    # Extract new lines (those added after the command)
-    new_line_count = post_total - baseline
-    screen_lines, _, _ = await get_screen_lines(session)
+            if mode == iterm2.PromptMonitor.Mode.COMMAND_END:
+                exit_status = value
+            elif mode == iterm2.PromptMonitor.Mode.PROMPT:
+                return False, exit_status, value
 
-    if new_line_count > 0 and new_line_count <= len(screen_lines):
-        # Get only the newly added lines from the visible screen
-        output_lines = screen_lines[-new_line_count:]
-    else:
-        # Fallback: return all visible lines
-        output_lines = screen_lines
 
-    # Strip trailing empty lines
-    while output_lines and not output_lines[-1].strip():
-        output_lines.pop()
+def _prompt_line(prompt: Any) -> int | None:
+    """Absolute line a prompt starts on, if it starts a line of its own.
 
-    output = "\n".join(output_lines)
+    A prompt printed after output with no final newline shares that line,
+    which then still belongs to the output.
+    """
+    prompt_range = getattr(prompt, "prompt_range", None)
+    if prompt_range is None or prompt_range.start.x:
+        return None
+    return prompt_range.start.y
 
-    parts = []
-    if warning:
-        parts.append(warning)
-    parts.append(f"$ {command}")
-    parts.append(output)
-    if timed_out:
-        parts.append(f"\n⏱️ Command timed out after {timeout}s (output may be incomplete)")
 
-    return "\n".join(parts)
+def _wrapped_rows(columns: int, width: int) -> int:
+    """Rows beyond the first taken by ``columns`` cells of text.
+
+    Text that exactly fills a row leaves the cursor on it (deferred wrap),
+    so only the cells past a full row start a new one.
+    """
+    return max(columns - 1, 0) // max(width, 1)
+
+
+def _with_done_signal(command: str, identity: str, token: str) -> str:
+    """``command`` followed by the done-signal printf carrying its status.
+
+    The command goes in a ``{ ...; }`` group ending on a new line, so a
+    trailing ``;`` or ``&`` or a trailing comment still parses. The shell
+    reads the whole group before running it, so the printf is never fed
+    to the command's stdin.
+    """
+    return f"{{ {command}\n}}; " + signal_command(identity, f"done exit=$? id={token}")
+
+
+async def _run_until_signal(
+    iterm_ctx: ITerm2Context,
+    session: iterm2.Session,
+    typed: str,
+    token: str,
+    timeout: float,
+) -> tuple[bool, int | None]:
+    """Send a command line ending in a done-signal printf and wait for the
+    signal carrying ``token``.
+
+    Returns:
+        (timed_out, exit_status) — exit_status is None on timeout.
+    """
+
+    def is_done(signal: Signal) -> bool:
+        return signal.name == "done" and signal.fields.get("id") == token
+
+    with iterm_ctx.signals.expect(session.session_id, is_done) as done:
+        async with iterm_ctx.locks.typing(session.session_id):
+            await metrics.async_send_text(session, typed + "\r")
+        try:
+            signal = await iterm_ctx.wait_for(done, timeout=timeout)
+        except asyncio.TimeoutError:
+            return True, None
+    status = signal.fields.get("exit", "")
+    return False, int(status) if status.isdigit() else None
+
+
+async def _wait_for_idle(
+    iterm_ctx: ITerm2Context,
+    session: iterm2.Session,
+    timeout: float,
+    idle_cycles: int = 2,
+) -> bool:
+    """Wait for output to stabilize using ScreenStreamer.
+
+    Output counts as stable after ``idle_cycles`` consecutive one-second
+    waits without a screen update.
+
+    Returns:
+        True if the timeout was reached before output went idle.
+    """
+    idle_count = 0
+    deadline = asyncio.get_event_loop().time() + timeout
+
+    async with session.get_screen_streamer() as streamer:
+        while True:
+            remaining = deadline - asyncio.get_event_loop().time()
+            if remaining <= 0:
+                return True
+
+            try:
+                wait_time = min(1.0, remaining)
+                await iterm_ctx.wait_for(streamer.async_get(), timeout=wait_time)
+                idle_count = 0  # New output received, reset idle counter
+            except asyncio.TimeoutError:
+                idle_count += 1
+                if idle_count >= idle_cycles:
+                    return False  # Output has stabilized
@@ -0,0 +1,106 @@
+"""Tool: run_command_multi — Run one command in many sessions at once."""
+
+from __future__ import annotations
+
+import asyncio
+
+import iterm2
+from fastmcp import Context
+
+from iterm2_agent.connection import ITerm2Context
+from iterm2_agent.metrics import timed
+from iterm2_agent.server import mcp
+from iterm2_agent.shaping import shape_output
+from iterm2_agent.supervisor import get_iterm_context
+from iterm2_agent.tools.run_command import (
+    COMPLETION_MODES,
+    CommandResult,
+    execute_command,
+)
+
+
+@mcp.tool()
+@timed
+async def run_command_multi(
+    ctx: Context,
+    command: str,
+    session_ids: list[str] | None = None,
+    tab_id: str = "",
+    timeout: int | None = None,
+    completion: str = "auto",
+) -> str:
+    """Execute the same command in several iTerm2 sessions concurrently.
+
+    The command is dispatched to every target at once and each session is
+    awaited independently, so total latency is that of the slowest session.
+    A failure or timeout in one session does not affect the others.
+
+    Args:
+        command: Shell command to execute.
+        session_ids: Target session IDs.
+        tab_id: Run in every pane of this tab (combined with session_ids).
+        timeout: Maximum seconds to wait for completion, per session.
+            Defaults to the configured timeout.
+        completion: How to detect completion — 'auto', 'prompt', 'idle',
+            or 'signal' (see run_command).
+
+    Returns:
+        Per-session output, exit status and timeout notices, plus security
+        warnings if applicable.
+    """
+    if completion not in COMPLETION_MODES:
+        valid = ", ".join(COMPLETION_MODES)
+        return f"Invalid completion mode: {completion!r}. Valid options: {valid}"
+
+    iterm_ctx = get_iterm_context(ctx)
+    targets = list(dict.fromkeys(session_ids or []))
+    if tab_id:
+        tab = iterm_ctx.app.get_tab_by_id(tab_id)
+        if tab is None:
+            return f"Tab not found: {tab_id}"
+        targets.extend(
+            s.session_id for s in tab.sessions if s.session_id not in targets
+        )
+    if not targets:
+        return "No target sessions. Provide session_ids and/or tab_id."
+
+    config = iterm_ctx.config.current
+    if timeout is None:
+        timeout = config.timeouts.for_tool("run_command_multi")
+    warning = config.security.warning(command)
+
+    results = await asyncio.gather(*(
+        _run_in_session(iterm_ctx, sid, command, timeout, completion)
+        for sid in targets
+    ), return_exceptions=True)
+
+    parts = []
+    if warning:
+        parts.append(warning)
+    parts.append(f"$ {command}  [{len(targets)} sessions]")
+    for sid, result in zip(targets, results):
+        parts.append("")
+        if isinstance(result, BaseException):
+            parts.append(f"=== {sid} — error: {result} ===")
+            continue
+        status = []
+        if result.exit_status is not None:
+            status.append(f"exit status {result.exit_status}")
+        if result.timed_out:
+            status.append(f"⏱️ timed out after {timeout}s")
+        suffix = f" ({', '.join(status)})" if status else ""
+        parts.append(f"=== {sid}{suffix} ===")
+        parts.append(shape_output(result.output.split("\n"), config.output))
+
+    return "\n".join(parts)
+
+
+async def _run_in_session(
+    iterm_ctx: ITerm2Context,
+    session_id: str,
+    command: str,
+    timeout: float,
+    completion: str,
+) -> CommandResult:
+    session: iterm2.Session = await iterm_ctx.resolve_session(session_id)
+    return await execute_command(iterm_ctx, session, command, timeout, completion)
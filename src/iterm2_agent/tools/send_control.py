@@ -2,12 +2,13 @@
 
 from __future__ import annotations
 
-import asyncio
-
 from fastmcp import Context
 
-from iterm2_agent.connection import ITerm2Context, get_screen_lines
+from iterm2_agent import metrics
+from iterm2_agent.connection import get_screen_lines, screen_tail, wait_for_settle
+from iterm2_agent.metrics import timed
 from iterm2_agent.server import mcp
+from iterm2_agent.supervisor import get_iterm_context
 
 CONTROL_MAP: dict[str, str] = {
     "C": "\x03",       # Ctrl+C — interrupt
@@ -25,10 +26,12 @@ CONTROL_MAP: dict[str, str] = {
 
 
 @mcp.tool()
+@timed
 async def send_control(
     ctx: Context,
     character: str,
     session_id: str = "",
+    preview: bool = True,
 ) -> str:
     """Send a control character to an iTerm2 session.
 
@@ -39,6 +42,8 @@ async def send_control(
             'E' (end of line), 'U' (kill line), 'K' (kill to end),
             'W' (kill word), 'R' (reverse search).
         session_id: Target session ID. Empty string uses the current active session.
+        preview: Whether to wait for the screen to react and include its
+            last lines. False returns immediately after sending.
 
     Returns:
         Confirmation with current screen state.
@@ -49,16 +54,27 @@ async def send_control(
         valid = ", ".join(sorted(CONTROL_MAP.keys()))
         return f"Invalid control character: {character!r}. Valid options: {valid}"
 
-    iterm_ctx: ITerm2Context = ctx.request_context.lifespan_context
+    iterm_ctx = get_iterm_context(ctx)
     session = await iterm_ctx.resolve_session(session_id)
 
-    await session.async_send_text(ctrl_char)
-    await asyncio.sleep(0.5)
+    label = f"Ctrl+{key}" if key != "ESCAPE" else "Escape"
+
+    # Only the keystroke waits for other writers: Ctrl+C must be able to
+    # interrupt a running run_command
+    typing = iterm_ctx.locks.typing(session.session_id)
+    if not preview:
+        async with typing:
+            await metrics.async_send_text(session, ctrl_char)
+        iterm_ctx.screens.invalidate(session.session_id)
+        return f"Sent: {label}"
 
-    screen_lines, _, _ = await get_screen_lines(session, max_lines=10)
-    while screen_lines and not screen_lines[-1].strip():
-        screen_lines.pop()
+    async with wait_for_settle(session):
+        async with typing:
+            await metrics.async_send_text(session, ctrl_char)
+    iterm_ctx.screens.invalidate(session.session_id)
 
-    preview = "\n".join(screen_lines[-5:]) if screen_lines else "(empty)"
-    label = f"Ctrl+{key}" if key != "ESCAPE" else "Escape"
-    return f"Sent: {label}\n\nScreen (last lines):\n{preview}"
+    screen_lines, _, _ = await get_screen_lines(
+        session, max_lines=10, cache=iterm_ctx.screens
+    )
+    last_lines = screen_tail(screen_lines)
+    return f"Sent: {label}\n\nScreen (last lines):\n{last_lines}"
@@ -2,20 +2,24 @@
 
 from __future__ import annotations
 
-import asyncio
-
+import iterm2
 from fastmcp import Context
 
-from iterm2_agent.connection import ITerm2Context, get_screen_lines
+from iterm2_agent import metrics
+from iterm2_agent.connection import get_screen_lines, screen_tail, wait_for_settle
+from iterm2_agent.metrics import timed
 from iterm2_agent.server import mcp
+from iterm2_agent.supervisor import get_iterm_context
 
 
 @mcp.tool()
+@timed
 async def send_text(
     ctx: Context,
     text: str,
     press_enter: bool = False,
     session_id: str = "",
+    preview: bool = True,
 ) -> str:
     """Send text to an iTerm2 session without automatically pressing Enter.
 
@@ -26,24 +30,37 @@ async def send_text(
         text: The text to send.
         press_enter: Whether to press Enter (send CR) after the text.
         session_id: Target session ID. Empty string uses the current active session.
+        preview: Whether to wait for the screen to react and include its
+            last lines. False returns immediately after sending.
 
     Returns:
         Confirmation message with current screen state.
     """
-    iterm_ctx: ITerm2Context = ctx.request_context.lifespan_context
+    iterm_ctx = get_iterm_context(ctx)
     session = await iterm_ctx.resolve_session(session_id)
+    action = "sent + Enter" if press_enter else "sent (no Enter)"
 
-    await session.async_send_text(text)
-    if press_enter:
-        await session.async_send_text("\r")
+    typing = iterm_ctx.locks.typing(session.session_id)
+    if not preview:
+        async with typing:
+            await _send(session, text, press_enter)
+        iterm_ctx.screens.invalidate(session.session_id)
+        return f"Text {action}: {repr(text)}"
 
-    # Brief pause to let the terminal process the input
-    await asyncio.sleep(0.5)
+    # Return as soon as the terminal has processed the input
+    async with wait_for_settle(session):
+        async with typing:
+            await _send(session, text, press_enter)
+    iterm_ctx.screens.invalidate(session.session_id)
 
-    screen_lines, _, _ = await get_screen_lines(session, max_lines=10)
-    while screen_lines and not screen_lines[-1].strip():
-        screen_lines.pop()
+    screen_lines, _, _ = await get_screen_lines(
+        session, max_lines=10, cache=iterm_ctx.screens
+    )
+    last_lines = screen_tail(screen_lines)
+    return f"Text {action}: {repr(text)}\n\nScreen (last lines):\n{last_lines}"
 
-    preview = "\n".join(screen_lines[-5:]) if screen_lines else "(empty)"
-    action = "sent + Enter" if press_enter else "sent (no Enter)"
-    return f"Text {action}: {repr(text)}\n\nScreen (last lines):\n{preview}"
+
+async def _send(session: iterm2.Session, text: str, press_enter: bool) -> None:
+    await metrics.async_send_text(session, text)
+    if press_enter:
+        await metrics.async_send_text(session, "\r")
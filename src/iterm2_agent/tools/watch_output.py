@@ -7,26 +7,42 @@ import re
 
 from fastmcp import Context
 
-from iterm2_agent.connection import ITerm2Context, get_screen_lines
+from iterm2_agent import metrics
+from iterm2_agent.connection import ITerm2Context, get_screen_lines, screen_tail
+from iterm2_agent.metrics import timed
 from iterm2_agent.server import mcp
+from iterm2_agent.shaping import shape_output
+from iterm2_agent.signals import Signal
+from iterm2_agent.supervisor import get_iterm_context
+from iterm2_agent.watchers import LineMatcher, scan_update
 
 
 @mcp.tool()
+@timed
 async def watch_output(
     ctx: Context,
     pattern: str,
-    timeout: int = 60,
+    timeout: int | None = None,
     session_id: str = "",
+    new_output_only: bool = False,
+    source: str = "screen",
 ) -> str:
     """Monitor terminal output until a regex pattern is matched.
 
     Useful for waiting for a server to start, a build to complete,
-    or a specific log message to appear.
+    or a specific log message to appear. Each line is matched once when it
+    appears and again only if it changes, including lines that scroll off
+    the screen between updates.
 
     Args:
         pattern: Regular expression pattern to match against screen lines.
-        timeout: Maximum seconds to wait before giving up.
+        timeout: Maximum seconds to wait before giving up. Defaults to the
+            configured timeout (60s unless overridden).
         session_id: Target session ID. Empty string uses the current active session.
+        new_output_only: Ignore text already on screen (or signals already
+            queued) when the watch starts and match only what comes after.
+        source: 'screen' matches screen lines; 'signal' matches the payloads
+            of signals sent by programs in the session (see poll_signals).
 
     Returns:
         The matched line(s) if found, or timeout notice with recent output.
@@ -35,42 +51,88 @@ async def watch_output(
         compiled = re.compile(pattern)
     except re.error as exc:
         return f"Invalid regex pattern: {pattern!r} — {exc}"
+    if source not in ("screen", "signal"):
+        return f"Invalid source: {source!r}. Must be 'screen' or 'signal'"
 
-    iterm_ctx: ITerm2Context = ctx.request_context.lifespan_context
+    iterm_ctx = get_iterm_context(ctx)
+    if timeout is None:
+        timeout = iterm_ctx.config.current.timeouts.for_tool("watch_output")
     session = await iterm_ctx.resolve_session(session_id)
+    if source == "signal":
+        return await _watch_signals(
+            iterm_ctx, session.session_id, compiled, timeout, new_output_only
+        )
 
     deadline = asyncio.get_event_loop().time() + timeout
 
     async with session.get_screen_streamer() as streamer:
-        while True:
+        contents = await metrics.async_get_screen_contents(session)
+        screen_top = contents.number_of_lines_above_screen
+        screen = [contents.line(i).string for i in range(contents.number_of_lines)]
+        await iterm_ctx.scrollback.async_ingest_contents(session, contents)
+
+        matcher = LineMatcher(compiled, start_line=screen_top)
+        if new_output_only:
+            matcher.skip(screen_top, screen)
+        matched = matcher.feed(screen_top, screen, screen_top)
+
+        while not matched:
             remaining = deadline - asyncio.get_event_loop().time()
             if remaining <= 0:
                 break
 
-            # Check current screen for pattern
-            screen_lines, _, _ = await get_screen_lines(session)
-            matched = [line for line in screen_lines if compiled.search(line)]
-            if matched:
-                return (
-                    f"Pattern matched: {pattern!r}\n"
-                    f"Matched lines ({len(matched)}):\n"
-                    + "\n".join(matched)
-                )
-
             # Wait for screen update
             try:
                 wait_time = min(2.0, remaining)
-                await asyncio.wait_for(streamer.async_get(), timeout=wait_time)
+                contents = await iterm_ctx.wait_for(
+                    streamer.async_get(), timeout=wait_time
+                )
             except asyncio.TimeoutError:
-                pass  # No update yet, loop and check again
+                continue  # No update yet, keep waiting
 
-    # Timeout — return last few lines for context
-    screen_lines, _, _ = await get_screen_lines(session, max_lines=10)
-    while screen_lines and not screen_lines[-1].strip():
-        screen_lines.pop()
+            matched = await scan_update(iterm_ctx.scrollback, session, matcher, contents)
+
+    if matched:
+        return (
+            f"Pattern matched: {pattern!r}\n"
+            f"Matched lines ({len(matched)}):\n"
+            + shape_output(matched, iterm_ctx.config.current.output)
+        )
 
-    recent = "\n".join(screen_lines[-5:]) if screen_lines else "(empty)"
+    # Timeout — return last few lines for context
+    screen_lines, _, _ = await get_screen_lines(
+        session, max_lines=10, cache=iterm_ctx.screens
+    )
+    recent = screen_tail(screen_lines)
     return (
         f"⏱️ Timed out after {timeout}s waiting for pattern: {pattern!r}\n\n"
         f"Last lines:\n{recent}"
     )
+
+
+async def _watch_signals(
+    iterm_ctx: ITerm2Context,
+    session_id: str,
+    compiled: re.Pattern[str],
+    timeout: float,
+    new_output_only: bool,
+) -> str:
+    """Wait for a signal whose payload matches ``compiled``."""
+
+    def matches(signal: Signal) -> bool:
+        return compiled.search(signal.payload) is not None
+
+    signals = iterm_ctx.signals
+    queued = [] if new_output_only else signals.take(session_id, matches, limit=1)
+    if queued:
+        signal = queued[0]
+    else:
+        with signals.expect(session_id, matches) as arrived:
+            try:
+                signal = await iterm_ctx.wait_for(arrived, timeout=timeout)
+            except asyncio.TimeoutError:
+                return (
+                    f"⏱️ Timed out after {timeout}s waiting for a signal "
+                    f"matching: {compiled.pattern!r}"
+                )
+    return f"Signal matched: {compiled.pattern!r}\n{signal.payload}"
@@ -0,0 +1,509 @@
+"""Background watchers: patterns matched against new output, queued as events.
+
+``watch_output`` holds a tool call open until one pattern matches in one
+session. A watcher is registered once (``add_watcher``) and outlives the
+call. Each session with watchers gets one dispatcher task with one screen
+streamer; it scans every new or changed line once against all of the
+session's patterns combined, and queues an event for each watcher that
+matched, to be read with ``poll_events``. Watchers expire after their TTL,
+and ``[watchers]`` caps their number, their patterns and the event queue.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import collections
+import itertools
+import logging
+import re
+import time
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Awaitable, Callable, Sequence
+
+import iterm2
+
+from iterm2_agent import metrics
+from iterm2_agent.config import ConfigStore, WatchersConfig
+from iterm2_agent.metrics import METRICS
+from iterm2_agent.scrollback import ScrollbackStore
+
+if TYPE_CHECKING:
+    from iterm2_agent.connection import ITerm2Context
+
+logger = logging.getLogger(__name__)
+
+# "new": only output after registration; "screen": also what is on screen
+SCOPES = ("new", "screen")
+
+# Backreferences depend on group numbers, which shift in an alternation
+_BACKREF_RE = re.compile(r"\\[1-9]|\(\?P=")
+
+
+class PatternSet:
+    """Several regexes searched in one pass as a single alternation.
+
+    :meth:`search` (what :class:`LineMatcher` calls) tells whether any
+    pattern matches. Patterns that cannot be combined — backreferences,
+    or a set that does not compile as one (clashing group names, inline
+    flags not at the start) — are searched one by one.
+    """
+
+    def __init__(self, patterns: Sequence[re.Pattern[str]] = ()) -> None:
+        self.patterns = tuple(patterns)
+        combinable = [p for p in self.patterns if not _BACKREF_RE.search(p.pattern)]
+        separate = [p for p in self.patterns if _BACKREF_RE.search(p.pattern)]
+        self._combined: re.Pattern[str] | None = None
+        if combinable:
+            try:
+                self._combined = re.compile(
+                    "|".join(f"(?:{p.pattern})" for p in combinable)
+                )
+            except re.error:
+                separate = list(self.patterns)
+        self._separate = tuple(separate)
+
+    def search(self, text: str) -> bool:
+        if self._combined is not None and self._combined.search(text):
+            return True
+        return any(p.search(text) for p in self._separate)
+
+
+class LineMatcher:
+    """Incrementally match a regex against a session's lines.
+
+    Lines are addressed by absolute line number. Lines before ``cursor``
+    have scrolled into history and are never scanned again; lines from
+    ``cursor`` on (the mutable screen when last seen) are rescanned only
+    when their text changes.
+    """
+
+    def __init__(self, compiled: re.Pattern[str] | PatternSet, start_line: int = 0) -> None:
+        self.compiled = compiled
+        self.cursor = start_line
+        self.scanned = 0
+        # Text of the lines from ``cursor`` onwards as last scanned
+        self._known: list[str] = []
+
+    def skip(self, start: int, lines: Sequence[str]) -> None:
+        """Mark lines as already seen without matching them."""
+        self.cursor = start
+        self._known = list(lines)
+
+    def feed(self, start: int, lines: Sequence[str], screen_top: int) -> list[str]:
+        """Scan new or changed lines from ``start`` onwards.
+
+        Args:
+            start: Absolute line number of ``lines[0]``.
+            lines: Line texts, contiguous from ``start``.
+            screen_top: Absolute line number of the first mutable screen row;
+                everything before it is frozen history.
+
+        Returns:
+            The matching lines, in order.
+        """
+        if start > self.cursor:
+            # Lines in between were never delivered; nothing to compare against
+            self.cursor = start
+            self._known = []
+        lines = list(lines[self.cursor - start:])
+
+        known = self._known
+        overlap = min(len(known), len(lines))
+        candidates = [
+            text for text, old in zip(lines[:overlap], known) if text != old
+        ]
+        candidates.extend(lines[overlap:])
+        self.scanned += len(candidates)
+        search = self.compiled.search
+        matched = [text for text in candidates if search(text)]
+
+        frozen = max(0, screen_top - self.cursor)
+        self._known = lines[frozen:]
+        self.cursor += frozen
+        return matched
+
+
+async def scan_update(
+    scrollback: ScrollbackStore,
+    session: iterm2.Session,
+    matcher: LineMatcher,
+    contents: iterm2.ScreenContents,
+) -> list[str]:
+    """Feed one screen update to the matcher, including lines that scrolled
+    past the screen since the previous update."""
+    await scrollback.async_ingest_contents(session, contents)
+
+    screen_top = contents.number_of_lines_above_screen
+    end = screen_top + contents.number_of_lines
+    start = min(matcher.cursor, screen_top)
+    buffer = scrollback.get(session.session_id)
+    if buffer is not None and buffer.first_line <= start:
+        lines = buffer.read(start, end)
+    else:
+        start = screen_top
+        lines = [contents.line(i).string for i in range(contents.number_of_lines)]
+    return matcher.feed(start, lines, screen_top)
+
+
+@dataclass(frozen=True)
+class WatchEvent:
+    """A line that matched one of a watcher's patterns.
+
+    ``pattern`` is empty for the event telling that the session closed.
+    ``owner`` is the watcher's.
+    """
+
+    watcher_id: str
+    session_id: str
+    pattern: str
+    line: str
+    at: float = field(default_factory=time.time)
+    owner: str | None = None
+
+
+@dataclass(eq=False)
+class Watcher:
+    """Patterns registered for one session until ``expires`` (monotonic).
+
+    ``owner`` is the MCP client that registered it (None: unknown).
+    """
+
+    id: str
+    session_id: str
+    compiled: tuple[re.Pattern[str], ...]
+    expires: float
+    once: bool = False
+    notify: Callable[[WatchEvent], Awaitable[None]] | None = field(default=None, repr=False)
+    events: int = 0
+    owner: str | None = None
+
+    @property
+    def patterns(self) -> list[str]:
+        return [p.pattern for p in self.compiled]
+
+    def match(self, line: str) -> str | None:
+        """The first of the patterns that matches ``line``."""
+        for pattern in self.compiled:
+            if pattern.search(line):
+                return pattern.pattern
+        return None
+
+
+class WatcherRegistry:
+    """Registered watchers, their per-session dispatchers and the event queue.
+
+    Limits come from ``config`` (set by :class:`ITerm2Context`). Expired
+    watchers are dropped whenever a dispatcher wakes (it also wakes for
+    the next expiry) and on every add and poll. Registrations survive a
+    reconnect: the supervisor stops the dispatchers when the connection
+    drops and resumes them for sessions that still exist afterwards.
+    """
+
+    def __init__(self, config: ConfigStore | None = None) -> None:
+        self.config = config
+        self._watchers: dict[str, Watcher] = {}
+        self._dispatchers: dict[str, asyncio.Task[None]] = {}
+        # Set once a session's dispatcher follows the screen (or gave up)
+        self._started: dict[str, asyncio.Event] = {}
+        self._matchers: dict[str, LineMatcher] = {}
+        self._events: collections.deque[WatchEvent] = collections.deque()
+        self._arrived = asyncio.Event()
+        self._notifications: set[asyncio.Task[None]] = set()
+        self._ids = itertools.count(1)
+        self.dropped = 0
+
+    @property
+    def limits(self) -> WatchersConfig:
+        return self.config.current.watchers if self.config is not None else WatchersConfig()
+
+    def watchers(self, session_id: str = "", owner: str | None = None) -> list[Watcher]:
+        """Live watchers, oldest first; only the session's and the owner's
+        if given."""
+        return [
+            watcher for watcher in self._watchers.values()
+            if (not session_id or watcher.session_id == session_id)
+            and (owner is None or watcher.owner == owner)
+        ]
+
+    def get(self, watcher_id: str) -> Watcher | None:
+        return self._watchers.get(watcher_id)
+
+    async def add(
+        self,
+        iterm_ctx: ITerm2Context,
+        session: iterm2.Session,
+        patterns: Sequence[str],
+        scope: str = "new",
+        ttl: float | None = None,
+        once: bool = False,
+        notify: Callable[[WatchEvent], Awaitable[None]] | None = None,
+        owner: str | None = None,
+    ) -> Watcher:
+        """Register a watcher and make sure its session has a dispatcher.
+
+        Returns once the dispatcher follows the session, so output printed
+        after this returns is seen. With scope ``"screen"``, lines already
+        on screen are matched first.
+
+        Raises:
+            ValueError: For an invalid pattern, scope or TTL, or when a cap
+                would be exceeded.
+        """
+        limits = self.limits
+        if scope not in SCOPES:
+            raise ValueError(f"Invalid scope: {scope!r}. Valid options: {', '.join(SCOPES)}")
+        if not patterns:
+            raise ValueError("At least one pattern is required")
+        if len(patterns) > limits.max_patterns:
+            raise ValueError(f"Too many patterns: {len(patterns)} (limit {limits.max_patterns})")
+        ttl = limits.default_ttl if ttl is None else ttl
+        if not 0 < ttl <= limits.max_ttl:
+            raise ValueError(f"ttl must be between 0 and {limits.max_ttl:g} seconds")
+        compiled = []
+        for pattern in patterns:
+            try:
+                compiled.append(re.compile(pattern))
+            except re.error as exc:
+                raise ValueError(f"Invalid regex pattern: {pattern!r} — {exc}") from None
+        self._expire()
+        if len(self._watchers) >= limits.max_watchers:
+            raise ValueError(
+                f"Too many watchers: {len(self._watchers)} (limit {limits.max_watchers});"
+                " remove some with remove_watcher"
+            )
+
+        sid = session.session_id
+        watcher = Watcher(
+            f"watch-{next(self._ids)}", sid, tuple(compiled),
+            expires=time.monotonic() + ttl, once=once, notify=notify, owner=owner,
+        )
+        self._watchers[watcher.id] = watcher
+        if sid in self._dispatchers:
+            self._retune(sid)
+        else:
+            self._start(iterm_ctx, session)
+        await self._started[sid].wait()
+
+        if scope == "screen":
+            contents = await iterm_ctx.screens.async_get(session)
+            for i in range(contents.number_of_lines):
+                self._dispatch_line(watcher, contents.line(i).string)
+        return watcher
+
+    def remove(self, watcher_id: str) -> Watcher | None:
+        """Unregister a watcher; its session's dispatcher stops with the last."""
+        watcher = self._watchers.pop(watcher_id, None)
+        if watcher is not None:
+            self._retune(watcher.session_id)
+        return watcher
+
+    async def poll(
+        self,
+        watcher_id: str = "",
+        wait: float = 0,
+        limit: int = 100,
+        owner: str | None = None,
+    ) -> list[WatchEvent]:
+        """Take up to ``limit`` queued events, oldest first.
+
+        With ``watcher_id``, only that watcher's; with ``owner``, only
+        those of the owner's watchers. Waits up to ``wait`` seconds for one
+        to arrive when none is queued.
+        """
+        self._expire()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + wait
+        while True:
+            taken, kept = [], collections.deque()
+            for event in self._events:
+                if (
+                    len(taken) < limit
+                    and (not watcher_id or event.watcher_id == watcher_id)
+                    and (owner is None or event.owner == owner)
+                ):
+                    taken.append(event)
+                else:
+                    kept.append(event)
+            remaining = deadline - loop.time()
+            if taken or remaining <= 0:
+                self._events = kept
+                return taken
+            self._arrived.clear()
+            try:
+                await asyncio.wait_for(self._arrived.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+
+    async def async_stop(self) -> None:
+        """Stop the dispatchers, keeping the watchers (connection dropped)."""
+        tasks = list(self._dispatchers.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def resume(self, iterm_ctx: ITerm2Context) -> None:
+        """Restart dispatchers on a new connection.
+
+        Watchers of sessions that no longer exist are removed, with a
+        closing event. Output printed while disconnected is not matched.
+        """
+        for sid in {watcher.session_id for watcher in self._watchers.values()}:
+            entry = iterm_ctx.sessions.get(sid)
+            if entry is None:
+                self._session_closed(sid)
+            elif sid not in self._dispatchers:
+                self._start(iterm_ctx, entry.session)
+
+    async def async_close(self) -> None:
+        """Stop everything and forget all watchers and events."""
+        await self.async_stop()
+        for task in list(self._notifications):
+            task.cancel()
+        self._watchers.clear()
+        self._events.clear()
+
+    def _start(self, iterm_ctx: ITerm2Context, session: iterm2.Session) -> None:
+        sid = session.session_id
+        started = self._started[sid] = asyncio.Event()
+        self._dispatchers[sid] = asyncio.create_task(
+            self._dispatch(iterm_ctx, session, started), name=f"watchers-{sid}"
+        )
+
+    async def _dispatch(
+        self,
+        iterm_ctx: ITerm2Context,
+        session: iterm2.Session,
+        started: asyncio.Event,
+    ) -> None:
+        from iterm2_agent.connection import ConnectionLostError
+
+        sid = session.session_id
+        try:
+            async with session.get_screen_streamer() as streamer:
+                # Streamers drop updates while nobody waits, so one waiter is
+                # always pending, subscribed before the baseline read
+                waiter = asyncio.ensure_future(streamer.async_get())
+                try:
+                    await asyncio.sleep(0)
+                    contents = await metrics.async_get_screen_contents(session)
+                    await iterm_ctx.scrollback.async_ingest_contents(session, contents)
+                    screen_top = contents.number_of_lines_above_screen
+                    matcher = LineMatcher(self._pattern_set(sid), start_line=screen_top)
+                    matcher.skip(
+                        screen_top,
+                        [contents.line(i).string for i in range(contents.number_of_lines)],
+                    )
+                    self._matchers[sid] = matcher
+                    started.set()
+
+                    while True:
+                        watchers = self.watchers(sid)
+                        if not watchers:
+                            return
+                        # Also wake up to drop the next watcher that expires
+                        expiry = min(watcher.expires for watcher in watchers)
+                        try:
+                            contents = await iterm_ctx.wait_for(
+                                asyncio.shield(waiter),
+                                timeout=max(0.0, expiry - time.monotonic()),
+                            )
+                        except asyncio.TimeoutError:
+                            self._expire()
+                            continue
+                        waiter = asyncio.ensure_future(streamer.async_get())
+                        self._expire()
+                        for line in await scan_update(
+                            iterm_ctx.scrollback, session, matcher, contents
+                        ):
+                            for watcher in self.watchers(sid):
+                                self._dispatch_line(watcher, line)
+                finally:
+                    waiter.cancel()
+        except iterm2.RPCException:
+            # The session went away
+            self._session_closed(sid)
+        except ConnectionLostError:
+            pass  # resumed by the supervisor after reconnecting
+        finally:
+            started.set()
+            if self._dispatchers.get(sid) is asyncio.current_task():
+                self._forget_dispatcher(sid)
+
+    def _dispatch_line(self, watcher: Watcher, line: str) -> None:
+        if watcher.id not in self._watchers:  # a once-watcher that fired
+            return
+        pattern = watcher.match(line)
+        if pattern is None:
+            return
+        watcher.events += 1
+        self._emit(
+            watcher,
+            WatchEvent(watcher.id, watcher.session_id, pattern, line, owner=watcher.owner),
+        )
+        if watcher.once:
+            self.remove(watcher.id)
+
+    def _emit(self, watcher: Watcher, event: WatchEvent) -> None:
+        if len(self._events) >= self.limits.max_events:
+            self._events.popleft()
+            self.dropped += 1
+        self._events.append(event)
+        self._arrived.set()
+        if METRICS.enabled:
+            METRICS.inc("watcher_events_total")
+        if watcher.notify is not None:
+            task = asyncio.ensure_future(self._notify(watcher.notify, event))
+            self._notifications.add(task)
+            task.add_done_callback(self._notifications.discard)
+
+    @staticmethod
+    async def _notify(
+        notify: Callable[[WatchEvent], Awaitable[None]],
+        event: WatchEvent,
+    ) -> None:
+        try:
+            await notify(event)
+        except Exception as exc:  # the client went away, ...
+            logger.debug("Dropping notification for %s: %r", event.watcher_id, exc)
+
+    def _session_closed(self, session_id: str) -> None:
+        for watcher in self.watchers(session_id):
+            del self._watchers[watcher.id]
+            self._emit(
+                watcher,
+                WatchEvent(
+                    watcher.id, session_id, "", "(session closed; watcher removed)",
+                    owner=watcher.owner,
+                ),
+            )
+
+    def _expire(self) -> None:
+        now = time.monotonic()
+        for watcher in list(self._watchers.values()):
+            if watcher.expires <= now:
+                self.remove(watcher.id)
+
+    def _retune(self, session_id: str) -> None:
+        """Recombine the session's patterns, or stop its dispatcher."""
+        if self.watchers(session_id):
+            matcher = self._matchers.get(session_id)
+            if matcher is not None:
+                matcher.compiled = self._pattern_set(session_id)
+            return
+        task = self._dispatchers.get(session_id)
+        if task is not None:
+            self._forget_dispatcher(session_id)
+            if task is not asyncio.current_task():
+                task.cancel()
+
+    def _forget_dispatcher(self, session_id: str) -> None:
+        # A new watcher for the session then starts a fresh dispatcher
+        # instead of joining one that is on its way out
+        del self._dispatchers[session_id]
+        self._started.pop(session_id).set()
+        self._matchers.pop(session_id, None)
+
+    def _pattern_set(self, session_id: str) -> PatternSet:
+        return PatternSet([
+            pattern for watcher in self.watchers(session_id) for pattern in watcher.compiled
+        ])
@@ -0,0 +1,44 @@
+"""Fixtures shared by the unit tests."""
+
+from __future__ import annotations
+
+import pytest
+
+from iterm2_agent.fake_backend import FakeBackend, scripted_shell
+from tests.fakes import fake_iterm_context, fake_supervisor_ctx, tool_ctx
+
+
+@pytest.fixture
+async def fake(request):
+    """A supervisor on a 40x12 scripted-shell fake backend; see fake_supervisor_ctx.
+
+    Parametrize it indirectly with FakeBackend arguments to change the
+    backend, e.g. ``{"height": 6}``.
+    """
+    options = {"width": 40, "height": 12, **getattr(request, "param", {})}
+    async with fake_supervisor_ctx(FakeBackend(scripted_shell(), **options)) as fake:
+        yield fake
+
+
+@pytest.fixture
+def fake_ctx(fake):
+    """The tool ``ctx`` of the ``fake`` supervisor."""
+    return fake.ctx
+
+
+@pytest.fixture
+async def session_ctx():
+    """Factory of tool ``ctx`` objects over FakeSessions; see fake_iterm_context.
+
+    The contexts' scrollback followers are closed after the test.
+    """
+    contexts = []
+
+    def factory(*sessions, **kwargs):
+        iterm_ctx = fake_iterm_context(*sessions, **kwargs)
+        contexts.append(iterm_ctx)
+        return tool_ctx(iterm_ctx)
+
+    yield factory
+    for iterm_ctx in contexts:
+        await iterm_ctx.scrollback.async_close()
@@ -0,0 +1,197 @@
+"""In-memory stand-ins for iterm2 sessions used by the unit tests."""
+
+from __future__ import annotations
+
+import asyncio
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Callable
+from unittest.mock import MagicMock
+
+from iterm2_agent.connection import ITerm2Context
+from iterm2_agent.fake_backend import FakeBackend, scripted_shell
+from iterm2_agent.supervisor import ConnectionSupervisor
+
+
+def tool_ctx(lifespan_context: Any) -> SimpleNamespace:
+    """What a tool's ``ctx`` argument exposes: the lifespan state."""
+    return SimpleNamespace(request_context=SimpleNamespace(lifespan_context=lifespan_context))
+
+
+def fake_iterm_context(
+    *sessions: FakeSession,
+    tabs: dict[str, Any] | None = None,
+    connection: Any = None,
+    **fields: Any,
+) -> ITerm2Context:
+    """An ITerm2Context whose app resolves ``sessions`` by ID.
+
+    The first session is the current one; ``tabs`` maps tab IDs to tabs.
+    ``fields`` are passed on to the context (``scrollback``, ``screens``...).
+    """
+    by_id = {session.session_id: session for session in sessions}
+    app = MagicMock()
+    app.current_terminal_window.current_tab.current_session = sessions[0] if sessions else None
+    app.get_session_by_id.side_effect = by_id.get
+    app.get_tab_by_id.side_effect = (tabs or {}).get
+    return ITerm2Context(connection=connection or MagicMock(), app=app, **fields)
+
+
+@asynccontextmanager
+async def fake_supervisor_ctx(
+    backend: FakeBackend | None = None,
+) -> AsyncIterator[SimpleNamespace]:
+    """A supervisor connected to ``backend`` (a 40x12 scripted shell by default).
+
+    Yields ``ctx`` for tool calls, ``supervisor`` and ``backend``; the
+    supervisor is closed on exit.
+    """
+    if backend is None:
+        backend = FakeBackend(scripted_shell(), width=40, height=12)
+    supervisor = ConnectionSupervisor(backend)
+    await supervisor.async_start()
+    try:
+        yield SimpleNamespace(ctx=tool_ctx(supervisor), supervisor=supervisor, backend=backend)
+    finally:
+        await supervisor.async_close()
+
+
+async def settle() -> None:
+    """Let callbacks and tasks scheduled so far run."""
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+class FakeContents:
+    """Mimics iterm2.ScreenContents for a fixed list of lines."""
+
+    def __init__(self, lines: list[str], above: int, cursor: tuple[int, int]):
+        self._lines = list(lines)
+        self.number_of_lines = len(lines)
+        self.number_of_lines_above_screen = above
+        self.cursor_coord = SimpleNamespace(x=cursor[0], y=cursor[1])
+
+    def line(self, index: int):
+        return SimpleNamespace(string=self._lines[index])
+
+
+class FakeStreamer:
+    """Mimics iterm2.ScreenStreamer: async_get() resolves on the next write."""
+
+    def __init__(self, session: FakeSession, want_contents: bool = True):
+        self._session = session
+        self._want_contents = want_contents
+        self._future: asyncio.Future | None = None
+
+    async def __aenter__(self):
+        self._session.streamers.append(self)
+        return self
+
+    async def __aexit__(self, *exc):
+        self._session.streamers.remove(self)
+
+    def notify(self) -> None:
+        future, self._future = self._future, None
+        if future is not None and not future.done():
+            future.set_result(None)
+
+    async def async_get(self):
+        self._future = asyncio.get_running_loop().create_future()
+        await self._future
+        if not self._want_contents:
+            return None
+        return await self._session.async_get_screen_contents()
+
+
+class FakeSession:
+    """A terminal with a fixed-height screen over an unbounded history.
+
+    ``history`` holds every line ever written; the screen is its last
+    ``height`` rows. Sending text that ends in CR runs ``on_command`` with
+    the typed command, which usually calls :meth:`write` with the output.
+    """
+
+    def __init__(
+        self,
+        session_id: str = "w0t0p0",
+        height: int = 24,
+        prompt: str = "$ ",
+        on_command: Callable[[str], list[str]] | None = None,
+    ):
+        self.session_id = session_id
+        self.height = height
+        self.prompt = prompt
+        self.history = [prompt]
+        self.sent: list[str] = []
+        self.streamers: list[FakeStreamer] = []
+        self.on_command = on_command
+        self.name = f"Session {session_id}"
+        self.grid_size = SimpleNamespace(width=80, height=height)
+        self.variables: dict[str, str] = {"path": "/home/user", "jobName": "zsh"}
+        self.screen_reads = 0
+        self.range_reads: list[tuple[int, int]] = []
+
+    @property
+    def above(self) -> int:
+        return max(0, len(self.history) - self.height)
+
+    def write(self, lines: list[str], prompt: bool = True) -> None:
+        """Append output lines (and optionally a fresh prompt)."""
+        self.history.extend(lines)
+        if prompt:
+            self.history.append(self.prompt)
+        for streamer in list(self.streamers):
+            streamer.notify()
+
+    async def async_get_screen_contents(self) -> FakeContents:
+        self.screen_reads += 1
+        screen = self.history[self.above:]
+        cursor_y = len(screen) - 1
+        screen = screen + [""] * (self.height - len(screen))
+        return FakeContents(screen, self.above, (len(self.history[-1]), cursor_y))
+
+    async def async_get_contents(self, first_line: int, number_of_lines: int):
+        self.range_reads.append((first_line, number_of_lines))
+        padded = self.history + [""] * (self.above + self.height - len(self.history))
+        lines = padded[first_line:first_line + number_of_lines]
+        return [SimpleNamespace(string=line) for line in lines]
+
+    async def async_get_line_info(self):
+        return SimpleNamespace(
+            mutable_area_height=self.height,
+            scrollback_buffer_height=self.above,
+            overflow=0,
+            first_visible_line_number=self.above,
+        )
+
+    async def async_get_variable(self, name: str):
+        return self.variables.get(name)
+
+    async def async_send_text(self, text: str) -> None:
+        self.sent.append(text)
+        typed = text.rstrip("\r")
+        self.history[-1] += typed
+        if text.endswith("\r"):
+            output = self.on_command(typed) if self.on_command else []
+            self.write(output)
+        else:
+            for streamer in list(self.streamers):
+                streamer.notify()
+
+    def get_screen_streamer(self, want_contents: bool = True) -> FakeStreamer:
+        return FakeStreamer(self, want_contents)
+
+
+def fake_app(layout: list[list[list[FakeSession]]]):
+    """Build an app-like object from windows -> tabs -> sessions."""
+    windows = [
+        SimpleNamespace(
+            window_id=f"window-{w}",
+            tabs=[
+                SimpleNamespace(tab_id=f"{w}-{t}", sessions=sessions)
+                for t, sessions in enumerate(tabs)
+            ],
+        )
+        for w, tabs in enumerate(layout)
+    ]
+    return SimpleNamespace(terminal_windows=windows)
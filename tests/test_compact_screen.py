@@ -0,0 +1,147 @@
+"""Tests for the compact screen representation and its style queries."""
+
+from __future__ import annotations
+
+import sys
+
+import iterm2
+import pytest
+from iterm2 import api_pb2
+
+from iterm2_agent.connection import (
+    BOLD,
+    RED,
+    UNDERLINE,
+    CompactScreen,
+    get_screen,
+    get_screen_lines,
+    rgb_color,
+    screen_tail,
+)
+from iterm2_agent.fake_backend import TerminalEmulator
+from tests.fakes import FakeContents, FakeSession
+
+
+def styled_contents() -> iterm2.ScreenContents:
+    """Three rows: a red error, a link with a wide character, plain text."""
+    reply = api_pb2.GetBufferResponse(num_lines_above_screen=7)
+    reply.cursor.x, reply.cursor.y = 2, 2
+
+    row = reply.contents.add(text="error: bad thing", continuation=1)
+    row.style.add(fgStandard=9, bold=True, repeats=6)
+    row.style.add(repeats=10)
+
+    row = reply.contents.add(text="日 see https://x.test", continuation=1)
+    row.code_points_per_cell.add(num_code_points=1, repeats=1)
+    row.code_points_per_cell.add(num_code_points=0, repeats=1)  # wide char's second cell
+    row.code_points_per_cell.add(num_code_points=1, repeats=19)
+    row.style.add(repeats=7)
+    link = row.style.add(underline=True, repeats=14)
+    link.fgRgb.red, link.fgRgb.green, link.fgRgb.blue = 80, 120, 255
+    link.url.url = "https://x.test"
+
+    row = reply.contents.add(text="ok", continuation=1)
+    row.style.add(bgStandard=1, repeats=2)
+    return iterm2.ScreenContents(reply)
+
+
+class TestSequence:
+    def test_behaves_like_list_of_lines(self):
+        lines = ["one", "", "three", "  "]
+        screen = CompactScreen(lines, cursor=(1, 2), lines_above=5)
+        assert len(screen) == 4
+        assert list(screen) == lines
+        assert screen[0] == "one" and screen[-1] == "  "
+        assert screen[1:3] == ["", "three"]
+        assert screen == lines
+        assert (screen.cursor_x, screen.cursor_y, screen.lines_above) == (1, 2, 5)
+        with pytest.raises(IndexError):
+            screen[4]
+
+    def test_empty(self):
+        screen = CompactScreen()
+        assert len(screen) == 0
+        assert list(screen) == []
+        assert screen != CompactScreen([""])
+
+    def test_rejects_newlines(self):
+        with pytest.raises(ValueError):
+            CompactScreen(["a\nb"])
+
+    def test_rstrip(self):
+        screen = CompactScreen(["a", "b", " ", ""], soft=[False, True, False, False])
+        stripped = screen.rstrip()
+        assert stripped == ["a", "b"]
+        assert stripped.wrapped(1)
+        assert CompactScreen(["", " "]).rstrip() == []
+
+    def test_smaller_than_list_of_strings(self):
+        lines = [f"{i:5d} some build output line with a path/to/file.py:{i}" for i in range(2000)]
+        screen = CompactScreen(lines)
+        compact = sys.getsizeof(screen.text) + sys.getsizeof(screen._stops)
+        listed = sys.getsizeof(lines) + sum(sys.getsizeof(line) for line in lines)
+        assert compact < listed * 0.6
+
+
+class TestFromContents:
+    def test_soft_wraps_rejoin(self):
+        terminal = TerminalEmulator(20, 5)
+        terminal.feed("$ echo " + "x" * 30 + "\r\nshort\r\n")
+        screen = CompactScreen.from_contents(terminal.screen_contents())
+        assert screen.wrapped(0) and not screen.wrapped(1)
+        assert screen.rstrip().logical_lines() == [(0, "$ echo " + "x" * 30), (2, "short")]
+
+    def test_fallback_without_reply(self):
+        screen = CompactScreen.from_contents(FakeContents(["a", "b", "c"], 4, (1, 2)), 2)
+        assert screen == ["a", "b"]
+        assert screen.lines_above == 4
+        assert not screen.wrapped(0)
+        # Styles were asked for but cannot be read: fail now, not on a query
+        with pytest.raises(ValueError, match="reply"):
+            CompactScreen.from_contents(FakeContents(["a"], 0, (0, 0)), styles=True)
+
+    def test_screen_tail_rejoins_wraps(self):
+        terminal = TerminalEmulator(20, 6)
+        terminal.feed("$ make\r\n" + "warning: " + "w" * 25 + "\r\ndone\r\n")
+        screen = CompactScreen.from_contents(terminal.screen_contents())
+        assert screen_tail(screen, 2) == "warning: " + "w" * 25 + "\ndone"
+        assert screen_tail(CompactScreen(["", " "])) == "(empty)"
+
+    async def test_get_screen(self):
+        session = FakeSession()
+        session.write(["$ ls", "file"])
+        screen = await get_screen(session)
+        assert "file" in screen
+        lines, cursor_x, cursor_y = await get_screen_lines(session)
+        assert isinstance(lines, CompactScreen) and lines == screen
+        assert (cursor_x, cursor_y) == (screen.cursor_x, screen.cursor_y)
+        with pytest.raises(ValueError):
+            screen.lines_with(foreground=RED)
+
+
+class TestStyles:
+    def test_queries(self):
+        screen = CompactScreen.from_contents(styled_contents(), styles=True)
+        assert screen == ["error: bad thing", "日 see https://x.test", "ok"]
+        assert (screen.cursor_x, screen.cursor_y, screen.lines_above) == (2, 2, 7)
+
+        assert screen.lines_with(foreground=RED) == [0]
+        assert screen.styled(foreground=RED) == [(0, "error:")]
+        assert screen.styled(flags=BOLD) == [(0, "error:")]
+        assert screen.styled(flags=BOLD | UNDERLINE) == []
+        # Cells map to code points: the wide character takes two cells
+        blue = rgb_color(80, 120, 255)
+        assert screen.styled(foreground=[blue], flags=UNDERLINE) == [(1, "https://x.test")]
+        assert screen.styled(background=RED) == [(2, "ok")]
+        assert screen.lines_with() == [0, 1, 2]
+        assert screen.urls() == [(1, "https://x.test")]
+
+    def test_styles_survive_head(self):
+        screen = CompactScreen.from_contents(styled_contents(), styles=True)
+        assert screen.head(1).styled(flags=BOLD) == [(0, "error:")]
+
+    def test_needs_styles(self):
+        screen = CompactScreen.from_contents(styled_contents())
+        assert screen[2] == "ok"
+        with pytest.raises(ValueError):
+            screen.urls()
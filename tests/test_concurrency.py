@@ -0,0 +1,236 @@
+"""Tests for coalesced read-only calls and per-session write locks."""
+
+from __future__ import annotations
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+import uvicorn
+from fastmcp import Client
+
+import iterm2_agent.server as server
+from iterm2_agent.concurrency import (
+    ClientLimitMiddleware,
+    SessionBusyError,
+    SessionLocks,
+    coalesced,
+)
+from iterm2_agent.connection import ITerm2Context
+from iterm2_agent.fake_backend import FakeBackend, scripted_shell
+from iterm2_agent.server import mcp
+from iterm2_agent.tools.manage_session import manage_session
+from iterm2_agent.tools.run_command import run_command
+from iterm2_agent.tools.send_control import send_control
+from tests.fakes import FakeSession, fake_app, tool_ctx
+
+
+class Recorder:
+    """A coalesced tool-like coroutine counting how often it really runs."""
+
+    def __init__(self) -> None:
+        self.calls: list[tuple] = []
+
+        @coalesced(when=lambda args: args["mode"] == "read")
+        async def tool(ctx, name: str, items=(), mode: str = "read") -> str:
+            self.calls.append((name, mode))
+            await asyncio.sleep(0.02)
+            return f"{name}:{len(self.calls)}"
+
+        self.tool = tool
+
+
+@pytest.fixture
+def recorder():
+    return Recorder()
+
+
+class TestCoalesced:
+    async def test_identical_calls_share_one_run(self, recorder):
+        ctx = tool_ctx(object())
+        results = await asyncio.gather(*(recorder.tool(ctx, "a") for _ in range(3)))
+        assert results == ["a:1"] * 3
+        assert len(recorder.calls) == 1
+
+        # Finished calls are not cached
+        assert await recorder.tool(ctx, "a") == "a:2"
+
+    async def test_different_arguments_run_separately(self, recorder):
+        ctx = tool_ctx(object())
+        await asyncio.gather(recorder.tool(ctx, "a"), recorder.tool(ctx, name="b"))
+        assert len(recorder.calls) == 2
+
+    async def test_keyword_and_positional_forms_match(self, recorder):
+        ctx = tool_ctx(object())
+        await asyncio.gather(recorder.tool(ctx, "a"), recorder.tool(ctx, name="a", mode="read"))
+        assert len(recorder.calls) == 1
+
+    async def test_excluded_and_unhashable_calls_run_separately(self, recorder):
+        ctx = tool_ctx(object())
+        await asyncio.gather(*(recorder.tool(ctx, "a", mode="write") for _ in range(2)))
+        await asyncio.gather(*(recorder.tool(ctx, "a", items=["x"]) for _ in range(2)))
+        assert len(recorder.calls) == 4
+
+    async def test_servers_do_not_share(self, recorder):
+        await asyncio.gather(recorder.tool(tool_ctx(object()), "a"), recorder.tool(tool_ctx(object()), "a"))
+        assert len(recorder.calls) == 2
+
+    async def test_cancelled_caller_leaves_call_running(self, recorder):
+        ctx = tool_ctx(object())
+        first = asyncio.ensure_future(recorder.tool(ctx, "a"))
+        second = asyncio.ensure_future(recorder.tool(ctx, "a"))
+        await asyncio.sleep(0)
+        first.cancel()
+        assert await second == "a:1"
+
+    async def test_list_sessions_coalesced(self):
+        sessions = [FakeSession("a"), FakeSession("b")]
+        reads = 0
+        for session in sessions:
+            original = session.async_get_variable
+
+            async def counting(name, original=original):
+                nonlocal reads
+                reads += 1
+                await asyncio.sleep(0.01)
+                return await original(name)
+
+            session.async_get_variable = counting
+        ctx = tool_ctx(ITerm2Context(connection=None, app=fake_app([[sessions]])))
+        results = await asyncio.gather(*(manage_session.fn(ctx, "list") for _ in range(4)))
+        assert len(set(results)) == 1
+        # path and jobName per session, once
+        assert reads == 4
+
+
+class TestSessionLocks:
+    async def test_command_lock_times_out(self):
+        locks = SessionLocks()
+        async with locks.command("s", 1) as remaining:
+            assert 0.9 < remaining <= 1
+            with pytest.raises(SessionBusyError, match="Session s is busy"):
+                async with locks.command("s", 0.01):
+                    pass
+            # Other sessions are independent
+            async with locks.command("t", 0.01):
+                pass
+
+
+class TestClientLimit:
+    async def test_calls_per_client_are_capped(self):
+        middleware = ClientLimitMiddleware(limit=2)
+        running = {"a": 0, "b": 0}
+        peak = {"a": 0, "b": 0}
+        release = asyncio.Event()
+
+        def call(client: str):
+            context = SimpleNamespace(fastmcp_context=SimpleNamespace(session_id=client))
+
+            async def call_next(_):
+                running[client] += 1
+                peak[client] = max(peak[client], running[client])
+                await release.wait()
+                running[client] -= 1
+                return client
+
+            return middleware.on_call_tool(context, call_next)
+
+        calls = [asyncio.ensure_future(call("a")) for _ in range(5)]
+        calls.append(asyncio.ensure_future(call("b")))
+        for _ in range(5):
+            await asyncio.sleep(0)
+        # Client a waits behind its own calls; b is not held up by a
+        assert running == {"a": 2, "b": 1}
+        release.set()
+        assert await asyncio.gather(*calls) == ["a"] * 5 + ["b"]
+        assert peak == {"a": 2, "b": 1}
+
+    async def test_calls_without_session_pass_through(self):
+        middleware = ClientLimitMiddleware(limit=1)
+        context = SimpleNamespace(fastmcp_context=None)
+
+        async def call_next(_):
+            return "ok"
+
+        assert await middleware.on_call_tool(context, call_next) == "ok"
+
+
+class TestWriters:
+    async def test_concurrent_commands_do_not_interleave(self, fake_ctx):
+        results = await asyncio.gather(
+            run_command.fn(fake_ctx, "echo one", timeout=5),
+            run_command.fn(fake_ctx, "echo two", timeout=5),
+        )
+        assert results[0].startswith("$ echo one\none\n")
+        assert results[1].startswith("$ echo two\ntwo\n")
+        assert all("Exit status: 0" in result for result in results)
+
+    async def test_busy_session(self, fake_ctx):
+        iterm_ctx = fake_ctx.request_context.lifespan_context.context
+        session = await iterm_ctx.resolve_session()
+        async with iterm_ctx.locks.command(session.session_id, 1):
+            result = await run_command.fn(fake_ctx, "echo late", timeout=0.05)
+            assert result == f"Session {session.session_id} is busy: another command is still running"
+
+            # Control keys still get through to the running command
+            result = await asyncio.wait_for(
+                send_control.fn(fake_ctx, "C", preview=False), timeout=1
+            )
+            assert result == "Sent: Ctrl+C"
+
+
+
+class TestSharedServer:
+    @pytest.fixture
+    async def daemon(self, monkeypatch):
+        """The server on streamable HTTP on a free port, over a scripted shell."""
+        backend = FakeBackend(scripted_shell(), width=40, height=12)
+        connect = backend.async_connect
+        backend.connects = 0
+
+        async def counting_connect():
+            backend.connects += 1
+            return await connect()
+
+        monkeypatch.setattr(backend, "async_connect", counting_connect)
+        monkeypatch.setattr(server, "create_backend", lambda: backend)
+        http = uvicorn.Server(
+            uvicorn.Config(mcp.http_app(), host="127.0.0.1", port=0, log_level="warning")
+        )
+        serving = asyncio.create_task(http.serve())
+        while not http.started:
+            await asyncio.sleep(0.01)
+        port = http.servers[0].sockets[0].getsockname()[1]
+        yield SimpleNamespace(url=f"http://127.0.0.1:{port}/mcp", backend=backend)
+        http.should_exit = True
+        await serving
+
+    async def test_clients_share_one_connection(self, daemon):
+        async with Client(daemon.url) as first, Client(daemon.url) as second:
+            await first.call_tool("run_command", {"command": "echo one", "timeout": 5})
+            await second.call_tool("run_command", {"command": "echo two", "timeout": 5})
+            supervisor = mcp._lifespan_result
+            screen = (await second.call_tool("read_screen", {})).data
+            assert "one" in screen and "two" in screen
+        assert supervisor.backend is daemon.backend
+        assert daemon.backend.connects == 1
+
+    async def test_watchers_jobs_and_signals_are_per_client(self, daemon):
+        async with Client(daemon.url) as first, Client(daemon.url) as second:
+            added = (await first.call_tool("add_watcher", {"patterns": ["ready"]})).data
+            watcher_id = added.split(" as ")[1].split(":")[0]
+            await first.call_tool("enqueue_command", {"command": "echo ready"})
+            polled = (await first.call_tool("poll_events", {"wait": 5})).data
+            assert f"[{watcher_id}]" in polled
+
+            await first.call_tool("run_command", {"command": "echo ready", "timeout": 5})
+            other = (await second.call_tool("poll_events", {})).data
+            assert other == "No events\n\nNo active watchers"
+            assert (await second.call_tool("poll_job", {})).data == "No jobs"
+            assert "Jobs (1):" in (await first.call_tool("poll_job", {})).data
+            # The first client's new events are still queued for it
+            polled = (await first.call_tool("poll_events", {})).data
+            assert f"[{watcher_id}]" in polled
+
+            signals = (await second.call_tool("poll_signals", {})).data
+            assert signals.startswith("session_id is required on a shared server")
@@ -0,0 +1,161 @@
+"""Tests for TOML configuration loading and hot reload."""
+
+from __future__ import annotations
+
+import asyncio
+import os
+
+import pytest
+
+from iterm2_agent.config import (
+    BUNDLED_CONFIG_PATH,
+    Config,
+    ConfigError,
+    ConfigStore,
+    load_config,
+    parse_config,
+)
+from iterm2_agent.security import SecurityGuard, SecurityLevel
+
+
+def write_config(path, text: str, mtime_ns: int) -> None:
+    path.write_text(text)
+    # Explicit mtimes so back-to-back writes are always distinguishable
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+class TestLoadConfig:
+    def test_bundled_default_matches_builtin_defaults(self):
+        config = load_config(BUNDLED_CONFIG_PATH)
+        assert config.security == Config().security
+        assert config.timeouts == Config().timeouts
+        assert config.output == Config().output
+        assert config.metrics == Config().metrics
+        assert config.jobs == Config().jobs
+        assert config.watchers == Config().watchers
+        assert config.signals == Config().signals
+        assert config.server == Config().server
+
+    def test_missing_keys_use_defaults(self):
+        config = parse_config({"timeouts": {"watch": 5}})
+        assert config.timeouts.watch == 5
+        assert config.timeouts.command == 30
+        assert config.timeouts.idle_threshold == 2
+
+    def test_per_tool_timeouts(self):
+        config = parse_config({
+            "timeouts": {"command": 10, "tools": {"run_command_multi": 120}},
+        })
+        assert config.timeouts.for_tool("run_command") == 10
+        assert config.timeouts.for_tool("run_command_multi") == 120
+        assert config.timeouts.for_tool("watch_output") == 60
+
+    @pytest.mark.parametrize("data", [
+        {"security": {"allow": "make"}},
+        {"security": {"warn_on_dangerous": "yes"}},
+        {"timeouts": {"command": -1}},
+        {"timeouts": {"idle_threshold": 1.5}},
+        {"timeouts": {"tools": {"run_command": "fast"}}},
+        {"output": {"max_lines": 0}},
+        {"output": {"max_lines": 10, "head_lines": 20}},
+        {"output": {"collapse_repeats": 1}},
+        {"output": {"error_patterns": ["("]}},
+        {"metrics": {"enabled": 1}},
+        {"metrics": {"dump_format": "csv"}},
+        {"metrics": {"dump_interval": 0}},
+        {"jobs": {"max_concurrent": 0}},
+        {"jobs": {"cancel_grace": -1}},
+        {"watchers": {"max_events": 0}},
+        {"watchers": {"default_ttl": 7200}},
+        {"signals": {"identity": "a:b"}},
+        {"signals": {"max_queued": 0}},
+        {"server": {"transport": "websocket"}},
+        {"server": {"port": 70000}},
+        {"server": {"path": "mcp"}},
+        {"server": {"max_calls_per_client": 0}},
+    ])
+    def test_invalid_values_raise(self, data):
+        with pytest.raises(ConfigError):
+            parse_config(data)
+
+
+    def test_output_error_patterns(self):
+        config = parse_config({"output": {"error_patterns": ["^E "], "max_lines": 50}})
+        assert config.output.max_lines == 50
+        assert config.output.head_lines == 12
+        assert config.output.errors.search("E   assert 1 == 2")
+        assert not config.output.errors.search("error: nope")
+
+
+class TestSecurityRules:
+    def test_allow_and_deny_lists(self):
+        rules = parse_config({
+            "security": {"allow": ["make test"], "deny": ["terraform destroy"]},
+        }).security.rules
+        assert SecurityGuard.check("make test -j4", rules) == SecurityLevel.SAFE
+        assert SecurityGuard.check("make install", rules) == SecurityLevel.CAUTION
+        assert SecurityGuard.check("terraform destroy", rules) == SecurityLevel.DANGEROUS
+        # Compound commands still take the worst segment
+        assert SecurityGuard.check("make test && rm x", rules) == SecurityLevel.DANGEROUS
+
+    def test_deny_wins_over_allow(self):
+        rules = parse_config({
+            "security": {"allow": ["git"], "deny": ["git push"]},
+        }).security.rules
+        assert SecurityGuard.check("git fetch", rules) == SecurityLevel.SAFE
+        assert SecurityGuard.check("git push", rules) == SecurityLevel.DANGEROUS
+
+    def test_deny_pipeline_pattern(self):
+        rules = parse_config({"security": {"deny": ["fetch | python"]}}).security.rules
+        assert SecurityGuard.check("fetch x | python", rules) == SecurityLevel.DANGEROUS
+
+    def test_warn_on_dangerous_false_silences_dangerous_only(self):
+        security = parse_config({"security": {"warn_on_dangerous": False}}).security
+        assert security.warning("rm -rf build") == ""
+        assert "CAUTION" in security.warning("mkdir out")
+
+
+class TestConfigStore:
+    def test_reloads_on_mtime_change(self, tmp_path):
+        path = tmp_path / "config.toml"
+        write_config(path, "[timeouts]\ncommand = 10\n", 1_000_000_000)
+        store = ConfigStore(path)
+        assert store.current.timeouts.command == 10
+        assert not store.reload_if_changed()
+
+        write_config(path, "[timeouts]\ncommand = 20\n", 2_000_000_000)
+        assert store.reload_if_changed()
+        assert store.current.timeouts.command == 20
+
+    def test_invalid_edit_keeps_previous_config(self, tmp_path):
+        path = tmp_path / "config.toml"
+        write_config(path, "[security]\ndeny = ['npm']\n", 1_000_000_000)
+        store = ConfigStore(path)
+        before = store.current
+
+        write_config(path, "[security\n", 2_000_000_000)
+        assert not store.reload_if_changed()
+        assert store.current is before
+
+    def test_deleted_file_falls_back_to_defaults(self, tmp_path):
+        path = tmp_path / "config.toml"
+        write_config(path, "[timeouts]\nwatch = 5\n", 1_000_000_000)
+        store = ConfigStore(path)
+        path.unlink()
+        assert store.reload_if_changed()
+        assert store.current.timeouts.watch == 60
+
+    async def test_background_polling(self, tmp_path):
+        path = tmp_path / "config.toml"
+        write_config(path, "[timeouts]\nwatch = 5\n", 1_000_000_000)
+        store = ConfigStore(path, poll_interval=0.01)
+        store.start()
+        try:
+            write_config(path, "[timeouts]\nwatch = 7\n", 2_000_000_000)
+            for _ in range(100):
+                if store.current.timeouts.watch == 7:
+                    break
+                await asyncio.sleep(0.01)
+            assert store.current.timeouts.watch == 7
+        finally:
+            await store.async_close()
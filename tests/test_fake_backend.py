@@ -0,0 +1,186 @@
+"""End-to-end tool tests on the in-process fake backend."""
+
+from __future__ import annotations
+
+import asyncio
+import os
+
+import pytest
+
+from iterm2_agent.backend import ITerm2Backend, create_backend
+from iterm2_agent.fake_backend import FakeBackend, TerminalEmulator, scripted_shell
+from iterm2_agent.tools.manage_session import manage_session
+from iterm2_agent.tools.read_screen import read_screen
+from iterm2_agent.tools.run_command import run_command
+from iterm2_agent.tools.run_command_multi import run_command_multi
+from iterm2_agent.tools.send_control import send_control
+from iterm2_agent.tools.send_text import send_text
+from iterm2_agent.tools.watch_output import watch_output
+from tests.fakes import fake_supervisor_ctx
+
+needs_pty = pytest.mark.skipif(
+    not hasattr(os, "openpty") or not os.path.exists("/bin/sh"),
+    reason="needs a pseudo-terminal and /bin/sh",
+)
+
+
+async def wait_for_prompt(ctx, session_id: str = "") -> None:
+    """Wait until the shell has printed its first prompt."""
+    session = await ctx.request_context.lifespan_context.context.resolve_session(session_id)
+    for _ in range(500):
+        if session.last_prompt is not None:
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("shell never printed a prompt")
+
+
+@pytest.fixture
+async def pty_ctx():
+    async with fake_supervisor_ctx(FakeBackend()) as fake:
+        await wait_for_prompt(fake.ctx)
+        yield fake.ctx
+
+
+@pytest.fixture
+async def scripted_ctx():
+    async with fake_supervisor_ctx(FakeBackend(scripted_shell(), width=40, height=6)) as fake:
+        yield fake.ctx
+
+
+class TestTerminalEmulator:
+    def test_wrap_scroll_and_absolute_lines(self):
+        terminal = TerminalEmulator(width=10, height=3)
+        terminal.feed("abcdefghijKLM\r\nline2\r\nl3\r\nl4")
+        contents = terminal.screen_contents()
+        assert contents.number_of_lines_above_screen == 2
+        assert [contents.line(i).string for i in range(3)] == ["line2", "l3", "l4"]
+        assert (contents.cursor_coord.x, contents.cursor_coord.y) == (2, 2)
+        history = terminal.line_range(0, 2)
+        assert [line.string for line in history] == ["abcdefghij", "KLM"]
+        assert [line.hard_eol for line in history] == [False, True]
+
+    def test_escapes_split_across_chunks(self):
+        terminal = TerminalEmulator(width=20, height=2)
+        marks = []
+        terminal.on_osc = marks.append
+        terminal.feed("\x1b[1;3")
+        terminal.feed("1mred\x1b[0m \x1b]133;D;")
+        terminal.feed("0\x07ok\x1b(B!")
+        assert terminal.rows[0] == "red ok!"
+        assert marks == ["133;D;0"]
+
+    def test_erase_and_cursor_movement(self):
+        terminal = TerminalEmulator(width=20, height=3)
+        terminal.feed("one\r\ntwo\r\nthree\x1b[2;1H\x1b[K2\x1b[H\x1b[J")
+        assert terminal.rows == ["", "", ""]
+        terminal.feed("50%\r75%\r\x1b[Kdone")
+        assert terminal.rows[0] == "done"
+
+
+class TestScriptedShell:
+    async def test_run_command_reports_exit_status(self, scripted_ctx):
+        result = await run_command.fn(scripted_ctx, "false", timeout=5)
+        assert "Exit status: 1" in result
+
+        result = await run_command.fn(scripted_ctx, "seq 12", timeout=5)
+        # Twice the screen height, captured in full
+        assert "\n".join(str(i) for i in range(1, 13)) in result
+        assert "Exit status: 0" in result
+
+    @pytest.mark.parametrize("completion", ["auto", "idle"])
+    @pytest.mark.parametrize("count", [48, 33])
+    async def test_command_wider_than_screen(self, scripted_ctx, completion, count):
+        # With the prompt, 48 x's wrap the echoed command onto a second row
+        # of 40; 33 fill the first row exactly
+        command = "echo " + "x" * count
+        result = await run_command.fn(scripted_ctx, command, timeout=5, completion=completion)
+        lines = result.split("\n")
+        assert lines[0] == f"$ {command}"
+        output = ["x" * 40, "x" * 8] if count > 40 else ["x" * count]
+        status = ["", "Exit status: 0"] if completion == "auto" else []
+        assert lines[1:] == output + status
+
+    async def test_read_screen_since(self, scripted_ctx):
+        first = await read_screen.fn(scripted_ctx)
+        token = first.split("Token: ")[1].split("\n")[0]
+        again = await read_screen.fn(scripted_ctx, since=token)
+        assert again.endswith("(unchanged)")
+
+
+@needs_pty
+class TestPtyShell:
+    async def test_run_command(self, pty_ctx):
+        result = await run_command.fn(pty_ctx, "echo hello; false", timeout=10)
+        assert "\nhello\n" in result
+        assert "Exit status: 1" in result
+
+    async def test_send_text_and_control(self, pty_ctx):
+        await send_text.fn(pty_ctx, "sleep 30", press_enter=True)
+        result = await send_control.fn(pty_ctx, "C")
+        assert "^C" in result
+        result = await run_command.fn(pty_ctx, "echo after", timeout=10)
+        assert "after" in result
+
+    async def test_watch_output(self, pty_ctx):
+        await send_text.fn(pty_ctx, "sleep 0.2; echo server ready", press_enter=True, preview=False)
+        result = await watch_output.fn(pty_ctx, r"server ready$", timeout=10, new_output_only=True)
+        assert "Pattern matched" in result
+
+    async def test_session_lifecycle(self, pty_ctx):
+        created = await manage_session.fn(pty_ctx, "create")
+        new_id = created.rsplit(" ", 1)[1]
+        split = await manage_session.fn(pty_ctx, "split", session_id=new_id)
+        split_id = split.rsplit(" ", 1)[1]
+        await wait_for_prompt(pty_ctx, new_id)
+        await wait_for_prompt(pty_ctx, split_id)
+
+        listing = await manage_session.fn(pty_ctx, "list")
+        assert listing.startswith("Sessions (3):")
+        assert "cwd: /" in listing
+
+        multi = await run_command_multi.fn(
+            pty_ctx, "echo multi", session_ids=[new_id, split_id], timeout=10
+        )
+        assert multi.count("exit status 0") == 2
+
+        assert await manage_session.fn(pty_ctx, "focus", session_id=split_id) == (
+            f"Focused session: {split_id}"
+        )
+        await manage_session.fn(pty_ctx, "close", session_id=split_id)
+        assert (await manage_session.fn(pty_ctx, "check")).startswith(
+            "Session index consistent (2 sessions)"
+        )
+
+    async def test_shell_exit_closes_session(self, pty_ctx):
+        created = await manage_session.fn(pty_ctx, "create")
+        new_id = created.rsplit(" ", 1)[1]
+        await send_text.fn(pty_ctx, "exit", press_enter=True, session_id=new_id, preview=False)
+        for _ in range(200):
+            listing = await manage_session.fn(pty_ctx, "list")
+            if new_id not in listing:
+                break
+            await asyncio.sleep(0.01)
+        assert new_id not in listing
+
+
+class TestBackendSelection:
+    def test_default_is_iterm2(self, monkeypatch):
+        monkeypatch.delenv("ITERM2_AGENT_BACKEND", raising=False)
+        assert isinstance(create_backend(), ITerm2Backend)
+
+    def test_env_selects_fake(self, monkeypatch):
+        monkeypatch.setenv("ITERM2_AGENT_BACKEND", "fake")
+        assert isinstance(create_backend(), FakeBackend)
+
+    def test_unknown_name(self):
+        with pytest.raises(ValueError, match="Unknown backend"):
+            create_backend("nope")
+
+    async def test_reconnect_after_drop(self):
+        async with fake_supervisor_ctx(FakeBackend(scripted_shell())) as fake:
+            first = fake.supervisor.context
+            first.connection.close()
+            second = await fake.supervisor.wait_connected(timeout=5)
+            assert second is not first
+            result = await run_command.fn(fake.ctx, "echo back", timeout=5)
+            assert "back" in result
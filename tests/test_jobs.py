@@ -0,0 +1,182 @@
+"""Tests for the background job queue and its tools."""
+
+from __future__ import annotations
+
+import asyncio
+from types import SimpleNamespace
+
+from iterm2_agent.config import Config, JobsConfig
+from iterm2_agent.jobs import CANCELLED, DONE, FAILED, QUEUED, RUNNING, JobScheduler
+from iterm2_agent.tools.cancel_job import cancel_job
+from iterm2_agent.tools.enqueue_command import enqueue_command
+from iterm2_agent.tools.poll_job import poll_job
+from iterm2_agent.tools.run_command import run_command
+
+
+def scheduler(**limits) -> JobScheduler:
+    config = SimpleNamespace(current=Config(jobs=JobsConfig(**limits)))
+    return JobScheduler(config)
+
+
+class Gate:
+    """Job callbacks that block until released, recording the order."""
+
+    def __init__(self) -> None:
+        self.started: list[str] = []
+        self.interrupted: list[str] = []
+        self.release = asyncio.Event()
+
+    async def run(self, job) -> None:
+        self.started.append(job.command)
+        await self.release.wait()
+        job.output = f"ran {job.command}"
+
+    async def interrupt(self, job) -> None:
+        self.interrupted.append(job.command)
+        self.release.set()
+
+
+class TestJobScheduler:
+    async def test_fifo_per_session(self):
+        jobs, gate = scheduler(), Gate()
+        first = jobs.submit("s", "one", 5, gate.run, gate.interrupt)
+        second = jobs.submit("s", "two", 5, gate.run, gate.interrupt)
+        other = jobs.submit("t", "three", 5, gate.run, gate.interrupt)
+        await asyncio.sleep(0.01)
+        assert gate.started == ["one", "three"]
+        assert (first.state, second.state) == (RUNNING, QUEUED)
+        assert jobs.position(second) == 1
+
+        gate.release.set()
+        assert await second.wait(1)
+        assert gate.started == ["one", "three", "two"]
+        assert [job.state for job in (first, second, other)] == [DONE] * 3
+        assert second.output == "ran two"
+
+    async def test_concurrency_limit(self):
+        jobs, gate = scheduler(max_concurrent=2), Gate()
+        submitted = [jobs.submit(f"s{i}", f"c{i}", 5, gate.run, gate.interrupt) for i in range(4)]
+        await asyncio.sleep(0.01)
+        assert gate.started == ["c0", "c1"]
+        gate.release.set()
+        for job in submitted:
+            assert await job.wait(1)
+        assert sorted(gate.started) == ["c0", "c1", "c2", "c3"]
+
+    async def test_cancel_queued_and_waiting(self):
+        jobs, gate = scheduler(max_concurrent=1), Gate()
+        running = jobs.submit("s", "one", 5, gate.run, gate.interrupt)
+        queued = jobs.submit("s", "two", 5, gate.run, gate.interrupt)
+        # Popped by its worker, waiting for the one slot
+        waiting = jobs.submit("t", "three", 5, gate.run, gate.interrupt)
+        await asyncio.sleep(0.01)
+
+        await jobs.cancel(queued)
+        await jobs.cancel(waiting)
+        assert (queued.state, waiting.state) == (CANCELLED, CANCELLED)
+        assert gate.interrupted == []
+        gate.release.set()
+        assert await running.wait(1)
+        assert gate.started == ["one"]
+
+    async def test_cancel_running_interrupts(self):
+        jobs, gate = scheduler(), Gate()
+        job = jobs.submit("s", "one", 5, gate.run, gate.interrupt)
+        await asyncio.sleep(0.01)
+        await jobs.cancel(job)
+        assert gate.interrupted == ["one"]
+        assert job.state == CANCELLED
+        # It exited on its own and kept its output
+        assert job.output == "ran one"
+
+    async def test_cancel_abandons_after_grace(self):
+        jobs, gate = scheduler(cancel_grace=0.01), Gate()
+
+        async def ignore(job) -> None:
+            pass
+
+        job = jobs.submit("s", "stuck", 5, gate.run, ignore)
+        follower = jobs.submit("s", "next", 5, gate.run, ignore)
+        await asyncio.sleep(0.01)
+        await jobs.cancel(job)
+        assert job.state == CANCELLED
+        assert job.output == ""
+        gate.release.set()
+        assert await follower.wait(1)
+
+    async def test_failure_and_eviction(self):
+        jobs = scheduler(max_finished=2)
+
+        async def fail(job) -> None:
+            raise ValueError(f"bad {job.command}")
+
+        submitted = [jobs.submit("s", str(i), 5, fail, fail) for i in range(3)]
+        assert await submitted[-1].wait(1)
+        assert submitted[-1].state == FAILED
+        assert submitted[-1].error == "bad 2"
+        assert [job.id for job in jobs.jobs()] == [job.id for job in submitted[1:]]
+
+    async def test_close_cancels_everything(self):
+        jobs, gate = scheduler(), Gate()
+        running = jobs.submit("s", "one", 5, gate.run, gate.interrupt)
+        queued = jobs.submit("s", "two", 5, gate.run, gate.interrupt)
+        await asyncio.sleep(0.01)
+        await jobs.async_close()
+        assert (running.state, queued.state) == (CANCELLED, CANCELLED)
+
+
+def job_id(result: str) -> str:
+    return result.split("Queued ", 1)[1].split(" ", 1)[0]
+
+
+class TestJobTools:
+    async def test_enqueue_and_poll(self, fake_ctx):
+        first = job_id(await enqueue_command.fn(fake_ctx, "echo one", timeout=5))
+        result = await enqueue_command.fn(fake_ctx, "echo two", timeout=5)
+        assert "(1 job ahead)" in result
+        second = job_id(result)
+
+        result = await poll_job.fn(fake_ctx, second, wait=5)
+        assert result.startswith(f"{second} [done]")
+        assert "\ntwo\n" in result
+        assert result.endswith("Exit status: 0")
+        assert result.lower().count("exit status") == 1
+
+        listing = await poll_job.fn(fake_ctx)
+        assert listing.startswith("Jobs (2):")
+        assert f"{first} [done]" in listing and "exit status 0" in listing
+
+    async def test_cancel_running_sends_ctrl_c(self, fake_ctx):
+        running = job_id(await enqueue_command.fn(fake_ctx, "sleep 100", timeout=60))
+        queued = job_id(await enqueue_command.fn(fake_ctx, "echo after", timeout=5))
+        await asyncio.sleep(0.05)
+        assert f"{running} [running]" in await poll_job.fn(fake_ctx, running)
+
+        result = await cancel_job.fn(fake_ctx, running)
+        assert result.startswith(f"{running} [cancelled]")
+        assert "^C" in result
+        assert "Exit status: 130" in result
+
+        result = await poll_job.fn(fake_ctx, queued, wait=5)
+        assert "\nafter\n" in result
+        assert (await cancel_job.fn(fake_ctx, queued)).startswith("Job already finished")
+
+    async def test_timeout_interrupts(self, fake_ctx):
+        stuck = job_id(await enqueue_command.fn(fake_ctx, "sleep 100", timeout=0.2))
+        result = await poll_job.fn(fake_ctx, stuck, wait=5)
+        assert result.startswith(f"{stuck} [timed_out]")
+        assert "interrupted" in result
+        result = await run_command.fn(fake_ctx, "echo free", timeout=5)
+        assert "Exit status: 0" in result
+
+    async def test_run_command_waits_for_job(self, fake_ctx):
+        job = job_id(await enqueue_command.fn(fake_ctx, "sleep 100", timeout=60))
+        await asyncio.sleep(0.05)
+        result = await run_command.fn(fake_ctx, "echo late", timeout=0.1)
+        assert "is busy" in result
+        await cancel_job.fn(fake_ctx, job)
+
+    async def test_unknown_job(self, fake_ctx):
+        assert await poll_job.fn(fake_ctx, "job-99") == "Job not found: job-99"
+        assert await cancel_job.fn(fake_ctx, "job-99") == "Job not found: job-99"
+        assert await poll_job.fn(fake_ctx) == "No jobs"
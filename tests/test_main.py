@@ -0,0 +1,43 @@
+"""Tests for the command line entry point and transport selection."""
+
+from __future__ import annotations
+
+import pytest
+
+import iterm2_agent.__main__ as entry
+from iterm2_agent.concurrency import ClientLimitMiddleware
+
+
+@pytest.fixture
+def runs(monkeypatch, tmp_path):
+    config = tmp_path / "config.toml"
+    config.write_text('[server]\nport = 9100\nmax_calls_per_client = 3\n')
+    monkeypatch.setenv("ITERM2_AGENT_CONFIG", str(config))
+    calls = []
+    middleware = []
+    monkeypatch.setattr(entry.mcp, "run", lambda **kwargs: calls.append(kwargs))
+    monkeypatch.setattr(entry.mcp, "add_middleware", middleware.append)
+    return calls, middleware
+
+
+def test_stdio_by_default(runs):
+    calls, middleware = runs
+    entry.main([])
+    assert calls == [{"transport": "stdio"}]
+    assert middleware == []
+
+
+def test_http_daemon_from_config_and_flags(runs):
+    calls, middleware = runs
+    entry.main(["--transport", "http"])
+    assert calls == [{"transport": "http", "host": "127.0.0.1", "port": 9100, "path": "/mcp"}]
+    assert isinstance(middleware[0], ClientLimitMiddleware)
+    assert middleware[0].limiter.limit == 3
+
+    entry.main(["--transport", "sse", "--host", "::1", "--port", "9200"])
+    assert calls[-1] == {"transport": "sse", "host": "::1", "port": 9200, "path": "/mcp"}
+
+
+def test_warns_on_non_loopback_host(runs, caplog):
+    entry.main(["--transport", "http", "--host", "0.0.0.0"])
+    assert "non-loopback address 0.0.0.0" in caplog.text
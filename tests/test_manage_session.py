@@ -0,0 +1,107 @@
+"""Tests for manage_session — concurrent session listing."""
+
+from __future__ import annotations
+
+import asyncio
+from unittest.mock import MagicMock
+
+from iterm2_agent.connection import ITerm2Context
+from iterm2_agent.tools.manage_session import (
+    _collect_sessions,
+    _last_nonempty_line,
+    _list_sessions,
+)
+from tests.fakes import FakeSession, fake_app
+
+
+def make_ctx(layout) -> ITerm2Context:
+    return ITerm2Context(connection=MagicMock(), app=fake_app(layout))
+
+
+class TestListSessions:
+    async def test_structured_fields(self):
+        session = FakeSession("s1", height=30)
+        session.variables = {"path": "/srv/app", "jobName": "vim"}
+        session.write(["hello"])
+        infos = await _collect_sessions(make_ctx([[[session]]]))
+
+        assert len(infos) == 1
+        info = infos[0]
+        assert info.session_id == "s1"
+        assert info.window_id == "window-0"
+        assert info.tab_id == "0-0"
+        assert (info.columns, info.rows) == (80, 30)
+        assert info.cwd == "/srv/app"
+        assert info.job == "vim"
+        assert info.last_line == "$"
+
+    async def test_keeps_layout_order(self):
+        sessions = [FakeSession(f"s{i}") for i in range(6)]
+        layout = [[sessions[0:2], sessions[2:3]], [sessions[3:6]]]
+        infos = await _collect_sessions(make_ctx(layout), concurrency=2)
+        assert [info.session_id for info in infos] == [f"s{i}" for i in range(6)]
+        assert [info.tab_id for info in infos] == ["0-0", "0-0", "0-1", "1-0", "1-0", "1-0"]
+
+    async def test_concurrency_is_bounded(self):
+        active = 0
+        peak = 0
+
+        class SlowSession(FakeSession):
+            async def async_get_variable(self, name):
+                nonlocal active, peak
+                active += 1
+                peak = max(peak, active)
+                await asyncio.sleep(0.01)
+                active -= 1
+                return await super().async_get_variable(name)
+
+        sessions = [SlowSession(f"s{i}") for i in range(20)]
+        await _collect_sessions(make_ctx([[sessions]]), concurrency=4)
+        # Two variables are fetched concurrently per session
+        assert 2 < peak <= 8
+
+    async def test_text_listing(self):
+        session = FakeSession("s1")
+        session.write(["build finished"], prompt=False)
+        text = await _list_sessions(make_ctx([[[session]]]))
+        assert text.startswith("Sessions (1):")
+        assert "s1" in text
+        assert "build finished" in text
+        assert "cwd: /home/user" in text
+
+    async def test_no_sessions(self):
+        assert await _list_sessions(make_ctx([])) == "No sessions found."
+
+
+class TestLastLine:
+    async def test_reads_tail_not_full_screen(self):
+        session = FakeSession(height=100)
+        session.write(["output"] * 95 + ["last line"], prompt=False)
+        ctx = make_ctx([[[session]]])
+        assert await _last_nonempty_line(ctx, session) == "last line"
+        assert session.screen_reads == 0
+        assert session.range_reads == [(session.above + 92, 8)]
+
+    async def test_at_most_two_reads(self):
+        session = FakeSession(height=100)
+        session.write(["top line"], prompt=False)
+        ctx = make_ctx([[[session]]])
+        assert await _last_nonempty_line(ctx, session) == "top line"
+        # The bottom rows, then the rest of the screen at once
+        assert [count for _, count in session.range_reads] == [8, 92]
+
+    async def test_prefers_scrollback_buffer(self):
+        session = FakeSession()
+        session.write(["cached"], prompt=False)
+        ctx = make_ctx([[[session]]])
+        await ctx.scrollback.async_ingest_contents(
+            session, await session.async_get_screen_contents()
+        )
+        session.screen_reads = 0
+        assert await _last_nonempty_line(ctx, session) == "cached"
+        assert session.range_reads == []
+
+    async def test_empty_screen(self):
+        session = FakeSession(height=10, prompt="")
+        assert await _last_nonempty_line(make_ctx([[[session]]]), session) == ""
+        assert [count for _, count in session.range_reads] == [8, 2]
@@ -0,0 +1,151 @@
+"""Tests for latency and RPC instrumentation."""
+
+from __future__ import annotations
+
+import json
+
+import pytest
+from fastmcp import Client, FastMCP
+
+from iterm2_agent.config import ConfigStore
+from iterm2_agent.metrics import METRICS, Histogram, MetricsExporter, MetricsMiddleware, timed
+from iterm2_agent.tools.get_metrics import get_metrics
+from iterm2_agent.tools.run_command import run_command
+from iterm2_agent.tools.send_text import send_text
+
+
+@pytest.fixture
+def enabled():
+    METRICS.reset()
+    METRICS.enabled = True
+    yield METRICS
+    METRICS.enabled = False
+    METRICS.reset()
+
+
+# The fake supervisor on a six-row screen
+short_screen = pytest.mark.parametrize("fake", [{"height": 6}], ids=["6-rows"], indirect=True)
+
+
+def histogram(name: str, **labels: str) -> Histogram | None:
+    return METRICS.histograms.get((name, tuple(sorted(labels.items()))))
+
+
+class TestHistogram:
+    def test_quantiles_interpolate_within_buckets(self):
+        h = Histogram()
+        for _ in range(90):
+            h.observe(0.002)
+        for _ in range(10):
+            h.observe(3.0)
+        assert 0.001 < h.quantile(0.5) <= 0.0025
+        assert 2.5 < h.quantile(0.99) <= 3.0
+        assert h.count == 100
+        assert h.sum == pytest.approx(30.18)
+
+    def test_empty(self):
+        assert Histogram().quantile(0.5) == 0.0
+
+
+class TestInstrumentation:
+    @short_screen
+    async def test_disabled_records_nothing(self, fake_ctx):
+        METRICS.reset()
+        await run_command.fn(fake_ctx, "echo hi", timeout=5)
+        assert not METRICS.histograms and not METRICS.counters
+        assert "Collection is off" in await get_metrics.fn(fake_ctx)
+
+    @short_screen
+    async def test_tools_phases_and_rpcs(self, fake_ctx, enabled):
+        await run_command.fn(fake_ctx, "seq 3", timeout=5)
+        await send_text.fn(fake_ctx, "echo hi", press_enter=True)
+
+        assert histogram("tool_seconds", tool="run_command").count == 1
+        assert histogram("tool_seconds", tool="send_text").count == 1
+        assert histogram("phase_seconds", phase="prompt_wait").count == 1
+        assert histogram("phase_seconds", phase="capture").count == 1
+        assert histogram("phase_seconds", phase="settle").count == 1
+        # "seq 3\r", "echo hi", "\r"
+        assert METRICS.counters[("rpc_total", (("method", "send_text"),))] == 3
+        assert METRICS.counters[("rpc_bytes_total", (("method", "send_text"),))] == 14
+        assert METRICS.counters[("rpc_total", (("method", "get_screen_contents"),))] >= 2
+
+        report = await get_metrics.fn(fake_ctx)
+        assert report.startswith("Metrics (enabled")
+        assert "\nTools:\n  run_command " in report
+        assert "\nPhases:\n" in report
+        assert "bytes=14" in report
+
+    async def test_exceptions_count_as_errors(self, enabled):
+        @timed
+        async def broken():
+            raise RuntimeError("boom")
+
+        with pytest.raises(RuntimeError):
+            await broken()
+        assert METRICS.counters[("tool_errors_total", (("tool", "broken"),))] == 1
+        assert histogram("tool_seconds", tool="broken").count == 1
+
+    @short_screen
+    async def test_formats_and_reset(self, fake_ctx, enabled):
+        await run_command.fn(fake_ctx, "true", timeout=5)
+        data = json.loads(await get_metrics.fn(fake_ctx, output_format="json"))
+        assert {"name": "rpc_total", "labels": {"method": "send_text"}, "value": 1} in (
+            data["counters"]
+        )
+
+        text = await get_metrics.fn(fake_ctx, output_format="prometheus", reset=True)
+        assert "# TYPE iterm2_agent_tool_seconds histogram" in text
+        assert 'iterm2_agent_tool_seconds_bucket{tool="run_command",le="+Inf"} 1' in text
+        assert 'iterm2_agent_rpc_total{method="send_text"} 1' in text
+        # Only the resetting call itself, timed after it returned, remains
+        assert list(METRICS.histograms) == [("tool_seconds", (("tool", "get_metrics"),))]
+        assert not METRICS.counters
+
+        assert (await get_metrics.fn(fake_ctx, output_format="xml")).startswith("Invalid format")
+
+    async def test_middleware_times_mcp_calls(self, enabled):
+        server = FastMCP("test", middleware=[MetricsMiddleware()])
+
+        @server.tool()
+        @timed
+        async def ping() -> str:
+            return "pong"
+
+        async with Client(server) as client:
+            await client.call_tool("ping", {})
+        call = histogram("mcp_call_seconds", tool="ping")
+        assert call.count == 1
+        assert call.sum >= histogram("tool_seconds", tool="ping").sum
+
+
+class TestExporter:
+    async def test_applies_config_and_dumps(self, tmp_path):
+        dump = tmp_path / "metrics.prom"
+        config_path = tmp_path / "config.toml"
+        config_path.write_text(
+            f'[metrics]\nenabled = true\ndump_path = "{dump}"\n'
+        )
+        exporter = MetricsExporter(ConfigStore(config_path))
+        try:
+            assert METRICS.enabled
+            METRICS.inc("rpc_total", method="send_text")
+            await exporter.async_close()
+            assert 'iterm2_agent_rpc_total{method="send_text"} 1' in dump.read_text()
+        finally:
+            METRICS.enabled = False
+            METRICS.reset()
+
+    async def test_json_dump(self, tmp_path):
+        dump = tmp_path / "metrics.json"
+        config_path = tmp_path / "config.toml"
+        config_path.write_text(
+            f'[metrics]\nenabled = true\ndump_path = "{dump}"\ndump_format = "json"\n'
+        )
+        exporter = MetricsExporter(ConfigStore(config_path))
+        try:
+            await exporter.async_close()
+            assert json.loads(dump.read_text())["enabled"] is True
+        finally:
+            METRICS.enabled = False
+            METRICS.reset()
@@ -2,10 +2,15 @@
 
 from __future__ import annotations
 
+import re
+
 import pytest
 from unittest.mock import AsyncMock, MagicMock, patch
 
-from iterm2_agent.connection import ITerm2Context
+from iterm2_agent.connection import ITerm2Context, ScreenCache
+from iterm2_agent.snapshots import ScreenSnapshot, SnapshotStore, changed_ranges
+from iterm2_agent.tools.read_screen import read_screen
+from tests.fakes import FakeSession
 
 
 class TestResolveSession:
@@ -57,3 +62,94 @@ class TestResolveSession:
 
         with pytest.raises(ValueError, match="Session not found"):
             await ctx.resolve_session("nonexistent")
+
+
+def token_of(result: str) -> str:
+    return re.search(r"^Token: (\S+)$", result, re.M).group(1)
+
+
+class TestSnapshotStore:
+    def test_changed_ranges(self):
+        assert changed_ranges(["a", "b", "c"], ["a", "B", "c", "d"]) == [(1, 2), (3, 4)]
+        assert changed_ranges(["a"], ["a"]) == []
+
+    def test_lru_eviction_by_count(self):
+        store = SnapshotStore(max_snapshots=2)
+        first = store.put(ScreenSnapshot("s", ("1",)))
+        second = store.put(ScreenSnapshot("s", ("2",)))
+        store.get(first, "s")  # first is now most recently used
+        store.put(ScreenSnapshot("s", ("3",)))
+        assert store.get(first, "s") is not None
+        assert store.get(second, "s") is None
+        assert len(store) == 2
+
+    def test_line_cap(self):
+        store = SnapshotStore(max_total_lines=5)
+        store.put(ScreenSnapshot("s", ("x",) * 3))
+        token = store.put(ScreenSnapshot("s", ("y",) * 3))
+        assert len(store) == 1
+        assert store.total_lines == 3
+        assert store.get(token, "s") is not None
+
+    def test_token_is_bound_to_session(self):
+        store = SnapshotStore()
+        token = store.put(ScreenSnapshot("a", ("x",)))
+        assert store.get(token, "b") is None
+
+
+class TestReadScreenSince:
+    """The tests edit the screen without notifications, so their contexts
+    do not reuse screen reads (``ScreenCache(ttl=0)``)."""
+
+    async def test_unchanged_screen(self, session_ctx):
+        session = FakeSession()
+        ctx = session_ctx(session, screens=ScreenCache(ttl=0))
+        first = await read_screen.fn(ctx)
+        token = token_of(first)
+
+        again = await read_screen.fn(ctx, since=token)
+        assert again.endswith("---\n(unchanged)")
+        assert token_of(again) == token
+
+    async def test_returns_only_changed_lines(self, session_ctx):
+        session = FakeSession(height=24)
+        session.write([f"line {i}" for i in range(10)])
+        ctx = session_ctx(session, screens=ScreenCache(ttl=0))
+        token = token_of(await read_screen.fn(ctx))
+
+        session.history[-1] += "ls"
+        result = await read_screen.fn(ctx, since=token)
+        assert "Changed: 11" in result
+        body = result.split("---\n", 1)[1]
+        assert body == "@@ 11 @@\n$ ls"
+        assert token_of(result) != token
+
+    async def test_cleared_lines_are_reported(self, session_ctx):
+        session = FakeSession()
+        session.write([f"line {i}" for i in range(10)])
+        ctx = session_ctx(session, screens=ScreenCache(ttl=0))
+        token = token_of(await read_screen.fn(ctx))
+
+        del session.history[8:]
+        session.history.append("$ ")
+        result = await read_screen.fn(ctx, since=token)
+        assert "@@ 8 @@\n$ " in result
+        assert "@@ 9-11 cleared @@" in result
+
+    async def test_large_change_returns_full_screen(self, session_ctx):
+        session = FakeSession()
+        session.write(["a", "b", "c"])
+        ctx = session_ctx(session, screens=ScreenCache(ttl=0))
+        token = token_of(await read_screen.fn(ctx))
+
+        session.history[:] = ["x", "y", "z", "$ "]
+        result = await read_screen.fn(ctx, since=token)
+        assert "@@" not in result
+        assert result.endswith("---\nx\ny\nz\n$")
+
+    async def test_unknown_token_returns_full_screen(self, session_ctx):
+        session = FakeSession()
+        ctx = session_ctx(session, screens=ScreenCache(ttl=0))
+        result = await read_screen.fn(ctx, since="bogus")
+        assert "unknown or expired token" in result
+        assert result.endswith("---\n$")
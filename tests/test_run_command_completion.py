@@ -0,0 +1,341 @@
+"""Tests for run_command completion detection — prompt markers vs idle."""
+
+from __future__ import annotations
+
+import asyncio
+import importlib
+from types import SimpleNamespace
+
+import iterm2
+import pytest
+
+from iterm2_agent.scrollback import ScrollbackStore
+from iterm2_agent.tools.run_command import _stream_output, run_command
+from tests.fakes import FakeSession
+
+# The tools package re-exports the tool objects, shadowing the submodules
+run_command_module = importlib.import_module("iterm2_agent.tools.run_command")
+
+Mode = iterm2.PromptMonitor.Mode
+
+
+class FakeConnection:
+    """Connection stand-in that delivers prompt notifications to monitors."""
+
+    def __init__(self, shell_integration: bool = True, supports_modes: bool = True):
+        self.shell_integration = shell_integration
+        self.supports_modes = supports_modes
+        self.monitors: list[FakePromptMonitor] = []
+
+    def emit(self, mode, value) -> None:
+        for monitor in self.monitors:
+            if mode in monitor.modes:
+                monitor.queue.put_nowait((mode, value))
+
+
+class FakePromptMonitor:
+    Mode = Mode
+
+    def __init__(self, connection, session_id, modes=None):
+        if modes is None:
+            modes = [Mode.PROMPT]
+        if modes != [Mode.PROMPT] and not connection.supports_modes:
+            raise run_command_module.AppVersionTooOld("too old")
+        self.connection = connection
+        self.modes = modes
+        self.queue: asyncio.Queue = asyncio.Queue()
+
+    async def __aenter__(self):
+        self.connection.monitors.append(self)
+        return self
+
+    async def __aexit__(self, *exc):
+        self.connection.monitors.remove(self)
+
+    async def async_get(self):
+        return await self.queue.get()
+
+
+class PromptAt:
+    """Stands in for iterm2.Prompt: the prompt is the session's last line."""
+
+    def __init__(self, session: FakeSession):
+        self.session = session
+
+    @property
+    def prompt_range(self):
+        start = SimpleNamespace(x=0, y=len(self.session.history) - 1)
+        return SimpleNamespace(start=start, end=start)
+
+
+async def fake_get_last_prompt(connection, session_id):
+    return object() if connection.shell_integration else None
+
+
+def from_echo(result: str, command: str) -> list[str]:
+    """The result's lines from the command echo on, past any warning."""
+    lines = result.split("\n")
+    return lines[lines.index(f"$ {command}"):]
+
+
+@pytest.fixture
+def patched_iterm2(monkeypatch):
+    monkeypatch.setattr(iterm2, "PromptMonitor", FakePromptMonitor)
+    monkeypatch.setattr(iterm2, "async_get_last_prompt", fake_get_last_prompt)
+
+
+class PrintingSession(FakeSession):
+    """Prints ``output`` for any command, calling ``on_send`` first."""
+
+    def __init__(self, output: list[str]):
+        super().__init__(on_command=self._run)
+        self.output = output
+        self.on_send = None
+
+    def _run(self, command: str) -> list[str]:
+        if self.on_send is not None:
+            self.on_send()
+        return self.output
+
+
+class TestPromptCompletion:
+    async def test_returns_on_next_prompt_with_exit_status(self, patched_iterm2, session_ctx):
+        connection = FakeConnection()
+        session = PrintingSession(["/home/user"])
+
+        def finish():
+            connection.emit(Mode.COMMAND_END, 0)
+            connection.emit(Mode.PROMPT, PromptAt(session))
+
+        session.on_send = finish
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        ctx = session_ctx(session, connection=connection)
+        result = await run_command.fn(ctx, "pwd", timeout=5)
+        elapsed = loop.time() - start
+
+        assert elapsed < 0.5
+        assert from_echo(result, "pwd") == ["$ pwd", "/home/user", "", "Exit status: 0"]
+        assert session.sent == ["pwd\r"]
+
+    async def test_reports_nonzero_exit_status(self, patched_iterm2, session_ctx):
+        connection = FakeConnection()
+        session = PrintingSession(["ls: nope: No such file or directory"])
+
+        def finish():
+            connection.emit(Mode.COMMAND_END, 1)
+            connection.emit(Mode.PROMPT, PromptAt(session))
+
+        session.on_send = finish
+        ctx = session_ctx(session, connection=connection)
+        result = await run_command.fn(ctx, "ls nope", timeout=5)
+        assert from_echo(result, "ls nope") == [
+            "$ ls nope",
+            "ls: nope: No such file or directory",
+            "",
+            "Exit status: 1",
+        ]
+
+    async def test_waits_past_output_pauses_until_prompt(self, patched_iterm2, session_ctx):
+        connection = FakeConnection()
+        session = PrintingSession(["building..."])
+
+        async def finish_later():
+            await asyncio.sleep(0.2)
+            connection.emit(Mode.COMMAND_END, 0)
+            await asyncio.sleep(0.1)
+            connection.emit(Mode.PROMPT, PromptAt(session))
+
+        tasks = []
+        session.on_send = lambda: tasks.append(asyncio.ensure_future(finish_later()))
+        ctx = session_ctx(session, connection=connection)
+        result = await run_command.fn(ctx, "make", timeout=5)
+        await asyncio.gather(*tasks)
+        assert from_echo(result, "make") == ["$ make", "building...", "", "Exit status: 0"]
+
+    async def test_old_iterm2_uses_prompt_only(self, patched_iterm2, session_ctx):
+        connection = FakeConnection(supports_modes=False)
+        session = PrintingSession(["ok"])
+        session.on_send = lambda: connection.emit(Mode.PROMPT, PromptAt(session))
+        ctx = session_ctx(session, connection=connection)
+        result = await run_command.fn(ctx, "true", timeout=5)
+        assert from_echo(result, "true") == ["$ true", "ok"]
+
+    async def test_prompt_mode_times_out(self, patched_iterm2, session_ctx):
+        connection = FakeConnection()
+        session = PrintingSession([])
+        result = await run_command.fn(
+            session_ctx(session, connection=connection), "sleep 100", timeout=0.1
+        )
+        assert "timed out" in result
+
+
+class TestIdleFallback:
+    async def test_falls_back_without_shell_integration(self, patched_iterm2, monkeypatch, session_ctx):
+        connection = FakeConnection(shell_integration=False)
+        session = PrintingSession(["hello"])
+        called = []
+
+        async def fake_idle(iterm_ctx, sess, timeout, idle_cycles=2):
+            called.append(sess)
+            return False
+
+        monkeypatch.setattr(run_command_module, "_wait_for_idle", fake_idle)
+        result = await run_command.fn(session_ctx(session, connection=connection), "echo hello")
+        assert called == [session]
+        # No prompt position: the fresh prompt row is recognised by its text
+        assert from_echo(result, "echo hello") == ["$ echo hello", "hello"]
+
+    async def test_idle_mode_skips_prompt_detection(self, patched_iterm2, monkeypatch, session_ctx):
+        connection = FakeConnection()
+        session = PrintingSession(["hello"])
+
+        async def fake_idle(iterm_ctx, sess, timeout, idle_cycles=2):
+            return False
+
+        monkeypatch.setattr(run_command_module, "_wait_for_idle", fake_idle)
+        result = await run_command.fn(
+            session_ctx(session, connection=connection), "echo hello", completion="idle"
+        )
+        assert "Exit status" not in result
+        assert connection.monitors == []
+
+    async def test_invalid_completion_mode(self, patched_iterm2, session_ctx):
+        connection = FakeConnection()
+        session = PrintingSession([])
+        result = await run_command.fn(
+            session_ctx(session, connection=connection), "ls", completion="bogus"
+        )
+        assert "Invalid completion mode" in result
+        assert session.sent == []
+
+
+class TestOutputCapture:
+    @pytest.fixture
+    def idle(self, monkeypatch):
+        async def fake_idle(iterm_ctx, sess, timeout, idle_cycles=2):
+            return False
+
+        monkeypatch.setattr(run_command_module, "_wait_for_idle", fake_idle)
+
+    async def test_output_longer_than_screen_is_complete(self, patched_iterm2, idle, session_ctx):
+        connection = FakeConnection(shell_integration=False)
+        output = [f"row {i}" for i in range(60)]
+        session = FakeSession(height=10, on_command=lambda command: output)
+        session.write(["earlier output"])
+
+        result = await run_command.fn(
+            session_ctx(session, connection=connection), "seq 60", completion="idle", timeout=0.1
+        )
+        assert from_echo(result, "seq 60") == ["$ seq 60"] + output
+
+    async def test_output_ten_screens_long_read_in_chunks(self, patched_iterm2, idle, session_ctx):
+        connection = FakeConnection(shell_integration=False)
+        output = [f"row {i}" for i in range(240)]
+        session = FakeSession(height=24, on_command=lambda command: output)
+        session.write(["earlier output"])
+        # Keep less in memory than the output so most of it is read back
+        # from the session by absolute line number
+        scrollback = ScrollbackStore(max_lines_per_session=50, read_chunk_lines=64)
+        ctx = session_ctx(session, connection=connection, scrollback=scrollback)
+
+        result = await run_command.fn(ctx, "seq 240", completion="idle", timeout=0.1)
+
+        assert from_echo(result, "seq 240") == ["$ seq 240"] + output
+        assert session.range_reads
+        assert all(count <= 64 for _, count in session.range_reads)
+
+
+class RecordingContext(SimpleNamespace):
+    """Tool context that records progress and log notifications."""
+
+    def __init__(self, lifespan_context):
+        super().__init__(request_context=SimpleNamespace(lifespan_context=lifespan_context))
+        self.progress: list[tuple[float, str]] = []
+        self.logs: list[str] = []
+
+    async def report_progress(self, progress, total=None, message=None):
+        self.progress.append((progress, message))
+
+    async def info(self, message, logger_name=None, extra=None):
+        self.logs.append(message)
+
+
+class SlowSession(FakeSession):
+    """Starts ``job`` on the command's CR instead of printing output at once."""
+
+    def __init__(self, job, **kwargs):
+        super().__init__(**kwargs)
+        self.job = job
+        self.tasks: list[asyncio.Task] = []
+
+    async def async_send_text(self, text: str) -> None:
+        self.sent.append(text)
+        self.history[-1] += text.rstrip("\r")
+        if text.endswith("\r"):
+            self.tasks.append(asyncio.ensure_future(self.job()))
+
+
+class TestStreaming:
+    async def test_streams_coalesced_lines_and_returns_tail(self, patched_iterm2, session_ctx):
+        connection = FakeConnection()
+        output = [f"step {i}" for i in range(50)]
+
+        async def build():
+            # Five lines every 20ms, then the prompt
+            for i in range(0, len(output), 5):
+                await asyncio.sleep(0.02)
+                session.write(output[i:i + 5], prompt=False)
+            session.write([])
+            connection.emit(Mode.COMMAND_END, 0)
+            connection.emit(Mode.PROMPT, PromptAt(session))
+
+        session = SlowSession(build, height=10)
+        base = session_ctx(session, connection=connection)
+        ctx = RecordingContext(base.request_context.lifespan_context)
+        result = await run_command.fn(ctx, "make", timeout=5, stream=True)
+        await asyncio.gather(*session.tasks)
+
+        # ~0.2s of output at 4 updates/s: coalesced, not one update per write
+        assert 1 <= len(ctx.logs) <= 3
+        streamed = "\n".join(ctx.logs).split("\n")
+        assert streamed == output[:len(streamed)]
+        assert ctx.progress[-1] == (len(streamed), streamed[-1])
+
+        # The captured range ends before the fresh prompt, as without streaming
+        assert from_echo(result, "make") == [
+            "$ make",
+            "[streamed 50 lines; last 20 shown]",
+            *output[-20:],
+            "",
+            "Exit status: 0",
+        ]
+
+    async def test_one_screen_read_per_report(self):
+        session = FakeSession(height=10)
+        reports = []
+
+        async def on_output(lines, total):
+            reports.append(lines)
+
+        task = asyncio.create_task(
+            _stream_output(ScrollbackStore(), session, 0, on_output, max_rate=1000)
+        )
+        await asyncio.sleep(0)
+        for i in range(5):
+            session.write([f"line {i}"])
+            await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        assert len(reports) == 5
+        assert session.screen_reads == len(reports)
+
+    async def test_no_notifications_without_stream(self, patched_iterm2, session_ctx):
+        connection = FakeConnection()
+        session = PrintingSession(["hello"])
+        session.on_send = lambda: connection.emit(Mode.PROMPT, PromptAt(session))
+        base = session_ctx(session, connection=connection)
+        ctx = RecordingContext(base.request_context.lifespan_context)
+        result = await run_command.fn(ctx, "echo hello", timeout=5)
+        assert ctx.logs == [] and ctx.progress == []
+        assert from_echo(result, "echo hello") == ["$ echo hello", "hello"]
@@ -0,0 +1,93 @@
+"""Tests for run_command_multi — concurrent fan-out execution."""
+
+from __future__ import annotations
+
+import asyncio
+import importlib
+from types import SimpleNamespace
+
+import pytest
+
+from iterm2_agent.tools.run_command_multi import run_command_multi
+from tests.fakes import FakeSession
+
+run_command_module = importlib.import_module("iterm2_agent.tools.run_command")
+
+
+class DelayedSession(FakeSession):
+    """Finishes its command after ``delay`` seconds."""
+
+    def __init__(self, session_id: str, delay: float):
+        super().__init__(session_id, on_command=lambda command: [f"{session_id} done"])
+        self.delay = delay
+
+
+async def fake_idle(iterm_ctx, session, timeout, idle_cycles=2):
+    if session.delay > timeout:
+        await asyncio.sleep(timeout)
+        return True
+    await asyncio.sleep(session.delay)
+    return False
+
+
+@pytest.fixture(autouse=True)
+def idle(monkeypatch):
+    monkeypatch.setattr(run_command_module, "_wait_for_idle", fake_idle)
+
+
+class TestRunCommandMulti:
+    async def test_latency_close_to_slowest_session(self, session_ctx):
+        sessions = [DelayedSession(f"s{i}", delay=0.1 * (i + 1)) for i in range(3)]
+        start = asyncio.get_running_loop().time()
+        result = await run_command_multi.fn(
+            session_ctx(*sessions), "make test",
+            session_ids=["s0", "s1", "s2"], completion="idle",
+        )
+        elapsed = asyncio.get_running_loop().time() - start
+        assert elapsed < 0.45
+        for session in sessions:
+            assert session.sent == ["make test\r"]
+            assert f"{session.session_id} done" in result
+
+    async def test_independent_timeouts(self, session_ctx):
+        sessions = [DelayedSession("fast", 0.01), DelayedSession("slow", 5)]
+        result = await run_command_multi.fn(
+            session_ctx(*sessions), "ls",
+            session_ids=["fast", "slow"], timeout=0.1, completion="idle",
+        )
+        assert "=== fast ===" in result
+        assert "=== slow (⏱️ timed out after 0.1s) ===" in result
+
+    async def test_missing_session_does_not_fail_others(self, session_ctx):
+        sessions = [DelayedSession("ok", 0.01)]
+        result = await run_command_multi.fn(
+            session_ctx(*sessions), "ls", session_ids=["ok", "gone"], completion="idle",
+        )
+        assert "ok done" in result
+        assert "=== gone — error: Session not found: gone ===" in result
+
+    async def test_all_panes_in_tab(self, session_ctx):
+        sessions = [DelayedSession(f"p{i}", 0.01) for i in range(3)]
+        tab = SimpleNamespace(sessions=sessions)
+        result = await run_command_multi.fn(
+            session_ctx(*sessions, tabs={"t1": tab}), "pwd",
+            session_ids=["p1"], tab_id="t1", completion="idle",
+        )
+        assert "[3 sessions]" in result
+        assert sessions[1].sent == ["pwd\r"]
+
+    async def test_security_warning_once(self, session_ctx):
+        sessions = [DelayedSession(f"s{i}", 0.01) for i in range(2)]
+        result = await run_command_multi.fn(
+            session_ctx(*sessions), "rm -rf build",
+            session_ids=["s0", "s1"], completion="idle",
+        )
+        assert result.count("DANGEROUS") == 1
+
+    async def test_requires_targets(self, session_ctx):
+        result = await run_command_multi.fn(session_ctx(), "ls")
+        assert "No target sessions" in result
+
+    async def test_unknown_tab(self, session_ctx):
+        result = await run_command_multi.fn(session_ctx(), "ls", tab_id="nope")
+        assert result == "Tab not found: nope"
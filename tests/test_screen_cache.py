@@ -0,0 +1,106 @@
+"""Tests for the shared screen-contents cache."""
+
+from __future__ import annotations
+
+import asyncio
+from unittest.mock import MagicMock
+
+from iterm2_agent.connection import ITerm2Context, ScreenCache, get_screen_lines
+from iterm2_agent.scrollback import ScrollbackStore
+from iterm2_agent.tools.read_screen import read_screen
+from iterm2_agent.tools.send_text import send_text
+from tests.fakes import FakeSession, settle, tool_ctx
+
+
+class SlowSession(FakeSession):
+    """Screen reads take a while, so concurrent callers overlap."""
+
+    async def async_get_screen_contents(self):
+        await asyncio.sleep(0.02)
+        return await super().async_get_screen_contents()
+
+
+class TestScreenCache:
+    async def test_concurrent_reads_share_one_rpc(self):
+        session = SlowSession()
+        cache = ScreenCache()
+        results = await asyncio.gather(*(cache.async_get(session) for _ in range(5)))
+        assert session.screen_reads == 1
+        assert all(result is results[0] for result in results)
+
+    async def test_ttl_without_streamer(self):
+        session = FakeSession()
+        cache = ScreenCache(ttl=0.05)
+        await cache.async_get(session)
+        await cache.async_get(session)
+        assert session.screen_reads == 1
+
+        await asyncio.sleep(0.06)
+        await cache.async_get(session)
+        assert session.screen_reads == 2
+
+    async def test_streamer_keeps_entry_until_change(self):
+        session = FakeSession()
+        cache = ScreenCache(ttl=0)
+        scrollback = ScrollbackStore(screens=cache)
+        scrollback.attach(session)
+        await settle()
+        try:
+            reads = session.screen_reads
+            await cache.async_get(session)
+            await cache.async_get(session)
+            assert session.screen_reads == reads + 1
+
+            session.write(["new output"])
+            await settle()
+            lines, _, _ = await get_screen_lines(session, cache=cache)
+            assert "new output" in lines
+        finally:
+            await scrollback.async_close()
+
+        # No streamer any more: the TTL (zero here) applies again
+        reads = session.screen_reads
+        await cache.async_get(session)
+        assert session.screen_reads == reads + 1
+
+    async def test_invalidate_drops_read_in_flight(self):
+        session = SlowSession()
+        cache = ScreenCache()
+        pending = asyncio.ensure_future(cache.async_get(session))
+        await asyncio.sleep(0)
+        session.history[-1] += "typed"
+        cache.invalidate(session.session_id)
+
+        fresh = await cache.async_get(session)
+        await pending
+        assert session.screen_reads == 2
+        assert fresh.line(0).string == "$ typed"
+
+    async def test_cancelled_caller_does_not_cancel_shared_read(self):
+        session = SlowSession()
+        cache = ScreenCache()
+        first = asyncio.ensure_future(cache.async_get(session))
+        second = asyncio.ensure_future(cache.async_get(session))
+        await asyncio.sleep(0)
+        first.cancel()
+        contents = await second
+        assert contents.line(0).string == "$ "
+        assert session.screen_reads == 1
+
+
+class TestToolsShareReads:
+    async def test_send_text_invalidates(self):
+        session = FakeSession()
+        app = MagicMock()
+        app.current_terminal_window.current_tab.current_session = session
+        iterm_ctx = ITerm2Context(connection=MagicMock(), app=app)
+        ctx = tool_ctx(iterm_ctx)
+
+        await read_screen.fn(ctx)
+        await read_screen.fn(ctx)
+        assert session.screen_reads == 1
+
+        await send_text.fn(ctx, "ls", preview=False)
+        result = await read_screen.fn(ctx)
+        assert result.endswith("---\n$ ls")
+        assert session.screen_reads == 2
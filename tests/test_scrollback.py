@@ -0,0 +1,106 @@
+"""Tests for the per-session scrollback ring buffers."""
+
+from __future__ import annotations
+
+import asyncio
+
+from iterm2_agent.scrollback import ScrollbackStore, SessionScrollback
+from tests.fakes import FakeSession
+
+
+class TestSessionScrollback:
+    def test_update_appends_and_overwrites_screen(self):
+        buffer = SessionScrollback(max_lines=100)
+        buffer.update(0, ["a", "b", "c"])
+        buffer.update(2, ["C", "d"])
+        assert buffer.read(0, 10) == ["a", "b", "C", "d"]
+
+    def test_gap_discards_old_lines(self):
+        buffer = SessionScrollback(max_lines=100)
+        buffer.update(0, ["a", "b"])
+        buffer.update(10, ["x"])
+        assert buffer.first_line == 10
+        assert buffer.read(0, 20) == ["x"]
+
+    def test_per_session_cap_evicts_oldest(self):
+        buffer = SessionScrollback(max_lines=3)
+        buffer.update(0, ["1", "2", "3", "4", "5"])
+        assert buffer.first_line == 2
+        assert buffer.read(0, 10) == ["3", "4", "5"]
+
+    def test_read_clips_to_range(self):
+        buffer = SessionScrollback(max_lines=100)
+        buffer.update(5, ["a", "b", "c"])
+        assert buffer.read(6, 7) == ["b"]
+        assert buffer.read(0, 5) == []
+
+
+class TestScrollbackStore:
+    def test_global_cap_evicts_least_recently_updated_first(self):
+        store = ScrollbackStore(max_lines_per_session=10, max_total_lines=8)
+        store.ingest("old", 0, ["o1", "o2", "o3", "o4", "o5"])
+        store.ingest("new", 0, ["n1", "n2", "n3", "n4", "n5"])
+        assert store.total_lines == 8
+        assert store.get("old").read(0, 10) == ["o3", "o4", "o5"]
+        assert store.get("new").read(0, 10) == ["n1", "n2", "n3", "n4", "n5"]
+
+    async def test_backfills_lines_that_scrolled_off_screen(self):
+        session = FakeSession(height=4)
+        store = ScrollbackStore()
+        await store.async_ingest_contents(
+            session, await session.async_get_screen_contents()
+        )
+
+        session.write([f"line {i}" for i in range(20)])
+        await store.async_ingest_contents(
+            session, await session.async_get_screen_contents()
+        )
+
+        assert session.range_reads == [(0, session.above)]
+        assert store.get(session.session_id).read(0, 100) == session.history
+
+    async def test_read_lines_falls_back_to_range_read_for_evicted_head(self):
+        session = FakeSession(height=4)
+        session.write([f"line {i}" for i in range(20)])
+        store = ScrollbackStore(max_lines_per_session=5)
+        await store.async_ingest_contents(
+            session, await session.async_get_screen_contents()
+        )
+
+        lines = await store.async_read_lines(session, 0, len(session.history))
+        assert lines == session.history
+
+    async def test_long_ranges_are_read_in_chunks(self):
+        session = FakeSession(height=10)
+        session.write([f"line {i}" for i in range(50_000)])
+        store = ScrollbackStore(read_chunk_lines=1_000)
+
+        lines = await store.async_read_lines(session, 1, 50_001)
+        assert lines == session.history[1:50_001]
+        assert len(session.range_reads) == 50
+        assert max(count for _, count in session.range_reads) == 1_000
+
+    async def test_background_follower_tracks_writes(self):
+        session = FakeSession(height=4)
+        store = ScrollbackStore()
+        store.attach(session)
+        store.attach(session)  # idempotent
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+
+        for i in range(3):
+            session.write([f"batch {i} line {j}" for j in range(5)])
+            await asyncio.sleep(0.01)
+
+        buffer = store.get(session.session_id)
+        assert buffer.read(0, 100) == session.history
+        assert len(session.streamers) == 1
+        await store.async_close()
+        assert session.streamers == []
+
+    async def test_discard_frees_lines(self):
+        store = ScrollbackStore()
+        store.ingest("s", 0, ["a", "b"])
+        store.discard("s")
+        assert store.get("s") is None
+        assert store.total_lines == 0
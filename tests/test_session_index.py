@@ -0,0 +1,174 @@
+"""Tests for the notification-driven session index."""
+
+from __future__ import annotations
+
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import iterm2
+import pytest
+from iterm2 import api_pb2
+
+from iterm2_agent.connection import ITerm2Context
+from iterm2_agent.session_index import SessionIndex
+from iterm2_agent.tools.manage_session import _collect_sessions, manage_session
+from tests.fakes import FakeSession, fake_app
+
+
+def layout(windows: dict[str, dict[str, list[str]]]) -> api_pb2.ListSessionsResponse:
+    """Build a ListSessionsResponse from {window: {tab: [session, ...]}}."""
+    response = api_pb2.ListSessionsResponse()
+    for window_id, tabs in windows.items():
+        window = response.windows.add(window_id=window_id)
+        for tab_id, session_ids in tabs.items():
+            tab = window.tabs.add(tab_id=tab_id)
+            for session_id in session_ids:
+                link = tab.root.links.add()
+                link.session.unique_identifier = session_id
+                link.session.title = f"title of {session_id}"
+    return response
+
+
+class FakeNotifications:
+    """Captures notification subscriptions and replays iTerm2 notifications."""
+
+    def __init__(self, monkeypatch) -> None:
+        self.callbacks: dict[str, list] = {}
+        self.listing = api_pb2.ListSessionsResponse()
+        self.list_calls = 0
+        for kind in ("layout_change", "new_session", "terminate_session"):
+            monkeypatch.setattr(
+                iterm2.notifications,
+                f"async_subscribe_to_{kind}_notification",
+                self._subscriber(kind),
+            )
+        monkeypatch.setattr(iterm2.notifications, "async_unsubscribe", self._unsubscribe)
+        monkeypatch.setattr(iterm2.rpc, "async_list_sessions", self._list_sessions)
+
+    def _subscriber(self, kind):
+        async def subscribe(connection, callback):
+            self.callbacks.setdefault(kind, []).append(callback)
+            return (kind, callback)
+        return subscribe
+
+    async def _unsubscribe(self, connection, token):
+        kind, callback = token
+        self.callbacks[kind].remove(callback)
+
+    async def _list_sessions(self, connection):
+        self.list_calls += 1
+        return SimpleNamespace(list_sessions_response=self.listing)
+
+    async def emit(self, kind: str, notification) -> None:
+        for callback in list(self.callbacks.get(kind, [])):
+            await callback(None, notification)
+
+    async def layout_changed(self, windows) -> None:
+        self.listing = layout(windows)
+        await self.emit(
+            "layout_change",
+            api_pb2.LayoutChangedNotification(list_sessions_response=self.listing),
+        )
+
+
+@pytest.fixture
+def notifications(monkeypatch):
+    return FakeNotifications(monkeypatch)
+
+
+@pytest.fixture
+async def index(notifications):
+    index = SessionIndex()
+    app = fake_app([[[FakeSession("a"), FakeSession("b")]]])
+    await index.async_start(None, app)
+    yield index
+    await index.async_stop()
+
+
+def locations(index: SessionIndex) -> list[tuple[str, str, str]]:
+    return [(e.session_id, e.window_id, e.tab_id) for e in index.entries()]
+
+
+class TestSessionIndex:
+    async def test_seeded_from_app(self, index):
+        assert index.active
+        assert locations(index) == [("a", "window-0", "0-0"), ("b", "window-0", "0-0")]
+
+    async def test_layout_change_rebuilds(self, index, notifications):
+        await notifications.layout_changed({"w1": {"t1": ["a"], "t2": ["c"]}})
+        assert locations(index) == [("a", "w1", "t1"), ("c", "w1", "t2")]
+        assert index.get("c").title == "title of c"
+        assert index.get("b") is None
+
+    async def test_terminate_removes(self, index, notifications):
+        await notifications.emit(
+            "terminate_session", api_pb2.TerminateSessionNotification(session_id="a")
+        )
+        assert index.get("a") is None
+        assert index.get("b") is not None
+
+    async def test_new_session_resyncs_only_when_unknown(self, index, notifications):
+        notifications.listing = layout({"window-0": {"0-0": ["a", "b", "n"]}})
+        await notifications.emit(
+            "new_session", api_pb2.NewSessionNotification(session_id="n")
+        )
+        assert index.get("n").tab_id == "0-0"
+        assert notifications.list_calls == 1
+
+        await notifications.emit(
+            "new_session", api_pb2.NewSessionNotification(session_id="n")
+        )
+        assert notifications.list_calls == 1
+
+    async def test_cwd_survives_layout_changes(self, index, notifications):
+        index.record_cwd("a", "/src")
+        await notifications.layout_changed({"w1": {"t1": ["a"]}})
+        assert index.get("a").cwd == "/src"
+
+    async def test_check_reports_and_repairs_drift(self, index, notifications):
+        notifications.listing = layout({"window-0": {"0-1": ["a"], "0-0": ["c"]}})
+        problems = await index.async_check()
+        assert sorted(problems) == [
+            "missing: c",
+            "moved: a indexed in window window-0 tab 0-0, actually window window-0 tab 0-1",
+            "stale: b",
+        ]
+        assert await index.async_check() == []
+
+    async def test_stop_unsubscribes(self, notifications):
+        index = SessionIndex()
+        await index.async_start(None, fake_app([]))
+        await index.async_stop()
+        assert not index.active
+        assert all(not callbacks for callbacks in notifications.callbacks.values())
+
+
+class TestResolution:
+    async def test_resolve_uses_index(self, index):
+        app = MagicMock()
+        ctx = ITerm2Context(connection=MagicMock(), app=app, sessions=index)
+        session = await ctx.resolve_session("b")
+        assert session.session_id == "b"
+        app.get_session_by_id.assert_not_called()
+
+    async def test_resolve_unknown_id_raises(self, index):
+        ctx = ITerm2Context(connection=MagicMock(), app=MagicMock(), sessions=index)
+        with pytest.raises(ValueError, match="Session not found"):
+            await ctx.resolve_session("zzz")
+
+    async def test_list_follows_index(self, index, notifications):
+        ctx = ITerm2Context(connection=MagicMock(), app=fake_app([]), sessions=index)
+        await notifications.layout_changed({"w9": {"t9": ["a"]}})
+        # Real session objects from the notification have no RPC stand-in,
+        # so swap in fakes at the same locations
+        index.add(FakeSession("a"), "w9", "t9")
+        infos = await _collect_sessions(ctx)
+        assert [(i.session_id, i.window_id, i.tab_id) for i in infos] == [("a", "w9", "t9")]
+        assert index.get("a").cwd == "/home/user"
+
+    async def test_check_action(self, index, notifications):
+        notifications.listing = layout({"window-0": {"0-0": ["a", "b"]}})
+        ctx = ITerm2Context(connection=MagicMock(), app=MagicMock(), sessions=index)
+        tool_ctx = SimpleNamespace(request_context=SimpleNamespace(lifespan_context=ctx))
+        result = await manage_session.fn(tool_ctx, "check")
+        assert result == "Session index consistent (2 sessions)."
@@ -0,0 +1,87 @@
+"""Tests for wait_for_settle and the send_text/send_control previews."""
+
+from __future__ import annotations
+
+import asyncio
+
+from iterm2_agent.connection import wait_for_settle
+from iterm2_agent.tools.send_control import send_control
+from iterm2_agent.tools.send_text import send_text
+from tests.fakes import FakeSession
+
+
+def elapsed_since(start: float) -> float:
+    return asyncio.get_running_loop().time() - start
+
+
+class TestWaitForSettle:
+    async def test_returns_soon_after_screen_reacts(self):
+        session = FakeSession()
+        start = asyncio.get_running_loop().time()
+        async with wait_for_settle(session, quiet=0.02, max_wait=1.0):
+            await session.async_send_text("x")
+        assert elapsed_since(start) < 0.2
+
+    async def test_waits_for_burst_to_finish(self):
+        session = FakeSession()
+
+        async def burst():
+            for i in range(5):
+                await asyncio.sleep(0.01)
+                session.write([f"line {i}"], prompt=False)
+
+        start = asyncio.get_running_loop().time()
+        async with wait_for_settle(session, quiet=0.05, max_wait=1.0):
+            task = asyncio.ensure_future(burst())
+            await session.async_send_text("x")
+        assert task.done()
+        assert elapsed_since(start) < 0.5
+
+    async def test_gives_up_after_max_wait_without_reaction(self):
+        session = FakeSession()
+        start = asyncio.get_running_loop().time()
+        async with wait_for_settle(session, quiet=0.01, max_wait=0.1):
+            pass
+        assert 0.09 <= elapsed_since(start) < 0.3
+
+    async def test_max_wait_caps_continuous_output(self):
+        session = FakeSession()
+        stop = asyncio.Event()
+
+        async def chatter():
+            while not stop.is_set():
+                await asyncio.sleep(0.005)
+                session.write(["tick"], prompt=False)
+
+        task = asyncio.ensure_future(chatter())
+        start = asyncio.get_running_loop().time()
+        async with wait_for_settle(session, quiet=0.05, max_wait=0.15):
+            pass
+        stop.set()
+        await task
+        assert elapsed_since(start) < 0.3
+        assert session.streamers == []
+
+
+class TestToolPreviews:
+    async def test_send_text_without_preview_skips_screen(self, session_ctx):
+        session = FakeSession()
+        result = await send_text.fn(session_ctx(session), "hello", preview=False)
+        assert result == "Text sent (no Enter): 'hello'"
+        assert session.screen_reads == 0
+        assert session.streamers == []
+
+    async def test_send_text_preview_is_fast(self, session_ctx):
+        session = FakeSession(on_command=lambda command: ["hi there"])
+        start = asyncio.get_running_loop().time()
+        result = await send_text.fn(session_ctx(session), "echo hi there", press_enter=True)
+        assert elapsed_since(start) < 0.3
+        assert session.sent == ["echo hi there", "\r"]
+        assert "hi there" in result.split("Screen (last lines):")[1]
+
+    async def test_send_control_without_preview(self, session_ctx):
+        session = FakeSession()
+        result = await send_control.fn(session_ctx(session), "c", preview=False)
+        assert result == "Sent: Ctrl+C"
+        assert session.sent == ["\x03"]
+        assert session.screen_reads == 0
@@ -0,0 +1,84 @@
+"""Tests for the output shaping stage."""
+
+from __future__ import annotations
+
+import tracemalloc
+
+from iterm2_agent.shaping import OutputConfig, OutputShaper, normalize_line, shape_output
+
+
+class TestNormalizeLine:
+    def test_strips_ansi_and_controls(self):
+        line = "\x1b[1;31mFAILED\x1b[0m test_x\x07 \x1b]0;title\x07"
+        assert normalize_line(line) == "FAILED test_x"
+
+    def test_carriage_return_keeps_last_frame(self):
+        assert normalize_line("  10%\r  55%\r 100% done\r") == " 100% done"
+
+    def test_tabs_and_trailing_whitespace(self):
+        assert normalize_line("a\tb   ") == "a       b"
+
+    def test_long_line_is_cut(self):
+        assert normalize_line("x" * 30, max_length=10) == "x" * 10 + "… [+20 chars]"
+
+
+class TestShapeOutput:
+    def test_small_output_unchanged(self):
+        lines = ["one", "two", "three"]
+        assert shape_output(lines) == "one\ntwo\nthree"
+
+    def test_collapses_repeated_lines(self):
+        lines = ["start"] + ["⠋ waiting"] * 50 + ["done", "x", "x"]
+        assert shape_output(lines) == (
+            "start\n⠋ waiting\n[previous line repeated 49 more times]\ndone\nx\nx"
+        )
+
+    def test_collapse_disabled(self):
+        config = OutputConfig(collapse_repeats=0)
+        assert shape_output(["a"] * 5, config) == "\n".join(["a"] * 5)
+
+    def test_line_budget_keeps_head_and_tail(self):
+        config = OutputConfig(max_lines=10, head_lines=4)
+        lines = [f"line {i}" for i in range(1, 101)]
+        shaped = shape_output(lines, config).split("\n")
+        assert shaped[:4] == lines[:4]
+        assert shaped[4] == "[… 90 lines omitted …]"
+        assert shaped[5:] == lines[-6:]
+
+    def test_byte_budget(self):
+        config = OutputConfig(max_lines=1000, head_lines=500, max_bytes=1000)
+        shaped = shape_output((f"{i:0>99}" for i in range(100)), config)
+        assert len(shaped.encode()) <= 1100
+        assert "lines omitted" in shaped
+
+    def test_errors_from_omitted_middle_are_listed(self):
+        config = OutputConfig(max_lines=6, head_lines=3, max_error_lines=2)
+        lines = [f"ok {i}" for i in range(1, 101)]
+        lines[39] = "src/a.c:12: error: expected ';'"
+        lines[59] = "FAILED tests/test_b.py::test_b"
+        lines[79] = "Traceback (most recent call last):"
+        lines[98] = "error in the tail"
+        shaped = shape_output(lines, config).split("\n")
+        assert shaped[3] == "[… 94 lines omitted; 3 matched error patterns, first 2 shown …]"
+        assert shaped[4:6] == ["40: src/a.c:12: error: expected ';'", "60: FAILED tests/test_b.py::test_b"]
+        assert shaped[6] == "[…]"
+        assert shaped[7:] == lines[-3:]
+
+    def test_trailing_blank_lines_dropped(self):
+        assert shape_output(["a", "", "  ", ""]) == "a"
+        assert shape_output(["a", "", "", "", "b"]) == (
+            "a\n\n[previous line repeated 2 more times]\nb"
+        )
+
+    def test_memory_bounded_by_budget(self):
+        config = OutputConfig(max_lines=100, head_lines=50)
+        tracemalloc.start()
+        try:
+            shaper = OutputShaper(config)
+            for i in range(50_000):
+                shaper.feed(f"line {i} " + "z" * 40)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        assert peak < 1_000_000
+        assert "49999" in shaper.result()
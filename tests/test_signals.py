@@ -0,0 +1,159 @@
+"""Tests for the custom control sequence signal channel."""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import re
+import shutil
+import subprocess
+from types import SimpleNamespace
+
+import pytest
+
+from iterm2_agent.config import SignalsConfig
+from iterm2_agent.fake_backend import FakeBackend, scripted_shell
+from iterm2_agent.signals import SignalHub, parse_signal, signal_command
+from iterm2_agent.tools.poll_signals import poll_signals
+from iterm2_agent.tools.run_command import _with_done_signal, run_command
+from iterm2_agent.tools.watch_output import watch_output
+from tests.fakes import fake_supervisor_ctx, settle
+
+needs_pty = pytest.mark.skipif(
+    not hasattr(os, "openpty") or not os.path.exists("/bin/sh"),
+    reason="needs a pseudo-terminal and /bin/sh",
+)
+
+
+def sequence(payload: str, identity: str = "iterm2-agent") -> str:
+    return f"\x1b]1337;Custom=id={identity}:{payload}\x07"
+
+
+def signalling_script():
+    """Scripted shell that runs 'echo' and performs the done-signal printf.
+
+    Signal mode types ``{ command`` and ``}; printf ...`` as two lines;
+    the printf reports the status of the line before.
+    """
+    last = 0
+
+    def handler(command: str):
+        nonlocal last
+        if command.startswith("}; printf "):
+            token = re.search(r"id=(\S+)\"", command).group(1)
+            return sequence(f"done exit={last} id={token}"), last
+        name, _, rest = command.removeprefix("{ ").partition(" ")
+        output, last = (rest, 0) if name == "echo" else ("", 2)
+        return output, last
+
+    return handler
+
+
+class TestParsing:
+    def test_name_fields_and_args(self):
+        signal = parse_signal("s1", 'done exit=0 msg="two words" extra')
+        assert signal.name == "done"
+        assert dict(signal.fields) == {"exit": "0", "msg": "two words"}
+        assert signal.args == ("extra",)
+        assert signal.payload == 'done exit=0 msg="two words" extra'
+
+    def test_unbalanced_quotes_and_no_name(self):
+        assert parse_signal("s1", 'note "half').args == ('"half',)
+        signal = parse_signal("s1", "exit=1")
+        assert signal.name == "" and signal.fields["exit"] == "1"
+
+    def test_signal_command_quotes_identity(self):
+        assert signal_command("a b", "done exit=$?") == (
+            "printf '\\033]1337;Custom=id=%s:%s\\a' 'a b' \"done exit=$?\""
+        )
+
+    @pytest.mark.parametrize("shell", [name for name in ("sh", "bash") if shutil.which(name)])
+    @pytest.mark.parametrize(
+        "command, status",
+        [("echo hi", 0), ("echo hi;", 0), ("make_it # build", 127), ("true &", 0), ("false", 1)],
+    )
+    def test_done_signal_follows_any_command(self, shell, command, status):
+        typed = _with_done_signal(command, "iterm2-agent", "cmd-1")
+        result = subprocess.run([shell, "-c", typed], capture_output=True, text=True)
+        assert result.stdout.endswith(sequence(f"done exit={status} id=cmd-1"))
+
+
+class TestHub:
+    async def test_identity_filter_and_queue_cap(self):
+        hub = SignalHub(SimpleNamespace(current=SimpleNamespace(signals=SignalsConfig(max_queued=2))))
+        await hub._on_sequence("s1", "someone-else", "done")
+        for n in range(3):
+            await hub._on_sequence("s1", "iterm2-agent", f"step n={n}")
+        assert [s.fields["n"] for s in hub.take()] == ["1", "2"]
+        assert hub.dropped == 1
+        assert hub.take() == []
+
+    async def test_waiter_gets_signal_before_queue(self):
+        hub = SignalHub()
+        with hub.expect("s1", lambda s: s.name == "done") as future:
+            hub.deliver(parse_signal("s2", "done"))
+            hub.deliver(parse_signal("s1", "progress"))
+            hub.deliver(parse_signal("s1", "done"))
+            assert (await future).session_id == "s1"
+        assert [(s.session_id, s.name) for s in hub.take()] == [("s2", "done"), ("s1", "progress")]
+
+
+class TestTools:
+    async def test_poll_signals_from_session_output(self, fake):
+        session = fake.backend.app.sessions()[0]
+        assert (await poll_signals.fn(fake.ctx)).startswith("No signals. Programs can send one with:")
+
+        async def later():
+            await asyncio.sleep(0.05)
+            session.output(sequence("done exit=0 id=build") + sequence("x", identity="other"))
+
+        task = asyncio.ensure_future(later())
+        result = await poll_signals.fn(fake.ctx, wait=2)
+        await task
+        assert result.startswith("Signals (1):")
+        assert f"{session.session_id} " in result and "done exit=0 id=build" in result
+        # Nothing is drawn on screen
+        contents = session.terminal.screen_contents()
+        screen = [contents.line(i).string for i in range(contents.number_of_lines)]
+        assert "Custom" not in "\n".join(screen)
+
+    async def test_watch_output_signal_source(self, fake):
+        session = fake.backend.app.sessions()[0]
+        session.output(sequence("ready port=8000"))
+        await settle()
+        result = await watch_output.fn(fake.ctx, "^ready", source="signal", timeout=1)
+        assert result == "Signal matched: '^ready'\nready port=8000"
+
+        # Already-queued signals are skipped with new_output_only
+        session.output(sequence("ready port=9000"))
+        await settle()
+        result = await watch_output.fn(
+            fake.ctx, "^ready", source="signal", timeout=0.1, new_output_only=True
+        )
+        assert result.startswith("⏱️ Timed out after 0.1s waiting for a signal")
+        assert "Invalid source" in await watch_output.fn(fake.ctx, "x", source="log")
+
+    async def test_run_command_signal_completion(self):
+        backend = FakeBackend(scripted_shell(signalling_script()), width=40, height=6)
+        async with fake_supervisor_ctx(backend) as fake:
+            result = await run_command.fn(fake.ctx, "echo hi", completion="signal", timeout=2)
+            assert "hi" in result and "printf" not in result
+            assert "Exit status: 0" in result
+            result = await run_command.fn(fake.ctx, "nope", completion="signal", timeout=2)
+            assert "Exit status: 2" in result
+            # The done signal was consumed, not queued
+            assert fake.supervisor.context.signals.take() == []
+
+
+@needs_pty
+async def test_run_command_signal_completion_in_sh():
+    async with fake_supervisor_ctx(FakeBackend()) as fake:
+        ctx = fake.ctx
+        result = await run_command.fn(ctx, "echo hello; false", completion="signal", timeout=10)
+        assert "hello" in result and "Exit status: 1" in result
+        # A trailing separator or comment must not break the printf
+        result = await run_command.fn(ctx, "echo one;", completion="signal", timeout=10)
+        assert "one" in result and "Exit status: 0" in result
+        result = await run_command.fn(ctx, "echo two # note", completion="signal", timeout=10)
+        assert "two" in result and "Exit status: 0" in result
+        assert "printf" not in result
@@ -0,0 +1,42 @@
+"""Cold-start budget for the stdio server, measured by benchmarks/bench_startup.py."""
+
+from __future__ import annotations
+
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+BENCHMARK = Path(__file__).resolve().parents[1] / "benchmarks" / "bench_startup.py"
+# Seconds from spawn to the first tool result. Generous: interpreter start
+# and the fastmcp import dominate and vary with the machine.
+BUDGET = 15.0
+CONNECT_LATENCY = 1.0
+
+
+@pytest.mark.skipif(
+    not hasattr(os, "openpty") or not os.path.exists("/bin/sh"),
+    reason="the fake backend needs a pseudo-terminal and /bin/sh",
+)
+def test_cold_start_within_budget(tmp_path):
+    output = tmp_path / "startup.json"
+    result = subprocess.run(
+        [
+            sys.executable, str(BENCHMARK),
+            "--runs", "1",
+            "--connect-latency", str(CONNECT_LATENCY),
+            "--budget", str(BUDGET),
+            "--output", str(output),
+        ],
+        capture_output=True,
+        text=True,
+        timeout=BUDGET * 2,
+    )
+    assert result.returncode == 0, result.stdout + result.stderr
+    phases = json.loads(output.read_text())
+    # The handshake does not wait for iTerm2; the first call does
+    waited = phases["first_call"]["p50_ms"] - phases["initialize"]["p50_ms"]
+    assert waited >= CONNECT_LATENCY * 1000 * 0.5
@@ -0,0 +1,268 @@
+"""Tests for the connection supervisor against a stand-in iTerm2 websocket."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from unittest.mock import MagicMock
+
+import iterm2.connection
+import pytest
+from iterm2 import api_pb2
+from websockets.asyncio.server import serve
+
+from iterm2_agent.connection import ConnectionLostError, ITerm2Context, NotConnectedError
+from iterm2_agent.fake_backend import FakeBackend, scripted_shell
+from iterm2_agent.supervisor import ConnectionSupervisor, ConnectMiddleware, get_iterm_context
+from tests.fakes import FakeSession
+
+
+class StandInITerm2:
+    """A websocket server speaking just enough of the iTerm2 API.
+
+    Every request gets an empty response of the matching type, except the
+    kinds listed in ``unanswered``. The layout is a single window with one
+    session, ``session-1``. :meth:`kill` drops every connection like an
+    iTerm2 restart; :meth:`start` brings the server back on the same port.
+    """
+
+    def __init__(self) -> None:
+        self.port = 0
+        self.unanswered: set[str] = set()
+        self.requests: list[str] = []
+        self._server = None
+
+    async def start(self) -> None:
+        self._server = await serve(
+            self._handle, "127.0.0.1", self.port, subprotocols=["api.iterm2.com"]
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def kill(self) -> None:
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _handle(self, websocket) -> None:
+        async for data in websocket:
+            request = api_pb2.ClientOriginatedMessage()
+            request.ParseFromString(data)
+            kind = request.WhichOneof("submessage")
+            self.requests.append(kind)
+            if kind in self.unanswered:
+                continue
+            response = api_pb2.ServerOriginatedMessage(id=request.id)
+            field = kind.replace("_request", "_response")
+            getattr(response, field).SetInParent()
+            if kind == "list_sessions_request":
+                window = response.list_sessions_response.windows.add(window_id="window-1")
+                tab = window.tabs.add(tab_id="1")
+                link = tab.root.links.add()
+                link.session.unique_identifier = "session-1"
+            await websocket.send(response.SerializeToString())
+
+
+@pytest.fixture
+async def stand_in(monkeypatch):
+    server = StandInITerm2()
+    await server.start()
+    # Point the real iterm2 client at the stand-in, skipping AppleScript auth
+    monkeypatch.setattr(iterm2.connection, "_uri", lambda: f"ws://127.0.0.1:{server.port}")
+    monkeypatch.setenv("ITERM2_COOKIE", "test-cookie")
+    yield server
+    await server.kill()
+
+
+@pytest.fixture
+async def supervisor(stand_in):
+    supervisor = ConnectionSupervisor(initial_backoff=0.01, max_backoff=0.05)
+    yield supervisor
+    await supervisor.async_close()
+
+
+async def wait_until(predicate, timeout: float = 5.0) -> None:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        assert asyncio.get_running_loop().time() < deadline, "condition not reached"
+        await asyncio.sleep(0.01)
+
+
+def tool_ctx(state):
+    return MagicMock(request_context=MagicMock(lifespan_context=state))
+
+
+class TestConnectionSupervisor:
+    async def test_reconnects_after_restart(self, stand_in, supervisor):
+        first = await supervisor.async_start()
+        assert get_iterm_context(tool_ctx(supervisor)) is first
+        assert first.app.get_session_by_id("session-1") is not None
+
+        await stand_in.kill()
+        await wait_until(lambda: not supervisor.connected)
+        assert first.lost.is_set()
+        with pytest.raises(ConnectionLostError):
+            get_iterm_context(tool_ctx(supervisor))
+
+        await stand_in.start()
+        second = await supervisor.wait_connected(timeout=5)
+        assert second is not first
+        assert second.connection is not first.connection
+        assert second.app.get_session_by_id("session-1") is not None
+        # Configuration and snapshots carry over to the new context
+        assert second.config is first.config
+        assert second.snapshots is first.snapshots
+        assert supervisor.reconnects == 1
+
+    async def test_in_flight_request_fails_fast(self, stand_in, supervisor):
+        context = await supervisor.async_start()
+        session = context.app.get_session_by_id("session-1")
+        stand_in.unanswered.add("get_buffer_request")
+
+        pending = asyncio.ensure_future(session.async_get_screen_contents())
+        await wait_until(lambda: "get_buffer_request" in stand_in.requests)
+        await stand_in.kill()
+
+        with pytest.raises(ConnectionLostError):
+            await asyncio.wait_for(pending, timeout=2)
+
+    async def test_followed_sessions_are_reattached(self, stand_in, supervisor):
+        first = await supervisor.async_start()
+        first.scrollback.attach(first.app.get_session_by_id("session-1"))
+        assert first.scrollback.followed() == ["session-1"]
+
+        await stand_in.kill()
+        await wait_until(lambda: not supervisor.connected)
+        await stand_in.start()
+        second = await supervisor.wait_connected(timeout=5)
+        assert second.scrollback.followed() == ["session-1"]
+        assert first.scrollback.followed() == []
+
+    async def test_background_start_before_iterm2_is_up(self, stand_in):
+        await stand_in.kill()
+        supervisor = ConnectionSupervisor(initial_backoff=0.01, max_backoff=0.05)
+        supervisor.start()
+        try:
+            await wait_until(lambda: supervisor.last_error is not None)
+            with pytest.raises(NotConnectedError, match="Not connected to iTerm2 yet"):
+                get_iterm_context(tool_ctx(supervisor))
+
+            # A tool call made meanwhile is held until the connection is up
+            async def call_next(_):
+                return get_iterm_context(tool_ctx(supervisor))
+
+            middleware_ctx = MagicMock(fastmcp_context=tool_ctx(supervisor))
+            call = asyncio.ensure_future(ConnectMiddleware().on_call_tool(middleware_ctx, call_next))
+            await asyncio.sleep(0.05)
+            assert not call.done()
+            await stand_in.start()
+            context = await asyncio.wait_for(call, timeout=5)
+            assert context.app.get_session_by_id("session-1") is not None
+            assert not supervisor.connecting
+        finally:
+            await supervisor.async_close()
+
+    async def test_held_call_gives_up_after_connect_wait(self, stand_in):
+        await stand_in.kill()
+        supervisor = ConnectionSupervisor(initial_backoff=0.01, connect_wait=0.05)
+        supervisor.start()
+
+        async def call_next(_):
+            return get_iterm_context(tool_ctx(supervisor))
+
+        try:
+            middleware_ctx = MagicMock(fastmcp_context=tool_ctx(supervisor))
+            with pytest.raises(NotConnectedError):
+                await ConnectMiddleware().on_call_tool(middleware_ctx, call_next)
+        finally:
+            await supervisor.async_close()
+
+    async def test_bare_context_passes_through(self):
+        context = ITerm2Context(connection=MagicMock(), app=MagicMock())
+        assert get_iterm_context(tool_ctx(context)) is context
+
+
+class FlakyBackend(FakeBackend):
+    """Fails the terminate-session subscription of the next ``failures`` connects."""
+
+    def __init__(self) -> None:
+        super().__init__(scripted_shell())
+        self.failures = 0
+        self.connections: list = []
+        self.subscribed: set = set()
+
+    async def async_connect(self):
+        connection, app = await super().async_connect()
+        self.connections.append(connection)
+        return connection, app
+
+    async def async_subscribe_layout(self, connection, callback):
+        token = await super().async_subscribe_layout(connection, callback)
+        self.subscribed.add(token)
+        return token
+
+    async def async_subscribe_terminate_session(self, connection, callback):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("subscription refused")
+        return await super().async_subscribe_terminate_session(connection, callback)
+
+    async def async_unsubscribe(self, connection, token):
+        self.subscribed.discard(token)
+        await super().async_unsubscribe(connection, token)
+
+
+class TestHalfOpenConnections:
+    async def test_connecting_after_failures_is_logged(self, caplog):
+        backend = FlakyBackend()
+        backend.failures = 2
+        supervisor = ConnectionSupervisor(backend, initial_backoff=0.01)
+        supervisor.start()
+        try:
+            with caplog.at_level(logging.WARNING, logger="iterm2_agent.supervisor"):
+                await supervisor.wait_connected(timeout=5)
+                await asyncio.sleep(0)
+            assert "Connected to iTerm2 after 2 failed attempts" in caplog.messages
+            assert supervisor.attempts == 0
+        finally:
+            await supervisor.async_close()
+
+    async def test_failed_setup_is_undone_before_retrying(self):
+        backend = FlakyBackend()
+        backend.failures = 1
+        supervisor = ConnectionSupervisor(backend, initial_backoff=0.01)
+        supervisor.start()
+        try:
+            context = await supervisor.wait_connected(timeout=5)
+            first, second = backend.connections
+            assert first.closed.is_set() and not second.closed.is_set()
+            # Only the live connection's layout subscription is left
+            assert len(backend.subscribed) == 1
+            assert context.sessions.active
+
+            # The same holds for a reconnect after a drop
+            backend.failures = 1
+            second.close()
+            await wait_until(lambda: len(backend.connections) == 4 and supervisor.connected)
+            assert backend.connections[2].closed.is_set()
+            assert len(backend.subscribed) == 1
+        finally:
+            await supervisor.async_close()
+
+
+class TestWaitFor:
+    async def test_lost_connection_interrupts_wait(self):
+        context = ITerm2Context(connection=MagicMock(), app=MagicMock())
+        never = asyncio.get_running_loop().create_future()
+        asyncio.get_running_loop().call_later(0.01, context.lost.set)
+        with pytest.raises(ConnectionLostError):
+            await context.wait_for(never, timeout=10)
+        assert never.cancelled()
+
+    async def test_timeout_and_result(self):
+        context = ITerm2Context(connection=MagicMock(), app=MagicMock())
+        session = FakeSession()
+        async with session.get_screen_streamer() as streamer:
+            with pytest.raises(asyncio.TimeoutError):
+                await context.wait_for(streamer.async_get(), timeout=0.01)
+            asyncio.get_running_loop().call_later(0.01, session.write, ["x"])
+            contents = await context.wait_for(streamer.async_get(), timeout=1)
+        assert contents.number_of_lines == session.height
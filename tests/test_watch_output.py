@@ -0,0 +1,84 @@
+"""Tests for watch_output — incremental line matching."""
+
+from __future__ import annotations
+
+import asyncio
+import re
+
+from iterm2_agent.tools.watch_output import LineMatcher, watch_output
+from tests.fakes import FakeSession
+
+
+class TestLineMatcher:
+    def test_scans_each_line_once(self):
+        matcher = LineMatcher(re.compile("ERROR"))
+        assert matcher.feed(0, ["ok", "ERROR 1"], 0) == ["ERROR 1"]
+        assert matcher.feed(0, ["ok", "ERROR 1", "ERROR 2"], 0) == ["ERROR 2"]
+        assert matcher.scanned == 3
+
+    def test_rescans_changed_screen_lines(self):
+        matcher = LineMatcher(re.compile("done"))
+        assert matcher.feed(0, ["building"], 0) == []
+        assert matcher.feed(0, ["building... done"], 0) == ["building... done"]
+
+    def test_history_before_cursor_is_not_rescanned(self):
+        matcher = LineMatcher(re.compile("x"))
+        matcher.feed(0, ["x1", "x2", "x3"], 0)
+        # Screen scrolled by two lines; lines 0-1 are now history
+        assert matcher.feed(0, ["x1", "x2", "x3", "x4"], 2) == ["x4"]
+        assert matcher.cursor == 2
+        assert matcher.feed(2, ["x3", "x4"], 2) == []
+
+    def test_skip_marks_lines_seen(self):
+        matcher = LineMatcher(re.compile("ready"))
+        matcher.skip(0, ["server ready"])
+        assert matcher.feed(0, ["server ready"], 0) == []
+        assert matcher.feed(0, ["server ready", "ready again"], 0) == ["ready again"]
+
+
+async def write_later(session, batches, delay=0.01):
+    for batch in batches:
+        await asyncio.sleep(delay)
+        session.write(batch, prompt=False)
+
+
+class TestWatchOutputTool:
+    async def test_matches_existing_screen_text(self, session_ctx):
+        session = FakeSession()
+        session.write(["Server ready on :8080"])
+        result = await watch_output.fn(session_ctx(session), "ready", timeout=1)
+        assert "Pattern matched" in result
+        assert "Server ready on :8080" in result
+
+    async def test_new_output_only_ignores_existing_text(self, session_ctx):
+        session = FakeSession()
+        session.write(["old: Server ready"])
+        writer = asyncio.ensure_future(
+            write_later(session, [["noise"], ["new: Server ready"]])
+        )
+        result = await watch_output.fn(
+            session_ctx(session), "ready", timeout=2, new_output_only=True
+        )
+        await writer
+        assert "new: Server ready" in result
+        assert "old: Server ready" not in result
+
+    async def test_matches_lines_that_scrolled_off_between_updates(self, session_ctx):
+        session = FakeSession(height=5)
+        burst = [f"log {i}" for i in range(30)]
+        burst[3] = "FATAL: disk full"
+        writer = asyncio.ensure_future(write_later(session, [burst]))
+        result = await watch_output.fn(session_ctx(session), "FATAL", timeout=2)
+        await writer
+        assert "FATAL: disk full" in result
+
+    async def test_timeout_reports_last_lines(self, session_ctx):
+        session = FakeSession()
+        session.write(["nothing here"])
+        result = await watch_output.fn(session_ctx(session), "never", timeout=0.1)
+        assert "Timed out" in result
+        assert "nothing here" in result
+
+    async def test_invalid_pattern(self, session_ctx):
+        result = await watch_output.fn(session_ctx(FakeSession()), "(", timeout=1)
+        assert "Invalid regex pattern" in result
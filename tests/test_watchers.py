@@ -0,0 +1,137 @@
+"""Tests for background watchers and their tools."""
+
+from __future__ import annotations
+
+import asyncio
+import re
+from types import SimpleNamespace
+
+import pytest
+
+from iterm2_agent.fake_backend import FakeBackend, scripted_shell
+from iterm2_agent.tools.add_watcher import add_watcher
+from iterm2_agent.tools.poll_events import poll_events
+from iterm2_agent.tools.remove_watcher import remove_watcher
+from iterm2_agent.watchers import PatternSet
+from tests.fakes import fake_supervisor_ctx, settle
+
+
+class TestPatternSet:
+    def test_any_pattern_matches(self):
+        patterns = PatternSet([re.compile("ready"), re.compile(r"ERROR \d+")])
+        assert patterns.search("server ready")
+        assert patterns.search("ERROR 42")
+        assert not patterns.search("ERROR x")
+        assert not PatternSet().search("anything")
+
+    def test_uncombinable_patterns(self):
+        # Group numbers shift in an alternation; clashing names do not compile
+        patterns = PatternSet([
+            re.compile("(a)"), re.compile(r"(b)\1"), re.compile("(?P<n>x)"), re.compile("(?P<n>y)"),
+        ])
+        assert patterns.search("bb")
+        assert not patterns.search("bc")
+        assert patterns.search("y")
+
+
+@pytest.fixture
+async def fake():
+    async with fake_supervisor_ctx(FakeBackend(scripted_shell(), width=40, height=6)) as fake:
+        yield fake
+
+
+def watcher_id(result: str) -> str:
+    return result.split(" as ", 1)[1].split(":", 1)[0]
+
+
+class TestWatchers:
+    async def test_events_from_several_watchers(self, fake):
+        session = fake.backend.app.sessions()[0]
+        session.output("ERROR before\r\n")
+        errors = watcher_id(await add_watcher.fn(fake.ctx, ["ERROR", "Traceback"]))
+        ready = watcher_id(await add_watcher.fn(fake.ctx, ["ready$"], once=True))
+
+        # More lines than the screen holds, all in one update
+        session.output("server ready\r\nok\r\nok\r\nok\r\nok\r\nok\r\nERROR boom\r\n")
+        await settle()
+        session.output("ready again\r\n")
+        await settle()
+
+        result = await poll_events.fn(fake.ctx, wait=1)
+        assert result.startswith("Events (2):")
+        assert f"[{ready}] " in result and "server ready" in result
+        assert f"[{errors}] " in result and "ERROR boom" in result
+        assert "ERROR before" not in result and "ready again" not in result
+        # The once-watcher is gone
+        assert "Active watchers (1):" in result
+        assert await poll_events.fn(fake.ctx) == (
+            f"No events\n\nActive watchers (1):\n"
+            f"  {errors} {session.session_id} (1 events, 600s left): 'ERROR', 'Traceback'"
+        )
+
+    async def test_screen_scope_and_wait(self, fake):
+        session = fake.backend.app.sessions()[0]
+        session.output("listening on :8080\r\n")
+        result = await add_watcher.fn(fake.ctx, ["listening"], scope="screen")
+        assert "1 event(s) from the current screen queued" in result
+        first = watcher_id(result)
+        assert "listening on :8080" in await poll_events.fn(fake.ctx, first)
+
+        async def later() -> None:
+            await asyncio.sleep(0.05)
+            session.output("listening on :9090\r\n")
+
+        feeder = asyncio.create_task(later())
+        result = await poll_events.fn(fake.ctx, first, wait=2)
+        await feeder
+        assert "listening on :9090" in result
+
+    async def test_one_dispatcher_per_session(self, fake):
+        session = fake.backend.app.sessions()[0]
+        registry = fake.supervisor.context.watchers
+        ids = [watcher_id(await add_watcher.fn(fake.ctx, [f"w{i}"])) for i in range(3)]
+        assert len(session.streamers) == 1
+        assert len(registry._dispatchers) == 1
+
+        for wid in ids:
+            assert (await remove_watcher.fn(fake.ctx, wid)).startswith(f"Removed watcher {wid}")
+        await settle()
+        assert session.streamers == []
+        assert await remove_watcher.fn(fake.ctx, ids[0]) == f"Watcher not found: {ids[0]}"
+
+    async def test_caps_and_validation(self, fake):
+        registry = fake.supervisor.context.watchers
+        registry.config = SimpleNamespace(
+            current=SimpleNamespace(watchers=SimpleNamespace(
+                max_watchers=1, max_patterns=2, max_events=2, default_ttl=10, max_ttl=20,
+            ))
+        )
+        assert (await add_watcher.fn(fake.ctx, ["("])).startswith("Invalid regex pattern")
+        assert (await add_watcher.fn(fake.ctx, ["a", "b", "c"])).startswith("Too many patterns")
+        assert (await add_watcher.fn(fake.ctx, ["a"], ttl=30)).startswith("ttl must be")
+        assert (await add_watcher.fn(fake.ctx, ["a"], scope="all")).startswith("Invalid scope")
+        assert "expires in 10s" in await add_watcher.fn(fake.ctx, ["line"])
+        assert (await add_watcher.fn(fake.ctx, ["b"])).startswith("Too many watchers")
+
+        session = fake.backend.app.sessions()[0]
+        session.output("line 1\r\nline 2\r\nline 3\r\n")
+        result = await poll_events.fn(fake.ctx, wait=1)
+        assert "line 1" not in result and "line 3" in result
+        assert "(1 older events were dropped; the queue was full)" in result
+
+    async def test_ttl_expiry(self, fake):
+        wid = watcher_id(await add_watcher.fn(fake.ctx, ["x"], ttl=0.05))
+        await asyncio.sleep(0.1)
+        session = fake.backend.app.sessions()[0]
+        assert session.streamers == []
+        assert wid not in await poll_events.fn(fake.ctx)
+
+    async def test_survives_reconnect(self, fake):
+        wid = watcher_id(await add_watcher.fn(fake.ctx, ["after"]))
+        fake.supervisor.context.connection.close()
+        await asyncio.sleep(0.05)
+        await fake.supervisor.wait_connected(timeout=5)
+        await settle()
+        fake.backend.app.sessions()[0].output("after reconnect\r\n")
+        result = await poll_events.fn(fake.ctx, wait=1)
+        assert f"[{wid}]" in result and "after reconnect" in result